@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# benchmarks/construction.py
+#
+"""
+Construction Benchmark
+  Times the import of `restycodes`, each in a new interpreter, and the
+  construction of `RestyCodes` and `ConditionHandler` instances.
+
+  Run from the top of the package:
+
+    ``python benchmarks/construction.py [-n number]``
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import optparse
+import os
+import subprocess
+import sys
+import timeit
+
+PREFIX = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_REPEAT = 5
+
+
+def importTime(module='restycodes'):
+    """
+    Times the import of a module in a new interpreter, less the start up
+    time of the interpreter itself.
+
+    :Keywords:
+      module : `str`
+        The module to import. Default is ``restycodes``.
+
+    :Returns:
+      The best time in seconds.
+    """
+    statement = ("import time; start = time.time(); import {}; "
+                 "print(time.time() - start)").format(module)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = PREFIX
+    times = []
+
+    for repeat in range(IMPORT_REPEAT):
+        output = subprocess.check_output([sys.executable, '-c', statement],
+                                         env=env)
+        times.append(float(output.decode('ascii')))
+
+    return min(times)
+
+
+def constructionTime(name, number):
+    """
+    Times the construction of an instance of a class in `restycodes`.
+
+    :Parameters:
+      name : `str`
+        The class name.
+      number : `int`
+        The number of instances made in each of three runs.
+
+    :Returns:
+      The best time for one instance in seconds.
+    """
+    timer = timeit.Timer('{}()'.format(name),
+                         'from restycodes import {}; {}()'.format(name, name))
+    return min(timer.repeat(3, number)) / number
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [-n number]")
+    parser.add_option('-n', '--number', type='int', default=10000,
+                      help="Instances made in each run (default %default).")
+    options, args = parser.parse_args(argv)
+    sys.path.insert(0, PREFIX)
+    print("{:<20}{:10.3f} ms".format("import restycodes",
+                                     importTime() * 1000))
+
+    for name in ('RestyCodes', 'ConditionHandler'):
+        print("{:<20}{:10.3f} us".format(
+            name + "()", constructionTime(name, options.number) * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+#
+# benchmarks/suite.py
+#
+"""
+Benchmark Suite
+  Times `RestyCodes.getStatus` on the terminal paths of the decision tree,
+  `RestyCodes.evaluate` on each request method with and without
+  `RestyCodes.switchTree`, `RulesEngine.load`, `RestyCodes.setConditions`, the construction of a
+  `ConditionHandler` and the throughput of `RestyCodes.evaluate` on many
+  threads sharing one instance.
+
+  The results can be saved as a JSON baseline and a later run compared to
+  it. Each benchmark is timed `REPEAT` times and each run is followed by a
+  run of a pure Python calibration loop. The median ratio of the runs to
+  the loop is compared to the baseline, so the speed of the machine drifting
+  during a run, or between runs, is not flagged. A benchmark slower than
+  the baseline by more than the threshold, `THRESHOLD` by default, is timed
+  again and flagged only if it is slower again, then the exit status is 1.
+
+  Run from the top of the package:
+
+    ``python benchmarks/suite.py [-n number] [-a] [-s baseline.json]``
+    ``python benchmarks/suite.py -c baseline.json [-t 0.2]``
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import json
+import optparse
+import os
+import platform
+import sys
+import threading
+import time
+import timeit
+
+PREFIX = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PREFIX)
+
+from rulesengine import RulesEngine
+from restycodes import RestyCodes, ConditionHandler
+
+REPEAT = 9
+# The fraction slower than the baseline that is flagged by default. The
+# calibrated ratios of a run compared to its own baseline stay within about
+# 10% on a busy machine, so this is twice that.
+THRESHOLD = 0.2
+CALIBRATION = 'sum(range(100))'
+CALIBRATION_NUMBER = 1000
+THREADS = (1, 2, 4)
+
+
+def findPaths(codes, allPaths=False):
+    """
+    Finds the conditions that take each terminal path through the tree.
+    Every path is walked and one set of conditions kept for each status and
+    iteration count.
+
+    :Parameters:
+      codes : `RestyCodes`
+        The instance whose tree is walked.
+
+    :Keywords:
+      allPaths : `bool`
+        If `True` each iteration count of each status is kept, otherwise
+        only the shortest and longest of each status. Default is `False`.
+
+    :Returns:
+      A `list` of ``(code, iterations, kwargs)`` sorted by the iterations.
+    """
+    lefts, rights, conditions = codes._lefts, codes._rights, codes._conditions
+    found = {}
+    stack = [(0, ())]
+
+    while stack:
+        index, path = stack.pop()
+
+        if index == -1:
+            kwargs = dict(path)
+            result = codes.evaluate(kwargs)
+            found.setdefault((result.code, result.iterations), kwargs)
+            continue
+
+        stack.append((rights[index], path + ((conditions[index], False),)))
+        stack.append((lefts[index], path + ((conditions[index], True),)))
+
+    if not allPaths:
+        kept = {}
+
+        for code, iterations in sorted(found):
+            kept.setdefault(code, []).append(iterations)
+
+        found = dict([((code, iterations), found[(code, iterations)])
+                      for code, counts in kept.items()
+                      for iterations in set([counts[0], counts[-1]])])
+
+    return sorted([(code, iterations, kwargs)
+                   for (code, iterations), kwargs in found.items()],
+                  key=lambda item: (item[1], item[0]))
+
+
+def getMedian(values):
+    """
+    :Returns:
+      The median of a sequence of numbers.
+    """
+    values = sorted(values)
+    middle = len(values) // 2
+
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def calibrate():
+    """
+    Times the calibration loop.
+
+    :Returns:
+      The time of one loop in seconds.
+    """
+    return timeit.Timer(CALIBRATION).timeit(CALIBRATION_NUMBER) \
+        / CALIBRATION_NUMBER
+
+
+def callTime(call, number):
+    """
+    Times a callable. Each run is followed by a run of the calibration loop,
+    see `calibrate`.
+
+    :Parameters:
+      call : `callable`
+        Called with no arguments.
+      number : `int`
+        The number of calls in each run.
+
+    :Returns:
+      A `tuple` of the median time for one call in seconds and the median
+      of the ratios of each run to the calibration loop after it.
+    """
+    times, ratios = [], []
+    timer = timeit.Timer(call)
+
+    for repeat in range(REPEAT):
+        found = timer.timeit(number) / number
+        times.append(found)
+        ratios.append(found / calibrate())
+
+    return getMedian(times), getMedian(ratios)
+
+
+def threadTime(codes, threads, kwargs, number):
+    """
+    Times `RestyCodes.evaluate` on many threads at once, all sharing the
+    same instance, which stores nothing, so they contend for it as the
+    threads of a server would.
+
+    :Parameters:
+      codes : `RestyCodes`
+        The instance shared by the threads.
+      threads : `int`
+        The number of threads.
+      kwargs : `dict`
+        The conditions.
+      number : `int`
+        The number of calls on each thread.
+
+    :Returns:
+      A `tuple` of the median wall time for one call in seconds, the
+      inverse of the throughput, and its median ratio to the calibration
+      loop, see `callTime`.
+    """
+    times, ratios = [], []
+
+    for repeat in range(REPEAT):
+        barrier = threading.Event()
+
+        def run():
+            barrier.wait()
+
+            for count in range(number):
+                codes.evaluate(kwargs)
+
+        workers = [threading.Thread(target=run) for count in range(threads)]
+
+        for worker in workers:
+            worker.start()
+
+        start = time.time()
+        barrier.set()
+
+        for worker in workers:
+            worker.join()
+
+        found = (time.time() - start) / (number * threads)
+        times.append(found)
+        ratios.append(found / calibrate())
+
+    return getMedian(times), getMedian(ratios)
+
+
+def runSuite(number, allPaths=False, threads=THREADS, names=None):
+    """
+    Runs every benchmark.
+
+    :Parameters:
+      number : `int`
+        The number of calls in each run.
+
+    :Keywords:
+      allPaths : `bool`
+        See `findPaths`.
+      threads : `tuple`
+        The number of threads of each throughput benchmark.
+      names : `set`
+        If given only the benchmarks with these names are run. Default is
+        `None`.
+
+    :Returns:
+      A `list` of ``(name, seconds, ratio)`` in the order run, see
+      `callTime`.
+    """
+    codes = RestyCodes()
+    benchmarks = []
+
+    def getStatus(kwargs):
+        return lambda: callTime(lambda: codes.getStatus(**kwargs), number)
+
+    for code, iterations, kwargs in findPaths(codes, allPaths):
+        benchmarks.append(("getStatus {} x{}".format(code, iterations),
+                           getStatus(kwargs)))
+
+    switchCodes = type('SwitchCodes', (RestyCodes,), {
+        'nodeTree': RestyCodes.switchTree})()
+
+    def getEvaluate(rc, kwargs):
+        return lambda: callTime(lambda: rc.evaluate(kwargs), number)
+
+    for method in ('get', 'delete', 'post', 'put'):
+        kwargs = codes.setConditions(**({} if method == 'get'
+                                        else {method: True}))
+        benchmarks.append(("evaluate {}".format(method),
+                           getEvaluate(codes, kwargs)))
+        benchmarks.append(("evaluate {} switch".format(method),
+                           getEvaluate(switchCodes, kwargs)))
+
+    engine = RulesEngine(this=codes)
+    benchmarks.append(("RulesEngine.load", lambda: callTime(
+        lambda: engine.load(RestyCodes.nodeTree), max(1, number // 100))))
+    kwargs = {'authorized': False, 'acceptExists': True}
+    benchmarks.append(("setConditions", lambda: callTime(
+        lambda: codes.setConditions(**kwargs), number)))
+    benchmarks.append(("ConditionHandler()", lambda: callTime(
+        ConditionHandler, number)))
+    longest = max(findPaths(codes), key=lambda item: item[1])[2]
+
+    def getThreads(count):
+        return lambda: threadTime(codes, count, longest,
+                                  max(1, number // count))
+
+    for count in threads:
+        benchmarks.append(("evaluate {} threads".format(count),
+                           getThreads(count)))
+
+    return [(name,) + run() for name, run in benchmarks
+            if names is None or name in names]
+
+
+def compareResults(results, baseline, threshold):
+    """
+    Compares results to a baseline. The ratios to the calibration loop are
+    compared, so a machine that is slower, or faster, as a whole does not
+    change the outcome. A baseline without them is compared by the times.
+
+    :Parameters:
+      results : `list`
+        The ``(name, seconds, ratio)`` from `runSuite`.
+      baseline : `dict`
+        The saved baseline, with the seconds of each benchmark name as
+        ``results`` and its ratio to the calibration loop as
+        ``calibrated``.
+      threshold : `float`
+        The fraction slower than the baseline that is a regression.
+
+    :Returns:
+      A `list` of ``(name, seconds, baseline, ratio, regressed)``, the
+      baseline and ratio are `None` for a benchmark not in the baseline.
+    """
+    compared = []
+    calibrated = baseline.get('calibrated', {})
+
+    for name, seconds, found in results:
+        base = baseline['results'].get(name)
+        ratio = None
+
+        if calibrated.get(name):
+            ratio = found / calibrated[name]
+        elif base:
+            ratio = seconds / base
+
+        compared.append((name, seconds, base, ratio,
+                         ratio is not None and ratio > 1.0 + threshold))
+
+    return compared
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage="%prog [-n number] [-a] [-s file] [-c file [-t threshold]]")
+    parser.add_option('-n', '--number', type='int', default=10000,
+                      help="Calls in each run (default %default).")
+    parser.add_option('-a', '--all-paths', action='store_true',
+                      dest='allPaths', default=False,
+                      help="Time every iteration count of each status, not "
+                      "only the shortest and longest.")
+    parser.add_option('-s', '--save', metavar='FILE',
+                      help="Save the results as a JSON baseline.")
+    parser.add_option('-c', '--compare', metavar='FILE',
+                      help="Compare the results to a JSON baseline.")
+    parser.add_option('-t', '--threshold', type='float', default=THRESHOLD,
+                      help="The fraction slower than the baseline that is "
+                      "flagged (default %default).")
+    options, args = parser.parse_args(argv)
+    baseline = None
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+
+    results = runSuite(options.number, options.allPaths)
+    regressed = 0
+
+    if baseline is None:
+        for name, seconds, found in results:
+            print("{:<24}{:10.3f} us".format(name, seconds * 1000000))
+    else:
+        compared = compareResults(results, baseline, options.threshold)
+        flagged = set([item[0] for item in compared if item[4]])
+
+        # A benchmark found slower is timed again, and the lower of the two
+        # ratios kept, so a single noisy run is not flagged.
+        if flagged:
+            again = dict([(item[0], item) for item in compareResults(
+                runSuite(options.number, options.allPaths, names=flagged),
+                baseline, options.threshold)])
+            compared = [again[item[0]]
+                        if item[0] in again and again[item[0]][3] < item[3]
+                        else item for item in compared]
+
+        for name, seconds, base, ratio, slower in compared:
+            if ratio is None:
+                print("{:<24}{:10.3f} us        new".format(
+                    name, seconds * 1000000))
+            else:
+                print("{:<24}{:10.3f} us {:6.2f}x{}".format(
+                    name, seconds * 1000000, ratio,
+                    "  REGRESSION" if slower else ""))
+
+            regressed += slower
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'number': options.number,
+                       'results': dict([(name, seconds)
+                                        for name, seconds, found in results]),
+                       'calibrated': dict([(name, found)
+                                           for name, seconds, found
+                                           in results])}, f, indent=2,
+                      sort_keys=True)
+
+    if regressed:
+        print("{} regression(s) over {:.0%}".format(regressed,
+                                                    options.threshold))
+
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
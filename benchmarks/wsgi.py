@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# benchmarks/wsgi.py
+#
+"""
+WSGI Benchmark
+  Times a trivial WSGI application called directly and through the
+  `RestyCodesMiddleware`, the difference is the overhead of the middleware
+  on each request.
+
+  Run from the top of the package:
+
+    ``python benchmarks/wsgi.py [-n number]``
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import optparse
+import os
+import sys
+import timeit
+
+PREFIX = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PREFIX)
+
+from restycodes.wsgi import RestyCodesMiddleware
+
+ENVIRON = {
+    'REQUEST_METHOD': 'GET',
+    'SCRIPT_NAME': '',
+    'PATH_INFO': '/resource/42',
+    'QUERY_STRING': 'format=json',
+    'HTTP_ACCEPT': 'application/json',
+    'HTTP_ACCEPT_ENCODING': 'gzip',
+    }
+REQUESTS = (
+    ('GET', ENVIRON),
+    ('unknown method', dict(ENVIRON, REQUEST_METHOD='BREW')),
+    )
+
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'OK']
+
+
+def startResponse(status, headers):
+    pass
+
+
+def requestTime(app, environ, number):
+    """
+    Times the requests to an application.
+
+    :Parameters:
+      app : `callable`
+        The WSGI application.
+      environ : `dict`
+        The environ, a copy is passed with each request.
+      number : `int`
+        The number of requests in each of three runs.
+
+    :Returns:
+      The best time for one request in seconds.
+    """
+    timer = timeit.Timer(lambda: app(dict(environ), startResponse))
+    return min(timer.repeat(3, number)) / number
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [-n number]")
+    parser.add_option('-n', '--number', type='int', default=100000,
+                      help="Requests in each run (default %default).")
+    options, args = parser.parse_args(argv)
+    middlewares = (
+        ('cached', RestyCodesMiddleware(application)),
+        ('uncached', RestyCodesMiddleware(application, cacheSize=0)),
+        ('providers', RestyCodesMiddleware(application, providers={
+            'authorized': lambda environ: True})),
+        )
+
+    for label, environ in REQUESTS:
+        base = requestTime(application, environ, options.number)
+        print("{}: application {:.3f} us".format(label, base * 1000000))
+
+        for name, middleware in middlewares:
+            found = requestTime(middleware, environ, options.number)
+            print("  {:<10} {:8.3f} us, overhead {:8.3f} us".format(
+                name, found * 1000000, (found - base) * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,51 @@
 #
 # restycodes/__init__.py
 #
+import sys
 
 from restycodes.resty_codes import (STATUS_CODE_MAP, RESTYARGS, RestyCodes,
                                     ConditionHandler, RestyCodesException,
                                     InvalidConditionNameException,
-                                    getCodeStatus)
+                                    getCodeStatus, CONDITION_NAMES,
+                                    CONDITION_BITS, StatusResult,
+                                    LazyConditions, Status, STATUSES,
+                                    STATUS_CATEGORIES,)
+
+# The module of each name imported when it is first used.
+_LAZY = {
+    'Conditions': 'restycodes.conditions',
+    'DecisionTable': 'restycodes.table',
+    'StaleTableException': 'restycodes.table',
+    'writeTable': 'restycodes.table',
+    'PathProfile': 'restycodes.fast_path',
+    'FastPath': 'restycodes.fast_path',
+    'StaleProfileException': 'restycodes.fast_path',
+    }
+
+if sys.version_info < (3, 7): # pragma: no cover
+    from restycodes.conditions import Conditions
+    from restycodes.table import (DecisionTable, StaleTableException,
+                                  writeTable,)
+    from restycodes.fast_path import (PathProfile, FastPath,
+                                      StaleProfileException,)
+
+
+def __getattr__(name):
+    """
+    Imports the names in `_LAZY`, and `AsyncRestyCodes`, when they are
+    first used, on Python 3.7 and later, so importing this package does not
+    import threading, hashlib, mmap, json or asyncio. On Python 3.5 and 3.6
+    import `AsyncRestyCodes` from `restycodes.async_resty_codes`.
+    """
+    if name in _LAZY:
+        module = __import__(_LAZY[name], fromlist=[name])
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    if name == 'AsyncRestyCodes' and sys.version_info >= (3, 5):
+        from restycodes.async_resty_codes import AsyncRestyCodes
+        return AsyncRestyCodes
+
+    msg = "module {!r} has no attribute {!r}".format(__name__, name)
+    raise AttributeError(msg)
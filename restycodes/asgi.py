@@ -0,0 +1,260 @@
+#
+# restycodes/asgi.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+ASGI
+  An ASGI middleware that finds the conditions of a request from the scope
+  and answers the request itself when the diagram ends on an error or a
+  304, found only from conditions it knows, without calling the
+  application or receiving the body. Needs Python 3.5 or later.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+from functools import partial
+
+from restycodes.cache import LRUCache
+from restycodes.resty_codes import (RESTYARGS, StatusResult,
+                                    InvalidConditionNameException)
+from restycodes.async_resty_codes import AsyncRestyCodes, AsyncLazyConditions
+from restycodes.wsgi import (MAX_URL_LENGTH, ENVIRON_KEY, HEADER_CONDITIONS,
+                             REQUEST_CONDITIONS, ASSUMED_CONDITIONS,
+                             getRequestConditions, getKnownMethods)
+
+_HEADER_CONDITIONS = tuple([(header.encode('latin-1'), name)
+                            for header, name in HEADER_CONDITIONS])
+
+
+def getScopeConditions(scope, maxUrlLength=MAX_URL_LENGTH,
+                       maxEntitySize=None):
+    """
+    Gets the conditions that can be found from the scope alone, see
+    `restycodes.wsgi.getRequestConditions`, and which of the Accept and
+    conditional headers are present.
+
+    :Parameters:
+      scope : `dict`
+        The ASGI HTTP connection scope.
+
+    :Keywords:
+      maxUrlLength : `int`
+        See `restycodes.wsgi.getRequestConditions`.
+      maxEntitySize : `int`
+        See `restycodes.wsgi.getRequestConditions`.
+
+    :Returns:
+      A `dict` of conditions.
+    """
+    headers = dict(scope.get('headers', ()))
+    path = scope.get('raw_path') or scope.get('path', '')
+    query = scope.get('query_string', b'')
+    size = len(scope.get('root_path', '')) + len(path)
+
+    if query:
+        size += len(query) + 1
+
+    contentLength = headers.get(b'content-length')
+    conditions = getRequestConditions(
+        scope.get('method', 'GET'), size,
+        None if contentLength is None else contentLength.decode('latin-1'),
+        maxUrlLength, maxEntitySize)
+
+    for header, name in _HEADER_CONDITIONS:
+        if header in headers:
+            conditions[name] = True
+
+    ifMatch = headers.get(b'if-match')
+
+    if ifMatch is not None:
+        conditions['ifMatchAnyExists'] = ifMatch.strip() == b'*'
+
+    ifNoneMatch = headers.get(b'if-none-match')
+
+    if ifNoneMatch is not None:
+        conditions['ifNoneMatchAnyExists'] = ifNoneMatch.strip() == b'*'
+
+    return conditions
+
+
+class ScopeConditions(AsyncLazyConditions):
+    """
+    The `AsyncLazyConditions` of an ASGI request, whose providers are called
+    with the scope.
+    """
+
+    def __init__(self, values, providers, scope):
+        """
+        :Parameters:
+          values : `dict`
+            See `LazyConditions`.
+          providers : `dict`
+            A callable, or coroutine function, that takes the scope for each
+            condition that is found only when it is read.
+          scope : `dict`
+            The ASGI HTTP connection scope.
+        """
+        super(ScopeConditions, self).__init__(values, providers)
+        self._scope = scope
+
+    def _provide(self, provider):
+        return super(ScopeConditions, self)._provide(
+            partial(provider, self._scope))
+
+
+class RestyCodesMiddleware(object):
+    """
+    Wraps an ASGI application. The status of each HTTP request is found from
+    the conditions in the scope, see `getScopeConditions`, and those from
+    the providers. If it is an error or a 304, and every condition read on
+    its path is known, the response is sent without calling the
+    application or receiving the body. Otherwise the application is called
+    with the `StatusResult`, found with the defaults of the conditions not
+    known, in a copy of the scope under ``restycodes.status``. Other
+    connections are passed straight through.
+
+    The conditions known are those of the WSGI middleware, see
+    `restycodes.wsgi.RestyCodesMiddleware`.
+
+    One `AsyncRestyCodes` is made for the middleware and shared by every
+    request, it is only used through its stateless `evaluate` method. With
+    no providers the status depends only on the conditions found from the
+    scope, and is kept for them.
+    """
+
+    def __init__(self, application, providers=None, codes=None,
+                 maxUrlLength=MAX_URL_LENGTH, maxEntitySize=None,
+                 cacheSize=256, assumed=ASSUMED_CONDITIONS):
+        """
+        :Parameters:
+          application : `callable`
+            The ASGI application.
+
+        :Keywords:
+          providers : `dict`
+            A callable taking the scope for each condition that the
+            application finds, like ``resourceExists`` or ``authorized``. It
+            can be a coroutine function and is called, and awaited, only if
+            a node that reads the condition is reached. Default is `None`.
+          codes : `AsyncRestyCodes`
+            The instance to evaluate with. Default is `None` which is a new
+            `AsyncRestyCodes`.
+          maxUrlLength : `int`
+            See `restycodes.wsgi.getRequestConditions`.
+          maxEntitySize : `int`
+            See `restycodes.wsgi.getRequestConditions`.
+          cacheSize : `int`
+            The number of statuses kept for the conditions found from the
+            scope, used only when there are no providers. Default is 256,
+            `0` keeps none.
+          assumed : `tuple`
+            The conditions with no provider taken as known at their
+            defaults. Default is `restycodes.wsgi.ASSUMED_CONDITIONS`, `()`
+            assumes none.
+        """
+        for name in tuple(providers or ()) + tuple(assumed):
+            if name not in RESTYARGS:
+                msg = "Provided key '{}' is not in kwargs.".format(name)
+                raise InvalidConditionNameException(msg)
+
+        self._application = application
+        self._providers = dict(providers or {})
+        self._codes = AsyncRestyCodes() if codes is None else codes
+        self._maxUrlLength = maxUrlLength
+        self._maxEntitySize = maxEntitySize
+        self._known = getKnownMethods(self._codes, set(
+            REQUEST_CONDITIONS + tuple(self._providers) + tuple(assumed)))
+        self._statuses = LRUCache(cacheSize) if cacheSize > 0 else None
+        self._responses = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope.get('type') != 'http':
+            return await self._application(scope, receive, send)
+
+        conditions = getScopeConditions(scope, self._maxUrlLength,
+                                        self._maxEntitySize)
+
+        if self._providers:
+            result, known = await self.__evaluate(ScopeConditions(
+                conditions, self._providers, scope), True)
+        elif self._statuses is None:
+            result, known = await self.__evaluate(conditions, False)
+        else:
+            key = (tuple(conditions), tuple(conditions.values()))
+            found = self._statuses.find(key)
+
+            if found is None:
+                found = await self.__evaluate(conditions, False)
+                self._statuses.set(key, found)
+
+            result, known = found
+
+        if known:
+            start, body = self.__getResponse(result)
+
+            if scope.get('method') == 'HEAD' or result.code == 304:
+                body = b''
+
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        scope = dict(scope)
+        scope[ENVIRON_KEY] = result
+        return await self._application(scope, receive, send)
+
+    async def __evaluate(self, conditions, path):
+        """
+        Evaluates the conditions of a request, see
+        `restycodes.wsgi.RestyCodesMiddleware`.
+
+        :Returns:
+          The `StatusResult`, without its path, and `True` if it is sent.
+        """
+        result = await self._codes.evaluate(conditions, path)
+        known = False
+
+        if result.code >= 400 or result.code == 304:
+            if result.path is None:
+                result = await self._codes.evaluate(conditions, True)
+
+            known = self._known.issuperset(result.path)
+
+        if result.path is not None:
+            result = StatusResult(result.code, result.reason,
+                                  result.iterations, None)
+
+        return result, known
+
+    def __getResponse(self, result):
+        """
+        Gets the start message and the body sent for a status, made once for
+        each status.
+        """
+        response = self._responses.get(result.code)
+
+        if response is None:
+            body = "{} {}\n".format(result.code, result.reason).encode(
+                'ascii')
+            headers = [(b'content-type', b'text/plain; charset=us-ascii'),
+                       (b'content-length', str(len(body)).encode('ascii'))]
+
+            if result.code == 304:
+                headers = []
+
+            response = self._responses[result.code] = (
+                {'type': 'http.response.start', 'status': result.code,
+                 'headers': headers}, body)
+
+        start, body = response
+        return dict(start, headers=list(start['headers'])), body
@@ -0,0 +1,555 @@
+#
+# restycodes/async_resty_codes.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Async Resty Codes
+  The `RestyCodes` decision tree for internal methods that are coroutines.
+  Needs Python 3.5 or later.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import asyncio
+import inspect
+
+from restycodes.resty_codes import (STATUS_CODE_MAP, RESTYARGS,
+                                    CONDITION_NAMES, CONDITION_BITS,
+                                    RestyCodes, StatusResult, LazyConditions,
+                                    _Frame)
+
+# The code of a frame whose method has not set one.
+_UNSET = object()
+
+
+class AsyncLazyConditions(LazyConditions):
+    """
+    The `LazyConditions` of a request whose providers can be coroutine
+    functions. The awaitable a provider returns is kept as a future, which
+    `AsyncRestyCodes.evaluate` awaits when its condition is read.
+    """
+
+    def _provide(self, provider):
+        value = provider()
+
+        if inspect.isawaitable(value):
+            return asyncio.ensure_future(value)
+
+        return bool(value)
+
+    def start(self, name):
+        """
+        Calls the provider of a condition that is not set and whose provider
+        has not been called yet.
+
+        :Parameters:
+          name : `str`
+            The condition name.
+
+        :Returns:
+          `True` if the provider was called, else `False`.
+        """
+        if (self._values.get(name) is not None or name in self._provided
+            or name not in self._providers):
+            return False
+
+        self[name]
+        return True
+
+    async def resolve(self, names=None):
+        """
+        Gets the values set and the values of some conditions. The providers
+        of the conditions are all started before any is awaited, so they run
+        at the same time.
+
+        :Keywords:
+          names : `tuple`
+            The conditions to get. Default is `None` for all of them.
+
+        :Returns:
+          A `dict` of the values set and of the conditions.
+        """
+        values = dict([(name, value) for name, value in self._values.items()
+                       if value is not None])
+        found = [(name, self[name]) for name in (
+            self if names is None else names)]
+
+        for name, value in found:
+            if inspect.isawaitable(value):
+                value = self._provided[name] = bool(await value)
+
+            values[name] = value
+
+        return values
+
+
+class AsyncRestyCodes(RestyCodes):
+    """
+    A `RestyCodes` whose status methods are coroutines. An internal method
+    overridden in a subclass can be a coroutine method, it is awaited when
+    its node is reached, the other nodes are read as `RestyCodes` reads
+    them. The same path is taken, and the same status found, as with
+    `RestyCodes`.
+
+    *Example*
+      ``async def _resourceExists(self, **kwargs):``
+          ``return await store.exists(kwargs['key'])``
+
+    A tree with no overridden methods has nothing to await and is
+    evaluated as `RestyCodes.evaluate` does, with the cache or the
+    compiled function if they are on.
+
+    An overridden method of a condition is passed the values set and the
+    conditions it reads, its own and those in `EXTRA_CONDITIONS` or
+    `SWITCH_CONDITIONS` for its name, found from the providers of
+    `AsyncLazyConditions` at the same time. Any other method is passed all
+    of the conditions.
+
+    The lookups of the conditions named in `SPECULATIVE_CONDITIONS` can be
+    started before their nodes are reached, see `__init__`, so that the
+    lookups on a path run at the same time instead of one after another.
+    """
+    # The cost of finding a condition, in any unit, for the conditions whose
+    # methods or providers are coroutines. A condition not listed costs 1.
+    CONDITION_COSTS = {}
+    # The conditions whose methods, or providers, have no side effects,
+    # other than setting the code, and so can be called before their node is
+    # reached.
+    SPECULATIVE_CONDITIONS = ()
+
+    def __init__(self, storeSeq=False, cacheSize=0, lookahead=0,
+                 budget=None):
+        """
+        :Keywords:
+          storeSeq : `bool`
+            See `RulesEngine`.
+          cacheSize : `int`
+            See `RestyCodes`.
+          lookahead : `int`
+            The number of nodes ahead, on either branch, of each node
+            reached whose speculative lookups are started. The nearest are
+            started first and the more costly first among those as near.
+            The default `0` starts nothing ahead.
+          budget : `int`
+            The most cost, see `CONDITION_COSTS`, started ahead in one
+            evaluation. Default is `None` for no limit.
+        """
+        super(AsyncRestyCodes, self).__init__(storeSeq=storeSeq,
+                                              cacheSize=cacheSize)
+        self._lookahead = lookahead
+        self._budget = budget
+        self.__ahead = {}
+        self.__reads = {}
+
+    async def dump(self, **kwargs):
+        """
+        Calls the internal methods on this instance, see `RestyCodes.dump`,
+        awaiting any that are coroutines.
+
+        :Parameters:
+          kwargs : `dict`
+            The keyword arguments that are passed to the internal method calls.
+
+        :Returns:
+          The Boolean from the last internal method.
+        """
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches = self._switches
+        sequence = [] if self._storeSeq else None
+        index = 0 if methods else -1
+        count = 0
+        result = None
+
+        while index != -1:
+            result = methods[index](self, **kwargs)
+
+            if inspect.isawaitable(result):
+                result = await result
+
+            count += 1
+            sequence is not None and sequence.append(methods[index].__name__)
+
+            if switches and index in switches:
+                index = switches[index].get(result, rights[index])
+            else:
+                index = lefts[index] if result else rights[index]
+
+        self._iterCount = count
+        self._callSequence = sequence or []
+        return result
+
+    async def getStatus(self, **kwargs):
+        """
+        Gets the status, see `evaluate`. The code, the iteration count and
+        the call sequence, if it is being stored, are kept on this instance.
+
+        :Parameters:
+          kwargs : `dict`
+            The keyword arguments that are passed to the internal method calls.
+
+        :Returns:
+          A `tuple` of the response, see `getCodeStatus`.
+        """
+        return self._keepResult(await self.evaluate(kwargs, self._storeSeq))
+
+    async def getStatusByMask(self, mask):
+        """
+        Gets the status for conditions encoded in an `int` mask, see
+        `evaluateMask`.
+
+        :Parameters:
+          mask : `int` or `Conditions`
+            The conditions that are `True`.
+
+        :Returns:
+          A `tuple` of the response, see `getCodeStatus`.
+        """
+        return self._keepResult(await self.evaluateMask(
+            mask, self._storeSeq))
+
+    async def evaluate(self, kwargs, path=False):
+        """
+        Evaluates the tree for the conditions in `kwargs`, see
+        `RestyCodes.evaluate`, awaiting the result of any method that is
+        awaitable, and any condition, like those from the coroutine
+        providers of `AsyncLazyConditions`. Nothing is stored on this
+        instance.
+
+        :Parameters:
+          kwargs : `dict` or `AsyncLazyConditions`
+            The keyword arguments that are passed to the internal method calls.
+
+        :Keywords:
+          path : `bool`
+            If `True` the names of the methods on the path are returned in
+            the `StatusResult`. Default is `False`.
+
+        :Returns:
+          A `StatusResult`.
+        """
+        if not self._opaque and isinstance(kwargs, dict):
+            return RestyCodes.evaluate(self, kwargs, path)
+
+        get = kwargs.get
+        conditions, defaults, codes = (self._conditions, self._defaults,
+                                       self._codes)
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches, cases = self._switches, self._cases
+        isawaitable = inspect.isawaitable
+        frame = _Frame(self)
+        sequence = [] if path else None
+        index = 0 if methods else -1
+        count = 0
+        code = frame._code
+        started = {} if self._lookahead > 0 else None
+        spent = [0]
+
+        try:
+            while index != -1:
+                condition = conditions[index]
+                count += 1
+
+                if started is not None:
+                    self.__startAhead(index, kwargs, started, spent)
+
+                if cases[index] is not None:
+                    result, entry = None, codes[index][1]
+
+                    for name, default, bit, case in cases[index]:
+                        value = get(name, default)
+
+                        if isawaitable(value):
+                            value = await value
+
+                        if value:
+                            result, entry = name, case
+                            break
+                elif condition is None:
+                    found = None if started is None else started.pop(
+                        methods[index].__name__, None)
+
+                    if found is None:
+                        values = kwargs
+
+                        if isinstance(kwargs, AsyncLazyConditions):
+                            values = await kwargs.resolve(
+                                self.__getReads(methods[index]))
+
+                        frame._code = code
+                        result = methods[index](frame, **values)
+                        found = (None, frame)
+                    else:
+                        result = found[0]
+
+                    if isawaitable(result):
+                        result = await result
+
+                    if found[1]._code is not _UNSET:
+                        code = found[1]._code
+
+                    entry = None
+                else:
+                    result = get(condition, defaults[index])
+
+                    if isawaitable(result):
+                        result = await result
+
+                if sequence is not None:
+                    sequence.append(methods[index].__name__)
+
+                if switches and index in switches:
+                    branch = switches[index].get(result, rights[index])
+                elif result:
+                    entry = codes[index][0]
+                    branch = lefts[index]
+                else:
+                    entry = codes[index][1]
+                    branch = rights[index]
+
+                if entry is not None:
+                    if entry.__class__ is dict:
+                        entry = self._extraCode(
+                            index, entry, await self.__getExtras(index, get))
+
+                    if entry is not None:
+                        code = entry
+
+                index = branch
+        finally:
+            if started:
+                self.__cancel(started.values())
+
+                if isinstance(kwargs, AsyncLazyConditions):
+                    self.__cancel([(value, None) for value
+                                   in kwargs._provided.values()])
+
+        return StatusResult(code, STATUS_CODE_MAP.get(code, ""), count,
+                            None if sequence is None else tuple(sequence))
+
+    async def __getExtras(self, index, get):
+        """
+        Gets the extra conditions of a node, awaiting any that are
+        awaitable.
+
+        :Returns:
+          The ``get`` method of a `dict` of the extra conditions.
+        """
+        values = {}
+
+        for name, default in self._extras[index]:
+            value = get(name, default)
+
+            if inspect.isawaitable(value):
+                value = await value
+
+            values[name] = value
+
+        return values.get
+
+    def __getReads(self, method):
+        """
+        Gets the conditions an opaque method reads, see the class docstring.
+
+        :Parameters:
+          method : ``FunctionType``
+            The node method.
+
+        :Returns:
+          A `tuple` of the condition names, or `None` for all of them.
+        """
+        name = method.__name__
+
+        if name not in self.__reads:
+            if name in self.SWITCH_CONDITIONS:
+                reads = self.SWITCH_CONDITIONS[name]
+            elif name[1:] in RESTYARGS:
+                reads = (name[1:],)
+            else:
+                reads = None
+
+            if reads is not None:
+                reads += tuple([extra for extra, default
+                                in self.EXTRA_CONDITIONS.get(name, ())])
+
+            self.__reads[name] = reads
+
+        return self.__reads[name]
+
+    async def __callAhead(self, method, frame, kwargs):
+        """
+        Calls an opaque method ahead of its node, once the conditions it
+        reads are found.
+
+        :Returns:
+          The result of the method.
+        """
+        result = method(frame, **await kwargs.resolve(
+            self.__getReads(method)))
+
+        if inspect.isawaitable(result):
+            result = await result
+
+        return result
+
+    def __startAhead(self, index, kwargs, started, spent):
+        """
+        Starts the lookups of the speculative conditions ahead of a node
+        that have not been started. The lookup of an opaque method is
+        called with a `_Frame` of its own, the code it sets, if any, is
+        taken only if its node is reached. The lookup of a condition that
+        is read directly is its provider, if it has one.
+
+        :Parameters:
+          index : `int`
+            The index of the node reached.
+          kwargs : `dict` or `AsyncLazyConditions`
+            The keyword arguments that are passed to the internal method calls.
+          started : `dict`
+            The ``(result, frame)`` of each lookup started keyed by the
+            method name, or the ``(result, None)`` keyed by the condition
+            name of a provider.
+          spent : `list`
+            The cost started so far as its only item.
+        """
+        lazy = isinstance(kwargs, AsyncLazyConditions)
+
+        for name, method, cost in self.__findAhead(index):
+            if name in started:
+                continue
+
+            if self._budget is not None and spent[0] + cost > self._budget:
+                continue
+
+            if method is None:
+                if not lazy or not kwargs.start(name):
+                    continue
+
+                started[name] = (kwargs[name], None)
+            else:
+                frame = _Frame(self)
+                frame._code = _UNSET
+
+                if lazy:
+                    result = asyncio.ensure_future(self.__callAhead(
+                        method, frame, kwargs))
+                else:
+                    result = method(frame, **kwargs)
+
+                    if inspect.isawaitable(result):
+                        result = asyncio.ensure_future(result)
+
+                started[name] = (result, frame)
+
+            spent[0] += cost
+
+    def __findAhead(self, index):
+        """
+        Finds the speculative conditions of the nodes ahead of a node, the
+        nearest first and the more costly first among those as near. The
+        condition of an opaque method is found by calling the method, that
+        of any other node from its provider.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+
+        :Returns:
+          A `tuple` of ``(name, method, cost)`` for each lookup, the name is
+          that of the opaque method or of the condition and the method
+          `None`.
+        """
+        ahead = self.__ahead.get(index)
+
+        if ahead is None:
+            found, level, seen = [], [index], set([index])
+            speculative = self.SPECULATIVE_CONDITIONS
+
+            for distance in range(self._lookahead):
+                following = []
+
+                for node in level:
+                    for branch in self._getBranches(node):
+                        if branch not in seen:
+                            seen.add(branch)
+                            following.append(branch)
+
+                for node in following:
+                    method = self._methods[node]
+                    condition = self._conditions[node]
+                    cases = self._cases[node]
+
+                    if condition is None and cases is None:
+                        lookups = [(method.__name__[1:], method.__name__,
+                                    method)]
+                    else:
+                        names = [condition] if cases is None else [
+                            case[0] for case in cases]
+                        names += [extra for extra, default
+                                  in self._extras[node]]
+                        lookups = [(name, name, None) for name in names]
+
+                    for condition, name, lookup in lookups:
+                        if condition in speculative:
+                            cost = self.CONDITION_COSTS.get(condition, 1)
+                            found.append((distance, -cost, name, lookup))
+
+                level = following
+
+            found.sort(key=lambda item: item[:3])
+            ahead = self.__ahead[index] = tuple(
+                [(name, method, -cost)
+                 for distance, cost, name, method in found])
+
+        return ahead
+
+    def __cancel(self, started):
+        """
+        Cancels the lookups that were started but not reached, and collects
+        the errors of those that are finished so they are not reported.
+
+        :Parameters:
+          started : `list`
+            The ``(result, frame)`` of each lookup.
+        """
+        for result, frame in started:
+            if isinstance(result, asyncio.Future):
+                if not result.done():
+                    result.cancel()
+                elif not result.cancelled():
+                    result.exception()
+
+    async def evaluateMask(self, mask, path=False):
+        """
+        Evaluates the tree for conditions encoded in an `int` mask, see
+        `RestyCodes.evaluateMask`, awaiting the result of any method that is
+        awaitable.
+
+        :Parameters:
+          mask : `int` or `Conditions`
+            The conditions that are `True`.
+
+        :Keywords:
+          path : `bool`
+            If `True` the names of the methods on the path are returned in
+            the `StatusResult`. Default is `False`.
+
+        :Returns:
+          A `StatusResult`.
+        """
+        if not self._opaque:
+            return RestyCodes.evaluateMask(self, mask, path)
+
+        mask = int(mask)
+        kwargs = dict([(name, bool(mask & CONDITION_BITS[name]))
+                       for name in CONDITION_NAMES])
+        return await self.evaluate(kwargs, path)
@@ -0,0 +1,173 @@
+#
+# restycodes/batch.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Batch
+  Evaluates the decision tree for many rows of conditions at once with
+  NumPy. NumPy is optional, it is only needed when a batch is evaluated.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+try:
+    import numpy
+except ImportError: # pragma: no cover
+    numpy = None
+
+from restycodes.resty_codes import (CONDITION_NAMES, RestyCodesException,
+                                    _Frame)
+
+
+def getStatusBatch(codes, rows):
+    """
+    Gets the status code of each row of conditions.
+
+    The nodes are visited once each in the order they were loaded, which
+    puts every node after all the nodes that lead to it. At each node the
+    rows that reached it are selected, the column of its condition is
+    tested for all of them at once and they are moved on to the left or
+    right node. The columns of the cases of a switch node are tested in
+    turn. Only a method that is not read directly, see
+    `RestyCodes.OPAQUE_CONDITIONS`, is called once for each row reaching it.
+
+    :Parameters:
+      codes : `RestyCodes`
+        The loaded instance.
+      rows : ``numpy.ndarray``
+        An N x 49 array of `bool`, the columns in `CONDITION_NAMES` order.
+
+    :Returns:
+      A ``numpy.ndarray`` of N `int` status codes.
+
+    :Raises:
+      RestyCodesException : If NumPy is not installed, the array is not
+      N x 49 or the tree has a switch node that is not read directly.
+    """
+    if numpy is None:
+        msg = "NumPy is needed to evaluate a batch."
+        raise RestyCodesException(msg)
+
+    if [index for index in codes._switches if codes._cases[index] is None]:
+        msg = ("A tree with switch nodes that are not read directly cannot "
+               "be evaluated in a batch.")
+        raise RestyCodesException(msg)
+
+    rows = numpy.asarray(rows, dtype=bool)
+
+    if rows.ndim != 2 or rows.shape[1] != len(CONDITION_NAMES):
+        msg = "The array must be N x {}, found {}.".format(
+            len(CONDITION_NAMES), rows.shape)
+        raise RestyCodesException(msg)
+
+    columns = dict([(name, index)
+                    for index, name in enumerate(CONDITION_NAMES)])
+    size = len(codes._methods)
+    nodes = numpy.zeros(len(rows), dtype=numpy.int32)
+    result = numpy.empty(len(rows), dtype=numpy.int32)
+    result.fill(codes.DEFAULT_CODE)
+
+    if not size:
+        nodes.fill(-1)
+
+    for index in range(size):
+        selected = numpy.flatnonzero(nodes == index)
+
+        if not len(selected):
+            continue
+
+        condition = codes._conditions[index]
+
+        if codes._cases[index] is not None:
+            _switchRows(codes, index, columns, rows, selected, nodes, result)
+            continue
+        elif condition is None:
+            found = _callMethod(codes, index, rows, selected, result)
+        else:
+            found = rows[selected, columns[condition]]
+
+        for branch, entry, which in (
+            (codes._lefts[index], codes._codes[index][0], found),
+            (codes._rights[index], codes._codes[index][1], ~found)):
+            chosen = selected[which]
+            nodes[chosen] = branch
+
+            if entry is None or not len(chosen):
+                continue
+
+            if entry.__class__ is dict:
+                _setTable(codes._extras[index], entry, columns, rows,
+                          chosen, result)
+            else:
+                result[chosen] = entry
+
+    return result
+
+
+def _callMethod(codes, index, rows, selected, result):
+    """
+    Calls an opaque method for each selected row.
+
+    :Returns:
+      A ``numpy.ndarray`` of `bool` for the selected rows.
+    """
+    method = codes._methods[index]
+    found = numpy.zeros(len(selected), dtype=bool)
+
+    for position, row in enumerate(selected):
+        frame = _Frame(codes)
+        frame._code = int(result[row])
+        kwargs = dict(zip(CONDITION_NAMES, rows[row].tolist()))
+        found[position] = bool(method(frame, **kwargs))
+        result[row] = frame._code
+
+    return found
+
+
+def _switchRows(codes, index, columns, rows, selected, nodes, result):
+    """
+    Moves the selected rows on from a switch node, the rows whose column of
+    a case is the first `True` to its branch and the rest to the False
+    branch.
+    """
+    switch, right = codes._switches[index], codes._rights[index]
+
+    for name, default, bit, code in codes._cases[index]:
+        found = rows[selected, columns[name]]
+        chosen = selected[found]
+        nodes[chosen] = switch.get(name, right)
+
+        if code is not None:
+            result[chosen] = code
+
+        selected = selected[~found]
+
+    nodes[selected] = right
+
+    if codes._codes[index][1] is not None:
+        result[selected] = codes._codes[index][1]
+
+
+def _setTable(extra, table, columns, rows, chosen, result):
+    """
+    Sets the codes of a node whose code depends on its extra conditions.
+    """
+    masks = numpy.zeros(len(chosen), dtype=numpy.int64)
+
+    for name, default in extra:
+        masks |= numpy.where(rows[chosen, columns[name]],
+                             1 << columns[name], 0)
+
+    for mask, code in table.items():
+        if code is not None:
+            result[chosen[masks == mask]] = code
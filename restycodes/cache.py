@@ -0,0 +1,356 @@
+#
+# restycodes/cache.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Cache
+  A bounded least recently used cache of the results of the decision tree
+  keyed on only the conditions that were consulted, and a plain one for the
+  values parsed from request headers.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+from collections import OrderedDict
+
+try:
+    from _thread import allocate_lock
+except ImportError: # pragma: no cover
+    from thread import allocate_lock
+
+
+_MISSING = object()
+
+if hasattr(OrderedDict, 'move_to_end'):
+    _moveToEnd = OrderedDict.move_to_end
+else: # pragma: no cover
+    def _moveToEnd(ordered, key):
+        ordered[key] = ordered.pop(key)
+
+
+class StatusCache(object):
+    """
+    Each entry is keyed on the mask of the conditions consulted on a path
+    through the tree and the values of those conditions. Any mask with the
+    same values for the consulted conditions takes the same path, so the
+    conditions that were never consulted do not split the entries.
+
+    Each mask, or other key, an entry has been found for is kept as an
+    alias of it, up to `ALIASES` of them, so a key seen before is found
+    with one dictionary lookup. A mask not seen before is tried against the
+    `PROBES` consulted masks stored most recently, before it is a miss.
+
+    All methods are thread safe. Finding an entry takes no lock, it only
+    marks the entry as used, so the hit and miss counts can be short by a
+    few when many threads find entries at once. When the cache is full the
+    entries are removed in the order they were stored, an entry used since
+    it was last passed over is kept and marked unused, which is close to
+    least recently used.
+    """
+    ALIASES = 16
+    PROBES = 8
+
+    def __init__(self, maxsize=128):
+        """
+        :Keywords:
+          maxsize : `int`
+            The maximum number of entries. Default is 128.
+        """
+        self._maxsize = maxsize
+        # Each entry is [value, used, aliases, key].
+        self._entries = OrderedDict()
+        self._aliases = {}
+        self._consulted = {}
+        self._probes = ()
+        self._lock = allocate_lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def find(self, key):
+        """
+        Finds the entry of a key it has been stored or found for.
+
+        :Parameters:
+          key : `object`
+            Any hashable key.
+
+        :Returns:
+          The value stored or `None` if the key is not known.
+        """
+        entry = self._aliases.get(key)
+
+        if entry is None:
+            return None
+
+        entry[1] = True
+        self._hits += 1
+        return entry[0]
+
+    def lookup(self, mask, alias=None):
+        """
+        Finds the entry for a mask.
+
+        :Parameters:
+          mask : `int`
+            The conditions that are `True`.
+
+        :Keywords:
+          alias : `object`
+            Another key the entry, if found, can be found by with `find`.
+            Default is `None`.
+
+        :Returns:
+          The value stored or `None` if there is no entry.
+        """
+        entry = self._aliases.get(mask)
+
+        if entry is None:
+            entries = self._entries
+
+            for consulted in self._probes:
+                entry = entries.get((consulted, mask & consulted))
+
+                if entry is not None:
+                    self.__alias(entry, mask)
+                    break
+            else:
+                self._misses += 1
+                return None
+
+        if alias is not None:
+            self.__alias(entry, alias)
+
+        entry[1] = True
+        self._hits += 1
+        return entry[0]
+
+    def store(self, consulted, mask, value, alias=None):
+        """
+        Stores the value for the path that consulted the conditions in
+        `consulted`. An entry is removed if the cache is full.
+
+        :Parameters:
+          consulted : `int`
+            The mask of the conditions consulted on the path.
+          mask : `int`
+            The conditions that are `True`.
+          value : `object`
+            Any value except `None`.
+
+        :Keywords:
+          alias : `object`
+            Another key the entry can be found by with `find`. Default is
+            `None`.
+        """
+        key = (consulted, mask & consulted)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                while len(self._entries) >= self._maxsize:
+                    self.__evict()
+
+                entry = self._entries[key] = [value, False, [], key]
+                self._consulted[consulted] = self._consulted.get(
+                    consulted, 0) + 1
+                self._probes = (consulted,) + tuple(
+                    [probe for probe in self._probes
+                     if probe != consulted])[:self.PROBES - 1]
+
+            self.__addAlias(entry, mask)
+
+            if alias is not None:
+                self.__addAlias(entry, alias)
+
+    def __alias(self, entry, key):
+        with self._lock:
+            if self._entries.get(entry[3]) is entry:
+                self.__addAlias(entry, key)
+
+    def __addAlias(self, entry, key):
+        if len(entry[2]) < self.ALIASES and key not in self._aliases:
+            entry[2].append(key)
+            self._aliases[key] = entry
+
+    def __evict(self):
+        entries = self._entries
+
+        while True:
+            key, entry = entries.popitem(last=False)
+
+            if not entry[1]:
+                break
+
+            entry[1] = False
+            entries[key] = entry
+
+        for alias in entry[2]:
+            del self._aliases[alias]
+
+        consulted = key[0]
+        count = self._consulted[consulted] - 1
+
+        if count:
+            self._consulted[consulted] = count
+        else:
+            del self._consulted[consulted]
+            self._probes = tuple([probe for probe in self._probes
+                                  if probe != consulted])
+
+        self._evictions += 1
+
+    def clear(self):
+        """
+        Removes all the entries and resets the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._consulted.clear()
+            self._probes = ()
+            self._hits = self._misses = self._evictions = 0
+
+    def getStats(self):
+        """
+        Gets the cache statistics.
+
+        :Returns:
+          A `dict` with the ``hits``, ``misses``, ``evictions``, ``size``,
+          ``maxsize`` and ``paths``, the number of consulted masks.
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses,
+                    'evictions': self._evictions,
+                    'size': len(self._entries), 'maxsize': self._maxsize,
+                    'paths': len(self._consulted)}
+
+
+class LRUCache(object):
+    """
+    A bounded least recently used cache. All methods are thread safe.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        :Keywords:
+          maxsize : `int`
+            The maximum number of entries. Default is 256.
+        """
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = allocate_lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Gets the value of a key.
+
+        :Parameters:
+          key : `object`
+            Any hashable key.
+
+        :Keywords:
+          default : `object`
+            The value returned if the key is not found. Default is `None`.
+
+        :Returns:
+          The value stored or `default`.
+        """
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+
+            if value is _MISSING:
+                self._misses += 1
+                return default
+
+            _moveToEnd(self._entries, key)
+            self._hits += 1
+            return value
+
+    def find(self, key, default=None):
+        """
+        Gets the value of a key without the lock, for a value read on every
+        request. The entry is not marked as used, so one only ever found
+        this way is removed in the order it was stored. The statistics are
+        not exact when threads race.
+
+        :Parameters:
+          key : `object`
+            Any hashable key.
+
+        :Keywords:
+          default : `object`
+            The value returned if the key is not found. Default is `None`.
+
+        :Returns:
+          The value stored or `default`.
+        """
+        value = self._entries.get(key, _MISSING)
+
+        if value is _MISSING:
+            self._misses += 1
+            return default
+
+        self._hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Stores the value of a key. The least recently used entry is removed
+        if the cache is full.
+
+        :Parameters:
+          key : `object`
+            Any hashable key.
+          value : `object`
+            The value.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = value
+                _moveToEnd(self._entries, key)
+                return
+
+            while len(self._entries) >= self._maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+            self._entries[key] = value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Removes all the entries and resets the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def getStats(self):
+        """
+        Gets the cache statistics.
+
+        :Returns:
+          A `dict` with the ``hits``, ``misses``, ``evictions``, ``size`` and
+          ``maxsize``.
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses,
+                    'evictions': self._evictions,
+                    'size': len(self._entries), 'maxsize': self._maxsize}
@@ -0,0 +1,168 @@
+#
+# restycodes/conditions.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Conditions
+  An immutable set of the `RESTYARGS` conditions held in a single integer
+  bit field, see `CONDITION_BITS`.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import struct
+
+from restycodes.resty_codes import (CONDITION_NAMES, CONDITION_BITS,
+                                    DEFAULT_MASK,
+                                    InvalidConditionNameException)
+
+
+class Conditions(object):
+    """
+    The conditions are read as attributes, ``conditions.authorized``, and
+    changed with `with_` which returns a new object. Equal conditions have
+    the same hash so they can be used as keys, and `toBytes` gives an eight
+    byte key.
+    """
+    __slots__ = ('_mask',)
+    _STRUCT = struct.Struct('<Q')
+
+    def __init__(self, mask=None):
+        """
+        :Keywords:
+          mask : `int`
+            The mask of the conditions that are `True`. Default is `None`
+            which is the defaults in `RESTYARGS`.
+        """
+        if mask is None:
+            mask = DEFAULT_MASK
+
+        object.__setattr__(self, '_mask', int(mask))
+
+    @classmethod
+    def fromKwargs(cls, **kwargs):
+        """
+        Creates the conditions from keyword arguments, any condition not
+        given has its default from `RESTYARGS`.
+
+        :Parameters:
+          kwargs : `dict`
+            The condition names and values.
+
+        :Returns:
+          A `Conditions` object.
+        """
+        return cls(DEFAULT_MASK)._with(kwargs)
+
+    @classmethod
+    def fromBytes(cls, data):
+        """
+        Creates the conditions from the bytes made by `toBytes`.
+
+        :Parameters:
+          data : `bytes`
+            The eight bytes.
+
+        :Returns:
+          A `Conditions` object.
+        """
+        return cls(cls._STRUCT.unpack(data)[0])
+
+    def with_(self, **kwargs):
+        """
+        Gets a copy of these conditions with some of them changed.
+
+        *Example*
+          ``conditions.with_(authorized=False, acceptExists=True)``
+
+        :Parameters:
+          kwargs : `dict`
+            The condition names and values.
+
+        :Returns:
+          A `Conditions` object.
+        """
+        return self._with(kwargs)
+
+    def _with(self, kwargs):
+        mask = self._mask
+
+        for name, value in list(kwargs.items()):
+            bit = CONDITION_BITS.get(name)
+
+            if bit is None:
+                msg = "Provided key '{}' is not in kwargs.".format(name)
+                raise InvalidConditionNameException(msg)
+
+            if value:
+                mask |= bit
+            else:
+                mask &= ~bit
+
+        return self.__class__(mask)
+
+    def toKwargs(self):
+        """
+        Gets all the conditions as a `dict` like the one returned from
+        `RestyCodes.setConditions`.
+
+        :Returns:
+          A `dict` of condition names and values.
+        """
+        mask = self._mask
+        return dict([(name, bool(mask & CONDITION_BITS[name]))
+                     for name in CONDITION_NAMES])
+
+    def toBytes(self):
+        """
+        Gets the mask as eight little endian bytes.
+
+        :Returns:
+          The `bytes`.
+        """
+        return self._STRUCT.pack(self._mask)
+
+    def __int__(self):
+        return self._mask
+
+    __index__ = __int__
+    __long__ = __int__
+
+    def __hash__(self):
+        return hash(self._mask)
+
+    def __eq__(self, other):
+        return (isinstance(other, Conditions)
+                and self._mask == other._mask)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Conditions are immutable, use with_().")
+
+    def __reduce__(self):
+        return (self.__class__, (self._mask,))
+
+    def __repr__(self):
+        return "{}({:#x})".format(self.__class__.__name__, self._mask)
+
+
+def _condition(bit):
+    return property(lambda self: bool(self._mask & bit))
+
+
+for _name in CONDITION_NAMES:
+    setattr(Conditions, _name, _condition(CONDITION_BITS[_name]))
+
+del _name
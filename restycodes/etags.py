@@ -0,0 +1,179 @@
+#
+# restycodes/etags.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Entity Tags
+  Parses the entity-tag lists of the If-Match and If-None-Match headers and
+  compares them with the entity-tag of a representation, RFC 7232 sections
+  2.3 and 3.
+
+  Each header is parsed into a `TagSet` once, the sets are kept in a bounded
+  cache keyed by the raw header, so a comparison of a header seen before is
+  two set lookups.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+from collections import namedtuple
+
+from restycodes.cache import LRUCache
+
+# The entity-tags of a header. The ``any`` is `True` for ``*``, ``strong``
+# holds the opaque tags of the strong entity-tags and ``opaque`` those of
+# all of them.
+TagSet = namedtuple('TagSet', ('any', 'strong', 'opaque'))
+
+_PARSED = LRUCache(256)
+
+
+def parseTags(header):
+    """
+    Parses an entity-tag list, or ``*``. An entity-tag is a quoted opaque
+    tag with a ``W/`` prefix if it is weak. Anything that is not an
+    entity-tag is skipped.
+
+    *Example*
+      ``parseTags('"xyzzy", W/"r2d2xxxx"')`` returns
+      ``TagSet(any=False, strong=frozenset(['xyzzy']),``
+      ``opaque=frozenset(['xyzzy', 'r2d2xxxx']))``
+
+    :Parameters:
+      header : `str`
+        The raw header value.
+
+    :Returns:
+      A `TagSet`.
+    """
+    tags = _PARSED.get(header)
+
+    if tags is None:
+        if header.strip() == '*':
+            tags = TagSet(True, frozenset(), frozenset())
+        else:
+            strong, opaque = set(), set()
+            size = len(header)
+            start = 0
+
+            while start < size:
+                begin = header.find('"', start)
+
+                if begin == -1:
+                    break
+
+                end = header.find('"', begin + 1)
+
+                if end == -1:
+                    break
+
+                tag = header[begin + 1:end]
+                opaque.add(tag)
+
+                if header[start:begin].strip(' \t,') != 'W/':
+                    strong.add(tag)
+
+                start = end + 1
+
+            tags = TagSet(False, frozenset(strong), frozenset(opaque))
+
+        _PARSED.set(header, tags)
+
+    return tags
+
+
+def parseTag(eTag):
+    """
+    Parses the entity-tag of a representation, the value of its ETag
+    header.
+
+    :Parameters:
+      eTag : `str`
+        The entity-tag, like ``"xyzzy"`` or ``W/"xyzzy"``.
+
+    :Returns:
+      A `tuple` of ``(weak, opaque)`` or `None` if it is not an entity-tag.
+    """
+    eTag = eTag.strip()
+    weak = eTag.startswith('W/')
+
+    if weak:
+        eTag = eTag[2:]
+
+    if len(eTag) < 2 or eTag[0] != '"' or eTag[-1] != '"':
+        return None
+
+    return weak, eTag[1:-1]
+
+
+def strongMatch(header, eTag):
+    """
+    Tests if the entity-tag of a representation matches the header by the
+    strong comparison used by If-Match, both must be strong and have the
+    same opaque tag. ``*`` matches any representation.
+
+    :Parameters:
+      header : `str`
+        The raw header value.
+      eTag : `str`
+        The entity-tag of the representation or `None` if there is no
+        representation.
+
+    :Returns:
+      A `bool`.
+    """
+    if eTag is None:
+        return False
+
+    tags, found = parseTags(header), parseTag(eTag)
+    return tags.any or (found is not None and not found[0]
+                        and found[1] in tags.strong)
+
+
+def weakMatch(header, eTag):
+    """
+    Tests if the entity-tag of a representation matches the header by the
+    weak comparison used by If-None-Match, only the opaque tags must be the
+    same. ``*`` matches any representation.
+
+    :Parameters:
+      header : `str`
+        The raw header value.
+      eTag : `str`
+        The entity-tag of the representation or `None` if there is no
+        representation.
+
+    :Returns:
+      A `bool`.
+    """
+    if eTag is None:
+        return False
+
+    tags, found = parseTags(header), parseTag(eTag)
+    return tags.any or (found is not None and found[1] in tags.opaque)
+
+
+def clearCache():
+    """
+    Removes all the parsed headers.
+    """
+    _PARSED.clear()
+
+
+def getCacheStats():
+    """
+    Gets the statistics of the cache, see `LRUCache.getStats`.
+
+    :Returns:
+      A `dict` of the statistics.
+    """
+    return _PARSED.getStats()
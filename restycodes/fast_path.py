@@ -0,0 +1,362 @@
+#
+# restycodes/fast_path.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Fast Path
+  Counts the paths taken through the tree of a `RestyCodes` and builds a
+  guarded fast path for the most frequent of them. Each path is tested in
+  one expression, a mask is tested with a single ``&`` and compare, and its
+  status is returned without walking the tree. Anything else falls through
+  to the tree.
+
+  The profile of the paths can be saved as JSON and loaded again, so the
+  fast path can be built when a worker starts.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import binascii
+import threading
+
+from restycodes.resty_codes import (STATUS_CODE_MAP, CONDITION_BITS,
+                                    RestyCodes, RestyCodesException,
+                                    StatusResult)
+
+
+class StaleProfileException(RestyCodesException): pass
+
+
+PROFILE_VERSION = 1
+
+
+class PathProfile(object):
+    """
+    The number of times each path through the tree was taken. A path is a
+    `tuple` of the ``(name, branch)`` of each node on it, the method name
+    and the `bool` branch taken, or the result of a switch node, so a
+    profile does not depend on the node indices of a loaded tree.
+    """
+
+    def __init__(self, names=()):
+        """
+        :Keywords:
+          names : `tuple`
+            The method name of each node of the loaded tree, in index order,
+            used by `addTrace`. Default is an empty `tuple`.
+        """
+        self.names = tuple(names)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def addTrace(self, trace):
+        """
+        Counts the path of a trace, see `RulesEngine.enableTracer`.
+
+        :Parameters:
+          trace : `Trace`
+            The trace.
+        """
+        self.addPath(tuple(zip([self.names[index] for index in trace.nodes],
+                               trace.getBranches())))
+
+    def addPath(self, path, count=1):
+        """
+        Counts a path.
+
+        :Parameters:
+          path : `tuple`
+            The ``(name, branch)`` of each node on the path.
+
+        :Keywords:
+          count : `int`
+            The number of times it was taken. Default is 1.
+        """
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + count
+
+    def getTop(self, top):
+        """
+        Gets the most frequent paths.
+
+        :Parameters:
+          top : `int`
+            The number of paths.
+
+        :Returns:
+          A `list` of ``(path, count)``, the most frequent first.
+        """
+        with self._lock:
+            counts = list(self._counts.items())
+
+        counts.sort(key=lambda item: -item[1])
+        return counts[:top]
+
+    def getTotal(self):
+        """
+        :Returns:
+          The number of paths counted.
+        """
+        with self._lock:
+            return sum(self._counts.values())
+
+    def save(self, path, codes):
+        """
+        Saves the profile as JSON with the hash of the tree it was taken
+        from, see `restycodes.table.getTreeHash`.
+
+        :Parameters:
+          path : `str`
+            The file name.
+          codes : `RestyCodes`
+            The instance the profile was taken from.
+        """
+        import json
+        from restycodes.table import getTreeHash
+        data = {'version': PROFILE_VERSION,
+                'treeHash': binascii.hexlify(getTreeHash(codes)).decode(
+                    'ascii'),
+                'paths': [{'count': count,
+                           'path': [list(node) for node in nodes]}
+                          for nodes, count in self.getTop(len(self._counts))]}
+
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+
+    @classmethod
+    def load(cls, path, codes=None):
+        """
+        Loads a profile saved by `save`.
+
+        :Parameters:
+          path : `str`
+            The file name.
+
+        :Keywords:
+          codes : `RestyCodes`
+            If given the profile must have been taken from the same tree.
+            Default is `None`.
+
+        :Returns:
+          A `PathProfile`.
+
+        :Raises:
+          StaleProfileException
+            If the profile is of another version or of another tree.
+        """
+        import json
+        from restycodes.table import getTreeHash
+
+        with open(path) as f:
+            data = json.load(f)
+
+        if data.get('version') != PROFILE_VERSION:
+            msg = "Profile {} is version {}, expected {}.".format(
+                path, data.get('version'), PROFILE_VERSION)
+            raise StaleProfileException(msg)
+
+        if codes is not None and data['treeHash'] != binascii.hexlify(
+            getTreeHash(codes)).decode('ascii'):
+            msg = "Profile {} was taken from another tree.".format(path)
+            raise StaleProfileException(msg)
+
+        profile = cls()
+
+        for entry in data['paths']:
+            profile.addPath(tuple([
+                (name, bool(branch) if isinstance(branch, int) else branch)
+                for name, branch in entry['path']]), entry['count'])
+
+        return profile
+
+
+class FastPath(object):
+    """
+    The guards of the most frequent paths of a `PathProfile`. A path is
+    kept only if every node on it reads its condition directly, see
+    `RestyCodes.OPAQUE_CONDITIONS`, and any code set on it by the extra
+    conditions of a node is the same whatever the values of those not on
+    the path, so that its status depends on nothing else.
+
+    The ``lookup`` attribute is a function, compiled from the guards, that
+    takes a mapping of conditions and returns the `StatusResult` of the
+    first path it is on or `None`. The conditions of a path are read in the
+    order of the tree, so only conditions the tree would read are read.
+    """
+
+    def __init__(self, codes, profile, top=4):
+        """
+        :Parameters:
+          codes : `RestyCodes`
+            The loaded instance.
+          profile : `PathProfile`
+            The paths taken.
+
+        :Keywords:
+          top : `int`
+            The most paths kept. Default is 4.
+        """
+        self.paths = []
+        guards = []
+
+        for nodes, count in profile.getTop(top):
+            guard = self.__findGuard(codes, nodes)
+
+            if guard is None:
+                continue
+
+            kwargs = dict(guard)
+            found = RestyCodes.evaluate(codes, kwargs, True, False)
+
+            if found.path != tuple([name for name, branch in nodes]):
+                continue
+
+            result = StatusResult(found.code,
+                                  STATUS_CODE_MAP.get(found.code, ""),
+                                  found.iterations, None)
+            consulted = expected = 0
+
+            for name, value in guard:
+                consulted |= CONDITION_BITS[name]
+                expected |= value and CONDITION_BITS[name] or 0
+
+            self.paths.append((nodes, count, result))
+            guards.append((consulted, expected, result, guard))
+
+        self.masks = tuple([(consulted, expected, result)
+                            for consulted, expected, result, guard in guards])
+        self.lookup = self.__compileLookup(codes, guards)
+
+    def __findGuard(self, codes, nodes):
+        """
+        Finds the conditions, and their values, of a path.
+
+        :Returns:
+          A `list` of ``(condition, value)`` or `None` if the path is not in
+          the tree or cannot be guarded.
+        """
+        guard, tables, index = [], [], 0 if codes._methods else -1
+
+        for name, branch in nodes:
+            if index == -1 or codes._methods[index].__name__ != name:
+                return None
+
+            condition = codes._conditions[index]
+
+            if codes._cases[index] is not None:
+                index = self.__findCase(codes, index, branch, guard)
+
+                if index is None:
+                    return None
+
+                continue
+
+            if condition is None:
+                return None
+
+            guard.append((condition, branch))
+            entry = codes._codes[index][0 if branch else 1]
+
+            if entry.__class__ is dict:
+                tables.append((entry, codes._extraBits[index]))
+
+            index = codes._lefts[index] if branch else codes._rights[index]
+
+        if index != -1:
+            return None
+
+        # A code that depends on extra conditions must be the same for every
+        # value of those not on the path.
+        consulted = expected = 0
+
+        for condition, value in guard:
+            consulted |= CONDITION_BITS[condition]
+            expected |= value and CONDITION_BITS[condition] or 0
+
+        for table, bits in tables:
+            found = set([code for key, code in table.items()
+                         if key & consulted == expected & bits])
+
+            if len(found) != 1:
+                return None
+
+        return guard
+
+    def __findCase(self, codes, index, branch, guard):
+        """
+        Adds the conditions of the cases of a switch node read up to the
+        case of a path to its guard.
+
+        :Returns:
+          The index of the branch of the case or `None` if the switch has no
+          such case.
+        """
+        names = [name for name, default, bit, code in codes._cases[index]]
+
+        if branch and branch not in names:
+            return None
+
+        for name in names:
+            guard.append((name, name == branch))
+
+            if name == branch:
+                break
+
+        return codes._switches[index].get(branch or None,
+                                          codes._rights[index])
+
+    def __compileLookup(self, codes, guards):
+        """
+        Compiles the function that tests the guards of the paths, in order,
+        against a mapping of conditions.
+        """
+        defaults = dict(zip(codes._conditions, codes._defaults))
+
+        for cases in codes._cases:
+            for name, default, bit, code in cases or ():
+                defaults.setdefault(name, default)
+        namespace = {}
+        lines = ['def lookup(kw):', '    get = kw.get']
+
+        for number, (consulted, expected, result, guard) in enumerate(
+            guards):
+            namespace['_r{}'.format(number)] = result
+            tests = ["{}get({!r}, {!r})".format(
+                '' if value else 'not ', condition, defaults[condition])
+                     for condition, value in guard]
+            lines.append('    if ({}):'.format(
+                '\n            and '.join(tests)))
+            lines.append('        return _r{}'.format(number))
+
+        lines.append('    return None')
+        source = '\n'.join(lines) + '\n'
+        exec(compile(source, '<restycodes fast path>', 'exec'), namespace)
+        self.source = source
+        return namespace['lookup']
+
+    def lookupMask(self, mask):
+        """
+        Finds the status of a mask on the fast path.
+
+        :Parameters:
+          mask : `int`
+            The conditions that are `True`.
+
+        :Returns:
+          A `StatusResult` or `None` if the mask is on none of the paths.
+        """
+        for consulted, expected, result in self.masks:
+            if mask & consulted == expected:
+                return result
+
+        return None
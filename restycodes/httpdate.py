@@ -0,0 +1,158 @@
+#
+# restycodes/httpdate.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+HTTP Date
+  Parses the three HTTP-date formats of RFC 7231 section 7.1.1.1, the
+  IMF-fixdate of RFC 1123, the obsolete RFC 850 date and the asctime date.
+
+  Clients send the same If-Modified-Since and If-Unmodified-Since values
+  over and over, so the dates parsed are kept in a small cache keyed by the
+  raw header.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import time
+
+from restycodes.cache import LRUCache
+
+MONTHS = dict([(name, number + 1) for number, name in enumerate((
+    'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+    'Nov', 'Dec'))])
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+LONG_DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+             'Saturday', 'Sunday')
+_MONTH_DAYS = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+# The two digit fields, and the one digit day of an asctime date.
+_NUMBERS = dict([('{:02d}'.format(number), number) for number in range(61)]
+                + [(str(number), number) for number in range(10)])
+
+_PARSED = LRUCache(128)
+_INVALID = object()
+
+
+def _getTimestamp(year, month, day, clock):
+    """
+    :Returns:
+      The seconds since the epoch of a date and a ``HH:MM:SS`` time, or
+      `None` if they are not valid.
+    """
+    month = MONTHS.get(month)
+    day = _NUMBERS.get(day)
+
+    if (month is None or day is None or not year.isdigit()
+        or len(clock) != 8 or clock[2] != ':' or clock[5] != ':'):
+        return None
+
+    hour = _NUMBERS.get(clock[:2])
+    minute = _NUMBERS.get(clock[3:5])
+    second = _NUMBERS.get(clock[6:])
+    year = int(year)
+
+    if (hour is None or minute is None or second is None or year < 1
+        or day < 1 or hour > 23 or minute > 59 or day > _MONTH_DAYS[month]
+        and not (month == 2 and day == 29 and year % 4 == 0
+                 and (year % 100 != 0 or year % 400 == 0))):
+        return None
+
+    # Days from 1970-01-01 to the date, in a calendar that starts in March
+    # so the leap day is the last day of the year.
+    if month < 3:
+        year -= 1
+        month += 12
+
+    days = (365 * year + year // 4 - year // 100 + year // 400
+            + (153 * (month - 3) + 2) // 5 + day - 719469)
+    return ((days * 24 + hour) * 60 + minute) * 60 + second
+
+
+def parseDate(value, clock=time.time):
+    """
+    Parses an HTTP-date.
+
+    *Example*
+      ``parseDate('Sun, 06 Nov 1994 08:49:37 GMT')``,
+      ``parseDate('Sunday, 06-Nov-94 08:49:37 GMT')`` and
+      ``parseDate('Sun Nov  6 08:49:37 1994')`` all return ``784111777``
+
+    A two digit RFC 850 year that would be more than 50 years in the future
+    of the clock is taken to be in the past century. Both centuries are
+    kept in the cache, so the choice follows the clock.
+
+    :Parameters:
+      value : `str`
+        The raw header value.
+
+    :Keywords:
+      clock : `callable`
+        Returns the current time in seconds since the epoch. Default is
+        ``time.time``.
+
+    :Returns:
+      The seconds since the epoch as an `int` or `None` if it is not an
+      HTTP-date.
+    """
+    found = _PARSED.get(value)
+
+    if found is None:
+        fields = value.split()
+        found = None
+
+        if (len(fields) == 6 and fields[0][:-1] in DAYS
+            and fields[0][-1] == ',' and fields[5] == 'GMT'
+            and len(fields[1]) == 2 and len(fields[3]) == 4):
+            found = _getTimestamp(fields[3], fields[2], fields[1], fields[4])
+        elif (len(fields) == 4 and fields[0][:-1] in LONG_DAYS
+              and fields[0][-1] == ',' and fields[3] == 'GMT'):
+            date = fields[1].split('-')
+
+            if (len(date) == 3 and len(date[0]) == 2 and len(date[2]) == 2
+                and date[2].isdigit()):
+                year = int(date[2]) + 2000
+                found = (year, _getTimestamp(str(year), date[1], date[0],
+                                             fields[2]),
+                         _getTimestamp(str(year - 100), date[1], date[0],
+                                       fields[2]))
+        elif (len(fields) == 5 and fields[0] in DAYS
+              and len(fields[2]) <= 2 and len(fields[4]) == 4):
+            found = _getTimestamp(fields[4], fields[1], fields[2], fields[3])
+
+        _PARSED.set(value, _INVALID if found is None else found)
+    elif found is _INVALID:
+        found = None
+
+    # An RFC 850 date is the year and its time in this and the past century.
+    if found.__class__ is tuple:
+        year, current, past = found
+        found = past if year > time.gmtime(clock()).tm_year + 50 else current
+
+    return found
+
+
+def clearCache():
+    """
+    Removes all the parsed dates.
+    """
+    _PARSED.clear()
+
+
+def getCacheStats():
+    """
+    Gets the statistics of the cache, see `LRUCache.getStats`.
+
+    :Returns:
+      A `dict` of the statistics.
+    """
+    return _PARSED.getStats()
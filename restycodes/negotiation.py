@@ -0,0 +1,245 @@
+#
+# restycodes/negotiation.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Negotiation
+  Parses the Accept, Accept-Language, Accept-Charset and Accept-Encoding
+  headers, RFC 7231 section 5.3, and finds the variant a resource offers
+  that the client prefers.
+
+  The parsed headers, and the variant found for each header and offer, are
+  kept in bounded caches keyed by the raw header, so a header seen before is
+  neither parsed nor matched again.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+from restycodes.cache import LRUCache
+
+MEDIA_TYPE = 'acceptMediaType'
+LANGUAGE = 'acceptLanguage'
+CHARACTER_SET = 'acceptCharacterSet'
+ENCODING = 'acceptEncoding'
+
+_PARSED = LRUCache(256)
+_NEGOTIATED = LRUCache(1024)
+_MISSING = object()
+
+
+def parseHeader(header):
+    """
+    Parses the value of an Accept header into its ranges and their quality
+    values. The parameters of a range other than ``q`` are dropped, a range
+    with an invalid quality value is ignored.
+
+    *Example*
+      ``parseHeader('text/html, */*;q=0.1')`` returns
+      ``(('text/html', 1.0), ('*/*', 0.1))``
+
+    :Parameters:
+      header : `str`
+        The raw header value.
+
+    :Returns:
+      A `tuple` of ``(range, quality)`` in the order of the header, each
+      range in lower case.
+    """
+    parsed = _PARSED.get(header)
+
+    if parsed is None:
+        ranges = []
+
+        for item in header.split(','):
+            params = item.split(';')
+            value = params[0].strip().lower()
+
+            if not value:
+                continue
+
+            quality = 1.0
+
+            for param in params[1:]:
+                name, sep, number = param.partition('=')
+
+                if name.strip().lower() == 'q':
+                    try:
+                        quality = float(number.strip())
+                    except ValueError:
+                        quality = -1.0
+
+            if 0.0 <= quality <= 1.0:
+                ranges.append((value, quality))
+
+        parsed = tuple(ranges)
+        _PARSED.set(header, parsed)
+
+    return parsed
+
+
+def _mediaTypeMatch(value, offer):
+    """
+    :Returns:
+      The precedence of a media range that matches a media type, ``3`` for
+      the type, ``2`` for ``type/*`` and ``1`` for ``*/*``, or `None`.
+    """
+    if value == offer:
+        return 3
+
+    if value == '*/*':
+        return 1
+
+    if value.endswith('/*') and offer.startswith(value[:-1]):
+        return 2
+
+    return None
+
+
+def _languageMatch(value, offer):
+    """
+    :Returns:
+      The precedence of a language range that matches a language tag, see
+      RFC 4647 section 3.3.1, the length of the range or ``0`` for ``*``, or
+      `None`.
+    """
+    if value == offer or offer.startswith(value + '-'):
+        return len(value)
+
+    if value == '*':
+        return 0
+
+    return None
+
+
+def _tokenMatch(value, offer):
+    """
+    :Returns:
+      The precedence of a charset or encoding that matches, ``2`` for the
+      same token and ``1`` for ``*``, or `None`.
+    """
+    if value == offer:
+        return 2
+
+    if value == '*':
+        return 1
+
+    return None
+
+
+_MATCHES = {
+    MEDIA_TYPE: _mediaTypeMatch,
+    LANGUAGE: _languageMatch,
+    CHARACTER_SET: _tokenMatch,
+    ENCODING: _tokenMatch,
+    }
+
+
+def getQuality(kind, ranges, offer):
+    """
+    Gets the quality value of an offered variant, the value of the most
+    specific range that matches it. A variant no range matches has the
+    quality ``0.0``, except the ``identity`` encoding which is acceptable
+    unless it is excluded.
+
+    :Parameters:
+      kind : `str`
+        One of `MEDIA_TYPE`, `LANGUAGE`, `CHARACTER_SET` or `ENCODING`.
+      ranges : `tuple`
+        The ranges from `parseHeader`.
+      offer : `str`
+        The variant in lower case without parameters.
+
+    :Returns:
+      A `float` from ``0.0`` to ``1.0``.
+    """
+    match = _MATCHES[kind]
+    best, quality = None, 0.0
+
+    for value, found in ranges:
+        precedence = match(value, offer)
+
+        if precedence is not None and (best is None or precedence > best):
+            best, quality = precedence, found
+
+    if best is None and kind == ENCODING and offer == 'identity':
+        quality = 1.0
+
+    return quality
+
+
+def negotiate(kind, header, offered):
+    """
+    Finds the offered variant the client prefers. A variant with a quality
+    value of ``0.0`` is not acceptable, of those with the same quality value
+    the first offered is found.
+
+    An empty Accept-Encoding header accepts only ``identity``, any other
+    empty header accepts every variant.
+
+    *Example*
+      ``negotiate(MEDIA_TYPE, 'text/*;q=0.5, application/json',``
+      ``('text/html', 'application/json'))`` returns
+      ``'application/json'``
+
+    :Parameters:
+      kind : `str`
+        One of `MEDIA_TYPE`, `LANGUAGE`, `CHARACTER_SET` or `ENCODING`.
+      header : `str`
+        The raw header value.
+      offered : `tuple`
+        The variants the resource has, media types can have parameters.
+
+    :Returns:
+      The variant from `offered` or `None` if none is acceptable.
+    """
+    offered = tuple(offered)
+    key = (kind, header, offered)
+    found = _NEGOTIATED.get(key, _MISSING)
+
+    if found is _MISSING:
+        ranges = parseHeader(header)
+
+        if not ranges and (kind != ENCODING or header.strip()):
+            found = offered[0] if offered else None
+        else:
+            found, best = None, 0.0
+
+            for offer in offered:
+                quality = getQuality(
+                    kind, ranges, offer.split(';', 1)[0].strip().lower())
+
+                if quality > best:
+                    found, best = offer, quality
+
+        _NEGOTIATED.set(key, found)
+
+    return found
+
+
+def clearCaches():
+    """
+    Removes all the parsed headers and the variants found.
+    """
+    _PARSED.clear()
+    _NEGOTIATED.clear()
+
+
+def getCacheStats():
+    """
+    Gets the statistics of the caches, see `LRUCache.getStats`.
+
+    :Returns:
+      A `dict` with the ``parsed`` and ``negotiated`` statistics.
+    """
+    return {'parsed': _PARSED.getStats(),
+            'negotiated': _NEGOTIATED.getStats()}
@@ -23,8 +23,21 @@ email: carl.nobile@gmail.com
 """
 __docformat__ = "restructuredtext en"
 
+import itertools
+import time
+import types
+import weakref
+from collections import namedtuple
+from timeit import default_timer
+
+try:
+    from collections.abc import Mapping
+except ImportError: # pragma: no cover
+    from collections import Mapping
 
 from rulesengine import RulesEngine
+from restycodes.cache import StatusCache
+from restycodes import negotiation, etags, httpdate
 
 
 STATUS_CODE_MAP = {
@@ -103,18 +116,70 @@ STATUS_CODE_MAP = {
     }
 
 
+STATUS_CATEGORIES = {
+    1: "Informational",
+    2: "Successful",
+    3: "Redirection",
+    4: "Client Error",
+    5: "Server Error",
+    }
+
+
+class Status(namedtuple('Status', 'code reason')):
+    """
+    An immutable status, it unpacks as the ``(code, reason)`` `tuple` it
+    replaces. The ``wsgiStatus`` is the status `str` passed to a WSGI
+    ``start_response``, ``statusLine`` the `bytes` of the HTTP/1.1 status
+    line with its CRLF and ``category`` the first digit of the code, see
+    `STATUS_CATEGORIES`. One is made for each entry in `STATUS_CODE_MAP` when
+    the module is imported, see `getCodeStatus`.
+    """
+
+    def __new__(cls, code, reason):
+        self = super(Status, cls).__new__(cls, code, reason)
+        wsgiStatus = "{} {}".format(code, reason)
+        object.__setattr__(self, 'wsgiStatus', wsgiStatus)
+        object.__setattr__(self, 'statusLine', "HTTP/1.1 {}\r\n".format(
+            wsgiStatus).encode('latin-1'))
+        object.__setattr__(self, 'category', code // 100)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A Status cannot be changed.")
+
+    def __delattr__(self, name):
+        raise AttributeError("A Status cannot be changed.")
+
+    def __reduce__(self):
+        if STATUSES.get(self.code) is self:
+            return (getCodeStatus, (self.code,))
+
+        return (Status, tuple(self))
+
+
+STATUSES = dict([(code, Status(code, reason))
+                 for code, reason in STATUS_CODE_MAP.items()])
+
+
 def getCodeStatus(code):
     '''
-    Get a `tuple` of the response. ex. ``(200, "OK")``.
+    Get a `Status` of the response. ex. ``(200, "OK")``. The same `Status`
+    object is returned for each code in `STATUS_CODE_MAP`, any other code
+    gets a new one with an empty reason.
 
     :Parameters:
       code : `int`
         The HTTP response code.
 
     :Returns:
-      A `tuple` of the response
+      A `Status` of the response
     '''
-    return (code, STATUS_CODE_MAP.get(code, ""))
+    status = STATUSES.get(code)
+
+    if status is None:
+        status = Status(code, "")
+
+    return status
 
 
 RESTYARGS = {
@@ -170,34 +235,1050 @@ RESTYARGS = {
     }
 
 
+# The names in `RESTYARGS` in the order of the diagram. The bit of a
+# condition in a mask is ``1 << index`` of its name.
+CONDITION_NAMES = (
+    'serviceAvailable', 'requestUrlTooLong', 'badRequest', 'authorized',
+    'forbidden', 'notImplemented', 'unsupportedMediaType',
+    'requestEntityTooLarge', 'options', 'commonMethod', 'knownMethod',
+    'methodAllowedOnResource', 'acceptExists', 'acceptMediaTypeAvaliable',
+    'acceptLanguageExists', 'acceptLanguageAvaliable',
+    'acceptCharacterSetExists', 'acceptCharacterSetAvaliable',
+    'acceptEncodingExists', 'acceptEncodingAvaliable', 'resourceExists',
+    'ifMatchExists', 'ifMatchAnyExists', 'eTagInMatch',
+    'ifUnmodifiedSinceExists', 'ifUnmodifiedSinceIsValidDate',
+    'lastModifiedGtIfUnmodifiedSince', 'put', 'applyToDifferentURI',
+    'conflict', 'newResourceCreated', 'resourcePreviouslyExisted',
+    'resourceMovedPermanently', 'resourceMovedTemporarily', 'post',
+    'permitPostToMissingResource', 'redirect', 'ifNoneMatchExists',
+    'ifNoneMatchAnyExists', 'eTagInIfNoneMatch', 'getOrHead',
+    'ifModifiedSinceExists', 'ifModifiedSinceIsValidDate',
+    'ifModifiedSinceGtNow', 'lastModifiedGtIfModifiedSince', 'delete',
+    'methodEnacted', 'responseIncludesAnEntity', 'multipleRepresentation',
+    )
+CONDITION_BITS = dict([(name, 1 << index)
+                       for index, name in enumerate(CONDITION_NAMES)])
+DEFAULT_MASK = sum([CONDITION_BITS[name] for name in CONDITION_NAMES
+                    if RESTYARGS[name]])
+# The value of a condition that is not found.
+_MISSING = object()
+
+
 class RestyCodesException(Exception): pass
 class InvalidConditionNameException(RestyCodesException): pass
 
 
+class _CodeProbe(object):
+    """
+    Stands in for a `RestyCodes` instance when an internal method is called
+    only to find the code it sets.
+    """
+    def __init__(self, default):
+        self.DEFAULT_CODE = default
+        self._code = None
+
+
+class _Frame(object):
+    """
+    Stands in for a `RestyCodes` instance when a method that is not read
+    directly is called by `RestyCodes.evaluate`. The code is set on the
+    frame, any other attribute is read from the instance.
+    """
+    def __init__(self, instance):
+        self._instance = instance
+        self._code = instance.DEFAULT_CODE
+
+    def __getattr__(self, name):
+        return getattr(self._instance, name)
+
+
+class StatusResult(namedtuple('StatusResult',
+                              'code reason iterations path')):
+    """
+    The outcome of `RestyCodes.evaluate`, the status code and its reason,
+    the iteration count and a `tuple` of the names of the methods on the
+    path or `None`.
+    """
+    __slots__ = ()
+
+
+def _replaceNodes(seq, replaced, memo=None):
+    """
+    Copies a tree of nodes with some of its subtrees replaced. A subtree
+    used in many places is copied once, so it is still shared. The new
+    subtrees are copied with the same replacements.
+
+    :Parameters:
+      seq : `list`
+        The tree.
+      replaced : `dict`
+        The new subtree keyed by the ``id`` of the subtree it replaces.
+
+    :Returns:
+      The new tree.
+    """
+    if seq is None:
+        return None
+
+    if memo is None:
+        memo = {}
+
+    if id(seq) in replaced:
+        seq = replaced[id(seq)]
+
+    key = id(seq)
+
+    if key not in memo:
+        memo[key] = [seq[0]] + [
+            dict([(result, _replaceNodes(branch, replaced, memo))
+                  for result, branch in item.items()])
+            if isinstance(item, dict) else _replaceNodes(item, replaced, memo)
+            for item in seq[1:]]
+
+    return memo[key]
+
+
 class RestyCodes(RulesEngine):
     """
     All internal method calls shall return a Boolean.
+
+    The node methods are looked up by name on the class, so an internal
+    method overridden in a subclass is called in place of the one in the
+    tree. Only the internal methods of this class are read directly and
+    cached, see `OPAQUE_CONDITIONS`.
     """
     DEFAULT_CODE = 999
-
-    def __init__(self, storeSeq=False):
+    # The conditions, with their defaults, that an internal method reads
+    # besides its own, which is its name without the leading underscore.
+    EXTRA_CONDITIONS = {
+        '_ifMatchAnyExists': (('resourceExists', False),),
+        '_post': (('resourceExists', False),
+                  ('resourcePreviouslyExisted', False),),
+        '_permitPostToMissingResource': (('resourcePreviouslyExisted',
+                                          False),),
+        '_responseIncludesAnEntity': (('delete', False),),
+        }
+    # The conditions of an internal method that is a switch node, in the
+    # order they are tested. Its result is the name of the first that is
+    # True, or None, see `switchTree`.
+    SWITCH_CONDITIONS = {
+        '_methodKind': ('options', 'commonMethod', 'knownMethod'),
+        '_requestMethod': ('delete', 'post', 'put'),
+        }
+    # The conditions whose internal methods shall always be called, and the
+    # paths through them never cached, as with an overridden method.
+    OPAQUE_CONDITIONS = ()
+    LOADED_ATTRS = RulesEngine.LOADED_ATTRS + (
+        '_conditions', '_defaults', '_extras', '_codes', '_bits',
+        '_extraBits', '_cases', '_opaque')
+    # The tree loaded for each class keyed on the class, see `__init__`.
+    __loaded = weakref.WeakKeyDictionary()
+
+    def __init__(self, storeSeq=False, cacheSize=0):
         """
-        Instantiates the `RulesEngine` and calls its load method.
+        Instantiates the `RulesEngine` and calls its load method. The tree
+        is loaded once for each class, every other instance of the class
+        shares it. A subclass that overrides `nodeTree` or the internal
+        methods has its own.
+
+        :Keywords:
+          storeSeq : `bool`
+            See `RulesEngine`.
+          cacheSize : `int`
+            The number of statuses kept in a `StatusCache`. The default `0`
+            turns the cache off.
         """
         super(RestyCodes, self).__init__(storeSeq=storeSeq)
-        self.load(self.nodeTree)
+        loaded = self.__loaded.get(self.__class__)
+
+        if loaded is not None and loaded['nodeTree'] is self.nodeTree:
+            self._setLoaded(loaded)
+            self._compiled = self._source = None
+        else:
+            self.load(self.nodeTree)
+            self.__keepLoaded()
+
         self._code = self.DEFAULT_CODE
+        self._cache = cacheSize > 0 and StatusCache(cacheSize) or None
+        self._profile = self._fastPath = None
+
+    def _resolveMethod(self, method):
+        """
+        Gets the method of the same name defined on the class of this
+        instance, so that a subclass can override an internal method.
+        """
+        name = getattr(method, '__name__', None)
+
+        for klass in type(self).__mro__:
+            found = klass.__dict__.get(name)
+
+            if isinstance(found, types.FunctionType):
+                return found
+
+        return method
+
+    def _finishLoad(self):
+        """
+        Called once the execution tree is loaded, see
+        `RulesEngine._finishLoad`, then finds the condition read by, and the
+        codes set by, each internal method.
+        """
+        super(RestyCodes, self)._finishLoad()
+        self.__findConditions()
+        self._fastPath = None
+
+    def compile(self):
+        """
+        Compiles the loaded tree, see `RulesEngine.compile`. The tree of a
+        class is compiled once, any other instance of the class that calls
+        this method, and has not loaded another tree, gets the same function.
+
+        :Returns:
+          The compiled function.
+        """
+        loaded = self.__loaded.get(self.__class__)
+        shared = loaded is not None and loaded['_methods'] is self._methods
+
+        if shared and loaded['_compiled'] is not None:
+            self._compiled = loaded['_compiled']
+            self._source = loaded['_source']
+        else:
+            super(RestyCodes, self).compile()
+
+            if shared:
+                self.__keepLoaded()
+
+        return self._compiled
+
+    def __keepLoaded(self):
+        loaded = self._getLoaded()
+        loaded['nodeTree'] = self.nodeTree
+        self.__loaded[self.__class__] = loaded
+
+    def __findConditions(self):
+        """
+        Finds the condition name, its default and the codes set on each
+        branch for every node whose method is one of the internal methods of
+        this class. Any other method is opaque and its condition name is
+        `None`.
+
+        The codes are found by calling the method on a probe for each of
+        the values of the conditions it reads. A code is `None` if the
+        method does not set one, an `int` if it is always the same or a
+        `dict` keyed by the mask of the extra conditions that are `True`.
+
+        The conditions of a switch node, see `SWITCH_CONDITIONS`, are its
+        cases, the ``(condition, default, bit, code)`` of each kept in
+        `_cases` in the order they are read, its condition name is `None`
+        and its False code is that of no case. The cases of any other node
+        are `None`.
+        """
+        conditions, defaults, extras, codes, cases = [], [], [], [], []
+        found = {}
+
+        for method in self._methods:
+            if method not in found:
+                found[method] = self.__findCondition(method)
+
+            condition, default, extra, code, case = found[method]
+            conditions.append(condition)
+            defaults.append(default)
+            extras.append(extra)
+            codes.append(code)
+            cases.append(case)
+
+        self._conditions = tuple(conditions)
+        self._defaults = tuple(defaults)
+        self._extras = tuple(extras)
+        self._codes = tuple(codes)
+        self._bits = tuple([CONDITION_BITS.get(condition, 0)
+                            for condition in conditions])
+        self._extraBits = tuple([self.__extraMask(extra, [True] * len(extra))
+                                 for extra in extras])
+        self._cases = tuple(cases)
+        self._opaque = bool([case for condition, case in zip(conditions, cases)
+                             if condition is None and case is None])
+
+    def __findCondition(self, method):
+        """
+        Finds the condition name, default, extra conditions and codes of a
+        node method.
+
+        :Parameters:
+          method : ``FunctionType``
+            The node method.
+
+        :Returns:
+          A `tuple` of the four values and the cases of a switch node.
+        """
+        name = getattr(method, '__name__', '')
+        condition = name[1:]
+        opaque = None, None, (), (None, None), None
+
+        if name in self.SWITCH_CONDITIONS:
+            return self.__findSwitch(method, self.SWITCH_CONDITIONS[name],
+                                     opaque)
+
+        if (condition not in RESTYARGS
+            or condition in self.OPAQUE_CONDITIONS
+            or RestyCodes.__dict__.get(name) is not method):
+            return opaque
+
+        extra = self.EXTRA_CONDITIONS.get(name, ())
+        codes = tuple([self.__probeCodes(method, condition, extra, result)
+                       for result in (True, False)])
+        return (condition, bool(method(_CodeProbe(self.DEFAULT_CODE))),
+                extra, codes, None)
+
+    def __findSwitch(self, method, names, opaque):
+        """
+        Finds the condition, default and codes of a switch node method, and
+        its other cases, see `__findConditions`. The method is called on a
+        probe for each case, with the conditions before it `False`, and
+        once with them all `False`. The default of each condition is found
+        by calling it with only those before it.
+
+        :Parameters:
+          method : ``FunctionType``
+            The node method.
+          names : `tuple`
+            The conditions of the cases in the order they are tested.
+          opaque : `tuple`
+            The values of an opaque node.
+
+        :Returns:
+          A `tuple` of the five values, or `opaque` if the method is not
+          the internal method or does not return the case of its conditions.
+        """
+        if (RestyCodes.__dict__.get(method.__name__) is not method
+            or [name for name in names if name not in RESTYARGS
+                or name in self.OPAQUE_CONDITIONS]):
+            return opaque
+
+        found = []
+
+        for position, name in enumerate(names + (None,)):
+            kwargs = dict([(earlier, False) for earlier in names[:position]])
+            default = method(_CodeProbe(self.DEFAULT_CODE), **kwargs) == name
+            probe = _CodeProbe(self.DEFAULT_CODE)
+
+            if name is not None:
+                kwargs[name] = True
+
+            if method(probe, **kwargs) != name:
+                return opaque
+
+            found.append((name, default, CONDITION_BITS.get(name, 0),
+                          probe._code))
+
+        return None, None, (), (None, found[-1][3]), tuple(found[:-1])
+
+    def __probeCodes(self, method, condition, extra, result):
+        """
+        Calls an internal method for each value of its extra conditions.
+
+        :Parameters:
+          method : ``FunctionType``
+            The internal method.
+          condition : `str`
+            The name of the condition the method reads.
+          extra : `tuple`
+            The extra ``(name, default)`` conditions the method reads.
+          result : `bool`
+            The value of the condition.
+
+        :Returns:
+          `None`, an `int` or a `dict` keyed by the mask of the extra
+          conditions that are `True`.
+        """
+        table = {}
+
+        for values in itertools.product((True, False), repeat=len(extra)):
+            kwargs = dict(zip([name for name, default in extra], values))
+            kwargs[condition] = result
+            probe = _CodeProbe(self.DEFAULT_CODE)
+            method(probe, **kwargs)
+            table[self.__extraMask(extra, values)] = probe._code
+
+        found = set(table.values())
+        return table if len(found) > 1 else found.pop()
+
+    def __extraMask(self, extra, values):
+        """
+        Gets the mask of the extra conditions that are `True`.
+
+        :Parameters:
+          extra : `tuple`
+            The extra ``(name, default)`` conditions.
+          values : `tuple` or `list`
+            The values of the extra conditions.
+
+        :Returns:
+          An `int` mask.
+        """
+        mask = 0
+
+        for (name, default), value in zip(extra, values):
+            if value:
+                mask |= CONDITION_BITS[name]
+
+        return mask
+
+    def dump(self, **kwargs):
+        """
+        Calls the internal methods on this instance, see `RulesEngine.dump`.
+        The code is kept on this instance as each method sets it.
+
+        :Parameters:
+          kwargs : `dict`
+            The keyword arguments that are passed to the internal method calls.
+
+        :Returns:
+          The Boolean from the last internal method, or the code from the
+          compiled function.
+        """
+        evaluation = RulesEngine.evaluate(self, kwargs, self._storeSeq)
+        self._iterCount = evaluation.iterations
+        self._callSequence = list(evaluation.path or ())
+
+        if evaluation.path is None and self._compiled is not None:
+            self._code = evaluation.result
+
+        return evaluation.result
 
     def getStatus(self, **kwargs):
         """
-        Gets the status after it runs the ``RulesEngine dump`` method.
+        Gets the status, see `evaluate`. The code, the iteration count and
+        the call sequence, if it is being stored, are kept on this instance.
 
         :Parameters:
           kwargs : `dict`
             The keyword arguments that are passed to the internal method calls.
+
+        :Returns:
+          A `Status` of the response, see `getCodeStatus`.
+        """
+        return self._keepResult(self.evaluate(kwargs, self._storeSeq))
+
+    def getStatusByMask(self, mask):
+        """
+        Gets the status for conditions encoded in an `int` mask, see
+        `evaluateMask`. The code, the iteration count and the call sequence,
+        if it is being stored, are kept on this instance.
+
+        :Parameters:
+          mask : `int` or `Conditions`
+            The conditions that are `True`.
+
+        :Returns:
+          A `Status` of the response, see `getCodeStatus`.
+        """
+        return self._keepResult(self.evaluateMask(mask, self._storeSeq))
+
+    def _keepResult(self, result):
+        self._code = result.code
+        self._iterCount = result.iterations
+        self._callSequence = list(result.path or ())
+        return getCodeStatus(result.code)
+
+    def evaluate(self, kwargs, path=False, _trace=True):
+        """
+        Evaluates the tree for the conditions in `kwargs`. The internal
+        methods are not called, the condition of each is read directly from
+        `kwargs` and the codes found when the tree was loaded are used. Any
+        other method is called with a `_Frame` in place of this instance so
+        the code it sets is kept for this call only.
+
+        Nothing is stored on this instance, so one instance can evaluate on
+        many threads at once. If the fast path is on, see `specialize`, the
+        conditions are first tested against its paths. If the cache is on
+        the names and values of the conditions, in the order given, are
+        looked up as they are, which is found at once for conditions seen
+        before. Otherwise they are put in a mask, see `evaluateMask`, with
+        any condition not given taking its default from `RESTYARGS`, and any
+        other method is still called with `kwargs` as given. If the tree has
+        been compiled, and the path is not wanted, the compiled function is
+        called.
+
+        The conditions may be any mapping with a ``get`` method. A mapping
+        that is not a `dict`, like `LazyConditions`, is read only as the
+        nodes are reached so the cache is not used for it.
+
+        :Parameters:
+          kwargs : `dict` or `LazyConditions`
+            The keyword arguments that are passed to the internal method calls.
+
+        :Keywords:
+          path : `bool`
+            If `True` the names of the methods on the path are returned in
+            the `StatusResult`. Default is `False`.
+
+        :Returns:
+          A `StatusResult`.
+        """
+        if _trace and self._tracer is not None:
+            return self._tracer.evaluate(self, RestyCodes.evaluate,
+                                         self.__walk, kwargs, path)
+
+        if self._stats is not None:
+            return self.__walk(kwargs, path)[0]
+
+        if self._fastPath is not None and not path:
+            found = self._fastPath.lookup(kwargs)
+
+            if found is not None:
+                return found
+
+        if self._cache is not None and not path and isinstance(kwargs, dict):
+            try:
+                alias = (tuple(kwargs), tuple(kwargs.values()))
+                found = self._cache.find(alias)
+            except TypeError:
+                alias = found = None
+
+            if found is not None:
+                return found
+
+            mask = DEFAULT_MASK
+
+            for key, value in kwargs.items():
+                bit = CONDITION_BITS.get(key, 0)
+
+                if value:
+                    mask |= bit
+                else:
+                    mask &= ~bit
+
+            return RestyCodes.evaluateMask(self, mask, False, False, kwargs,
+                                           alias)
+
+        frame = _Frame(self)
+
+        if self._compiled is not None and not path:
+            code, count = self._compiled(frame, kwargs)
+            return StatusResult(code, STATUS_CODE_MAP.get(code, ""), count,
+                                None)
+
+        get = kwargs.get
+        conditions, defaults, codes = (self._conditions, self._defaults,
+                                       self._codes)
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches, cases = self._switches, self._cases
+        sequence = [] if path else None
+        index = 0 if methods else -1
+        count = 0
+        code = frame._code
+
+        while index != -1:
+            condition = conditions[index]
+            count += 1
+
+            if condition is not None:
+                result = get(condition, defaults[index])
+
+                if result:
+                    entry = codes[index][0]
+                    branch = lefts[index]
+                else:
+                    entry = codes[index][1]
+                    branch = rights[index]
+            elif cases[index] is not None:
+                result, entry = None, codes[index][1]
+
+                for name, default, bit, case in cases[index]:
+                    if get(name, default):
+                        result, entry = name, case
+                        break
+
+                branch = switches[index].get(result, rights[index])
+            else:
+                frame._code = code
+                result = methods[index](frame, **kwargs)
+                code = frame._code
+                entry = None
+                branch = self._getBranch(index, result)
+
+            if sequence is not None:
+                sequence.append(methods[index].__name__)
+
+            if entry is not None:
+                if entry.__class__ is dict:
+                    entry = self._extraCode(index, entry, get)
+
+                if entry is not None:
+                    code = entry
+
+            index = branch
+
+        return StatusResult(code, STATUS_CODE_MAP.get(code, ""), count,
+                            None if sequence is None else tuple(sequence))
+
+    def __walk(self, kwargs, path):
+        """
+        Evaluates the tree as `evaluate` does, without the cache or the
+        compiled function, keeping the steps for the statistics, see
+        `RulesEngine.enableStats`, and the tracer. The time of a node is
+        that of reading its condition, which includes calling the provider
+        of a `LazyConditions`, or of calling its method.
+
+        :Returns:
+          The `StatusResult` and a `list` of the ``(index, result,
+          seconds)`` of each node on the path.
+        """
+        stats = self._stats
+        timer = default_timer if stats is not None and stats.timing else None
+        get = kwargs.get
+        conditions, defaults, codes = (self._conditions, self._defaults,
+                                       self._codes)
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches, cases = self._switches, self._cases
+        frame = _Frame(self)
+        sequence = [] if path else None
+        steps = []
+        index = 0 if methods else -1
+        code = frame._code
+        elapsed = None
+
+        while index != -1:
+            condition = conditions[index]
+
+            if timer is not None:
+                start = timer()
+
+            if condition is not None:
+                result = get(condition, defaults[index])
+
+                if result:
+                    entry = codes[index][0]
+                    branch = lefts[index]
+                else:
+                    entry = codes[index][1]
+                    branch = rights[index]
+            elif cases[index] is not None:
+                result, entry = None, codes[index][1]
+
+                for name, default, bit, case in cases[index]:
+                    if get(name, default):
+                        result, entry = name, case
+                        break
+
+                branch = switches[index].get(result, rights[index])
+            else:
+                frame._code = code
+                result = methods[index](frame, **kwargs)
+                code = frame._code
+                entry = None
+                branch = self._getBranch(index, result)
+
+            if timer is not None:
+                elapsed = timer() - start
+
+            steps.append((index, result, elapsed))
+
+            if sequence is not None:
+                sequence.append(methods[index].__name__)
+
+            if entry is not None:
+                if entry.__class__ is dict:
+                    entry = self._extraCode(index, entry, get)
+
+                if entry is not None:
+                    code = entry
+
+            index = branch
+
+        if stats is not None:
+            stats.record(steps)
+
+        return StatusResult(code, STATUS_CODE_MAP.get(code, ""), len(steps),
+                            None if sequence is None
+                            else tuple(sequence)), steps
+
+    def _extraCode(self, index, table, get):
+        """
+        Gets the code of a node whose code depends on its extra conditions.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+          table : `dict`
+            The codes keyed by the mask of the extra conditions that are
+            `True`.
+          get : `callable`
+            Gets a condition as ``get(name, default)``.
+
+        :Returns:
+          The `int` code or `None` if the node sets no code.
+        """
+        extra = self._extras[index]
+        return table[self.__extraMask(
+            extra, [get(name, default) for name, default in extra])]
+
+    def _resumeStart(self):
+        return self.DEFAULT_CODE
+
+    def _resumeNode(self, index, kwargs, code):
         """
-        self.dump(**kwargs)
-        return getCodeStatus(self._code)
+        Evaluates one node for `RulesEngine.evaluateResumable`, the state
+        carried on is the code. A node read directly reads its condition
+        and, for the branch whose code needs them, the extra conditions of
+        its codes, such as those of ``_post`` and ``_ifMatchAnyExists``. A
+        switch node reads the conditions of its cases up to the first that
+        is `True`. Any other method is called with a `_Frame` and the keys
+        it reads are not known.
+        """
+        condition = self._conditions[index]
+        get = kwargs.get
+
+        if self._cases[index] is not None:
+            result, entry, keys = None, self._codes[index][1], []
+
+            for name, default, bit, case in self._cases[index]:
+                keys.append(name)
+
+                if get(name, default):
+                    result, entry = name, case
+                    break
+
+            return result, frozenset(keys), code if entry is None else entry
+
+        if condition is None:
+            frame = _Frame(self)
+            frame._code = code
+            result = self._methods[index](frame, **kwargs)
+            return result, None, frame._code
+
+        result = get(condition, self._defaults[index])
+        entry = self._codes[index][0 if result else 1]
+        keys = [condition]
+
+        if entry is not None:
+            if entry.__class__ is dict:
+                entry = self._extraCode(index, entry, get)
+                keys += [name for name, default in self._extras[index]]
+
+            if entry is not None:
+                code = entry
+
+        return result, frozenset(keys), code
+
+    def _resumeResult(self, result, code, count, path):
+        return StatusResult(code, STATUS_CODE_MAP.get(code, ""), count, path)
+
+    def evaluateMask(self, mask, path=False, _trace=True, _kwargs=None,
+                     _key=None):
+        """
+        Evaluates the tree for conditions encoded in an `int` mask, see
+        `CONDITION_BITS` and `Conditions`. The internal methods are not
+        called, each node tests the bit of its condition directly and the
+        codes found when the tree was loaded are used. Any other method is
+        called, as in `evaluate`, with the conditions as keyword arguments.
+
+        If the fast path is on, see `specialize`, or the cache is on, and the
+        path is not wanted, a status found for the same values of the
+        conditions consulted is returned without walking the tree. A path
+        through a method that is not read directly is never cached.
+
+        :Parameters:
+          mask : `int` or `Conditions`
+            The conditions that are `True`.
+
+        :Keywords:
+          path : `bool`
+            If `True` the names of the methods on the path are returned in
+            the `StatusResult`. Default is `False`.
+
+        :Returns:
+          A `StatusResult`.
+        """
+        mask = int(mask)
+
+        if self._stats is not None or _trace and self._tracer is not None:
+            return RestyCodes.evaluate(self, dict(
+                [(name, bool(mask & CONDITION_BITS[name]))
+                 for name in CONDITION_NAMES]), path, _trace)
+
+        if self._fastPath is not None and not path:
+            found = self._fastPath.lookupMask(mask)
+
+            if found is not None:
+                return found
+
+        cache = None if path else self._cache
+
+        if cache is not None:
+            found = cache.lookup(mask, _key)
+
+            if found is not None:
+                return found
+
+        bits, codes, extraBits = self._bits, self._codes, self._extraBits
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches, cases = self._switches, self._cases
+        sequence = [] if path else None
+        index = 0 if bits else -1
+        count = 0
+        code = self.DEFAULT_CODE
+        consulted = 0
+        frame, kwargs = None, _kwargs
+
+        while index != -1:
+            bit = bits[index]
+            count += 1
+
+            if bit:
+                consulted |= bit | extraBits[index]
+
+                if mask & bit:
+                    entry = codes[index][0]
+                    branch = lefts[index]
+                else:
+                    entry = codes[index][1]
+                    branch = rights[index]
+            elif cases[index] is not None:
+                result, entry = None, codes[index][1]
+
+                for name, default, bit, case in cases[index]:
+                    consulted |= bit
+
+                    if mask & bit:
+                        result, entry = name, case
+                        break
+
+                branch = switches[index].get(result, rights[index])
+            else:
+                cache = None
+
+                if frame is None:
+                    frame = _Frame(self)
+
+                if kwargs is None:
+                    kwargs = dict([(name, bool(mask & CONDITION_BITS[name]))
+                                   for name in CONDITION_NAMES])
+
+                frame._code = code
+                result = methods[index](frame, **kwargs)
+                code = frame._code
+                entry = None
+                branch = self._getBranch(index, result)
+
+            if sequence is not None:
+                sequence.append(methods[index].__name__)
+
+            if entry is not None:
+                if entry.__class__ is dict:
+                    entry = entry[mask & extraBits[index]]
+
+                if entry is not None:
+                    code = entry
+
+            index = branch
+
+        result = StatusResult(code, STATUS_CODE_MAP.get(code, ""), count,
+                              None if sequence is None else tuple(sequence))
+
+        if cache is not None:
+            cache.store(consulted, mask, result, _key)
+
+        return result
+
+    def getStatusBatch(self, rows):
+        """
+        Gets the status codes of many rows of conditions at once, see
+        `restycodes.batch.getStatusBatch`. NumPy must be installed.
+
+        :Parameters:
+          rows : ``numpy.ndarray``
+            An N x 49 array of `bool`, the columns in `CONDITION_NAMES`
+            order.
+
+        :Returns:
+          A ``numpy.ndarray`` of N `int` status codes.
+        """
+        from restycodes.batch import getStatusBatch
+        return getStatusBatch(self, rows)
+
+    def getCacheStats(self):
+        """
+        Gets the statistics of the cache, see `StatusCache.getStats`.
+
+        :Returns:
+          A `dict` or `None` if the cache is off.
+        """
+        return self._cache is not None and self._cache.getStats() or None
+
+    def clearCache(self):
+        """
+        Removes all the statuses from the cache, if it is on.
+        """
+        self._cache is not None and self._cache.clear()
+
+    def enableProfile(self, every=1):
+        """
+        Counts the paths taken through the tree in a new `PathProfile`, the
+        tracer is turned on with the profile as its sink, see
+        `RulesEngine.enableTracer`.
+
+        :Keywords:
+          every : `int`
+            One in this many evaluations is counted. Default is 1.
+
+        :Returns:
+          The `PathProfile`.
+        """
+        from restycodes.fast_path import PathProfile
+        self._profile = PathProfile([method.__name__
+                                     for method in self._methods])
+        self.enableTracer(every=every, sink=self._profile.addTrace)
+        return self._profile
+
+    def disableProfile(self):
+        """
+        Stops counting the paths, the tracer is turned off.
+
+        :Returns:
+          The `PathProfile` or `None` if it was not on.
+        """
+        profile, self._profile = self._profile, None
+        self.disableTracer()
+        return profile
+
+    def getProfile(self):
+        """
+        :Returns:
+          The `PathProfile` being counted or `None`.
+        """
+        return self._profile
+
+    def specialize(self, profile, top=4):
+        """
+        Builds a `FastPath` for the most frequent paths of a profile. An
+        evaluation on one of them returns its status from a single guard,
+        any other evaluation walks the tree as before. Loading a tree turns
+        it off.
+
+        *Example*
+          ``codes.specialize(PathProfile.load('profile.json', codes))``
+
+        :Parameters:
+          profile : `PathProfile`
+            The paths taken, see `enableProfile`. If `None` the fast path is
+            turned off.
+
+        :Keywords:
+          top : `int`
+            The most paths kept. Default is 4.
+
+        :Returns:
+          The `FastPath` or `None`.
+        """
+        if profile is None:
+            self._fastPath = None
+        else:
+            from restycodes.fast_path import FastPath
+            self._fastPath = FastPath(self, profile, top)
+
+        return self._fastPath
+
+    def _compileHeader(self, namespace):
+        """
+        Binds the `get` method of the conditions to a local name.
+        """
+        return ['get = kw.get']
+
+    def _compileCondition(self, index, path, namespace):
+        """
+        Reads the condition of an internal method directly. An opaque
+        method is called after the code found so far is set on `this`. A
+        switch node reads its cases in `_compileCases` and needs no lines.
+        """
+        condition = self._conditions[index]
+
+        if self._cases[index] is not None:
+            lines = []
+        elif condition is None:
+            lines = ['this._code = {}'.format(self.__compileCode(path))]
+            lines.extend(super(RestyCodes, self)._compileCondition(
+                index, path, namespace))
+        else:
+            lines = ['_r = get({!r}, {!r})'.format(
+                condition, self._defaults[index])]
+
+        return lines
+
+    def _compileCases(self, index, namespace):
+        """
+        Reads the condition of each case of a switch node directly, in
+        order, the branch of a case the switch has none for is its False
+        branch.
+        """
+        if self._cases[index] is None:
+            return super(RestyCodes, self)._compileCases(index, namespace)
+
+        switch = self._switches[index]
+        return [('get({!r}, {!r})'.format(name, default), name,
+                 switch.get(name, self._rights[index]))
+                for name, default, bit, code in self._cases[index]]
+
+    def _compileLeaf(self, path, namespace):
+        """
+        Returns the code set along the path instead of the last result.
+        """
+        return self.__compileCode(path)
+
+    def _compileCarry(self, path, namespace):
+        """
+        Carries the code set along the path into a helper function.
+        """
+        return self.__compileCode(path)
+
+    def __compileCode(self, path):
+        """
+        Gets the source expression of the code set by the last node in the
+        path that sets one, or the code carried into the function.
+
+        :Parameters:
+          path : `list`
+            The ``(index, result)`` pairs of the nodes.
+
+        :Returns:
+          A source expression.
+        """
+        for position in range(len(path) - 1, -1, -1):
+            index, result = path[position]
+
+            if self._cases[index] is not None:
+                code = dict([(case[0], case[3])
+                             for case in self._cases[index]]).get(
+                    result, self._codes[index][1])
+            elif self._conditions[index] is None:
+                return 'this._code'
+            else:
+                code = self._codes[index][not result]
+
+            if isinstance(code, dict):
+                earlier = self.__compileCode(path[:position])
+                return self.__compileTable(code, self._extras[index], (),
+                                           earlier)
+            elif code is not None:
+                return repr(code)
+
+        return 'this._code if _c is None else _c'
+
+    def __compileTable(self, table, extra, values, earlier):
+        """
+        Gets a conditional expression that selects a code from a table
+        keyed by the values of the extra conditions.
+        """
+        if len(values) == len(extra):
+            code = table[self.__extraMask(extra, values)]
+            return code is None and earlier or repr(code)
+
+        name, default = extra[len(values)]
+        return '({} if get({!r}, {!r}) else {})'.format(
+            self.__compileTable(table, extra, values + (True,), earlier),
+            name, default,
+            self.__compileTable(table, extra, values + (False,), earlier))
 
     def setConditions(self, **kwargs):
         """
@@ -288,6 +1369,20 @@ class RestyCodes(RulesEngine):
         self._code = result and 405 or 501
         return result
 
+    def _methodKind(self, **kwargs):
+        if kwargs.get('options', False):
+            self._code = 200
+            return 'options'
+        elif kwargs.get('commonMethod', True):
+            self._code = self.DEFAULT_CODE
+            return 'commonMethod'
+        elif kwargs.get('knownMethod', True):
+            self._code = 405
+            return 'knownMethod'
+
+        self._code = 501
+        return None
+
     def _acceptExists(self, **kwargs):
         return kwargs.get('acceptExists', False)
 
@@ -438,6 +1533,16 @@ class RestyCodes(RulesEngine):
     def _delete(self, **kwargs):
         return kwargs.get('delete', False)
 
+    def _requestMethod(self, **kwargs):
+        if kwargs.get('delete', False):
+            return 'delete'
+        elif kwargs.get('post', False):
+            return 'post'
+        elif kwargs.get('put', False):
+            return 'put'
+
+        return None
+
     def _methodEnacted(self, **kwargs):
         result = kwargs.get('methodEnacted', True)
         self._code = result and self.DEFAULT_CODE or 202
@@ -501,6 +1606,17 @@ class RestyCodes(RulesEngine):
                      nodeMethodEnacted],
                     nodeMethodEnacted]]]
 
+    # Request Method, the switch equivalent of nodeDelete.
+    nodeRequestMethod = [_requestMethod,
+                         {'delete': nodeMethodEnacted,
+                          'post': [_redirect,
+                                   None,
+                                   nodeMethodEnacted],
+                          'put': [_conflict,
+                                  None,
+                                  nodeMethodEnacted]},
+                         nodeMethodEnacted]
+
     # If Modified Since Exists
     nodeIfModifiedSinceExists = [_ifModifiedSinceExists,
                                  [_ifModifiedSinceIsValidDate,
@@ -580,6 +1696,29 @@ class RestyCodes(RulesEngine):
                            None],
                           nodeAcceptCharacterSet]
 
+    # Method Allowed On Resource
+    nodeMethodAllowedOnResource = [_methodAllowedOnResource,
+                                   [_acceptExists,
+                                    [_acceptMediaTypeAvaliable,
+                                     nodeAcceptLanguage,
+                                     None],
+                                    nodeAcceptLanguage],
+                                   None]
+
+    # Options
+    nodeOptions = [_options,
+                   None,
+                   [_commonMethod,
+                    nodeMethodAllowedOnResource,
+                    [_knownMethod, None, None]]]
+
+    # Method Kind, the switch equivalent of nodeOptions.
+    nodeMethodKind = [_methodKind,
+                      {'options': None,
+                       'commonMethod': nodeMethodAllowedOnResource,
+                       'knownMethod': None},
+                      None]
+
     # Main Tree
     nodeTree = [_serviceAvailable,
                 [_requestUrlTooLong,
@@ -595,20 +1734,87 @@ class RestyCodes(RulesEngine):
                       None,
                       [_requestEntityTooLarge,
                        None,
-                       [_options,
-                        None,
-                        [_commonMethod,
-                         [_methodAllowedOnResource,
-                          [_acceptExists,
-                           [_acceptMediaTypeAvaliable,
-                            nodeAcceptLanguage,
-                            None],
-                           nodeAcceptLanguage],
-                          None],
-                         [_knownMethod, None, None]]]]]]],
+                       nodeOptions]]]],
                    None]]],
                 None]
 
+    # Main Tree with the kind of request method, and the method on an
+    # existing resource, each found by one switch node, see
+    # `RulesEngine.load`. It sets the same codes as nodeTree.
+    switchTree = _replaceNodes(nodeTree, {id(nodeOptions): nodeMethodKind,
+                                          id(nodeDelete): nodeRequestMethod})
+
+
+class LazyConditions(Mapping):
+    """
+    The conditions of a request read as the nodes that need them are
+    reached. A condition is the value set, or the value of its provider
+    which is called the first time the condition is read and then kept for
+    the rest of the evaluation, or its default from `RESTYARGS`.
+
+    Passing the conditions as keyword arguments, as is done for a method
+    that is not read directly, reads all of them.
+    """
+
+    def __init__(self, values, providers):
+        """
+        :Parameters:
+          values : `dict`
+            The conditions already known, it is not changed.
+          providers : `dict`
+            A callable that takes no arguments for each condition that is
+            found only when it is read.
+        """
+        self._values = values
+        self._providers = providers
+        self._provided = {}
+
+    def __getitem__(self, name):
+        value = self.get(name, _MISSING)
+
+        if value is _MISSING:
+            raise KeyError(name)
+
+        return value
+
+    def _provide(self, provider):
+        """
+        Calls a provider.
+
+        :Parameters:
+          provider : `callable`
+            The provider.
+
+        :Returns:
+          The `bool` value of the condition.
+        """
+        return bool(provider())
+
+    def get(self, name, default=None):
+        value = self._values.get(name)
+
+        if value is None:
+            value = self._provided.get(name)
+
+            if value is None:
+                provider = self._providers.get(name)
+
+                if provider is None:
+                    value = RESTYARGS.get(name, default)
+                else:
+                    value = self._provided[name] = self._provide(provider)
+
+        return value
+
+    def __contains__(self, name):
+        return name in RESTYARGS
+
+    def __iter__(self):
+        return iter(RESTYARGS)
+
+    def __len__(self):
+        return len(RESTYARGS)
+
 
 class ConditionHandler(RestyCodes):
     """
@@ -619,13 +1825,54 @@ class ConditionHandler(RestyCodes):
     KNOWN_METHODS = ('TRACE', 'CONNECT', 'MOVE', 'PROPPATCH', 'MKCOL',
                      'COPY', 'UNLOCK',)
 
-    def __init__(self, storeSeq=False):
-        super(ConditionHandler, self).__init__(storeSeq=storeSeq)
+    def __init__(self, storeSeq=False, cacheSize=0, clock=time.time):
+        """
+        :Keywords:
+          storeSeq : `bool`
+            See `RulesEngine`.
+          cacheSize : `int`
+            See `RestyCodes`.
+          clock : `callable`
+            Returns the current time in seconds since the epoch, used by
+            `ifModifiedSince`. Default is `time.time`.
+        """
+        super(ConditionHandler, self).__init__(storeSeq=storeSeq,
+                                               cacheSize=cacheSize)
         self._kwargs = {}
+        self._providers = {}
+        self._clock = clock
 
     def getStatus(self):
-        kwargs = self.setConditions(**self._kwargs)
-        return super(ConditionHandler, self).getStatus(**kwargs)
+        if not self._providers:
+            kwargs = self.setConditions(**self._kwargs)
+            return super(ConditionHandler, self).getStatus(**kwargs)
+
+        self.setConditions(**self._kwargs)
+        return self._keepResult(self.evaluate(
+            LazyConditions(self._kwargs, self._providers), self._storeSeq))
+
+    def setProvider(self, name, provider):
+        """
+        Sets a callable that finds the value of a condition. It is called
+        only if a node that reads the condition is reached, and at most once
+        in each call to `getStatus`, the value is kept for the rest of that
+        evaluation only. A value set for the condition directly is used in
+        place of the provider.
+
+        *Example*
+          ``handler.setProvider('resourceExists', lambda: store.has(key))``
+
+        :Parameters:
+          name : `str`
+            The condition name, see `RESTYARGS`.
+          provider : `callable`
+            A callable that takes no arguments and returns a `bool`.
+        """
+        if name not in RESTYARGS:
+            msg = "Provided key '{}' is not in kwargs.".format(name)
+            raise InvalidConditionNameException(msg)
+
+        self._providers[name] = provider
 
     def requestUrlTooLong(self, url, size):
         self._kwargs['requestUrlTooLong'] = len(url) > size
@@ -637,3 +1884,141 @@ class ConditionHandler(RestyCodes):
         self._kwargs['options'] = method.upper() == 'OPTIONS'
         self._kwargs['commonMethod'] = method.upper() in self.COMMON_METHODS
         self._kwargs['knownMethod'] = method.upper() in self.KNOWN_METHODS
+
+    def acceptMediaType(self, header, offered):
+        """
+        Sets the ``acceptExists`` and ``acceptMediaTypeAvaliable``
+        conditions from the Accept header, see `negotiation.negotiate`.
+
+        :Parameters:
+          header : `str`
+            The raw header value or `None` if there is no header.
+          offered : `tuple`
+            The media types the resource has.
+
+        :Returns:
+          The media type from `offered` that the client prefers or `None`.
+        """
+        return self.__negotiate(negotiation.MEDIA_TYPE, 'acceptExists',
+                                header, offered)
+
+    def acceptLanguage(self, header, offered):
+        """
+        Sets the ``acceptLanguageExists`` and ``acceptLanguageAvaliable``
+        conditions from the Accept-Language header, see `acceptMediaType`.
+        """
+        return self.__negotiate(negotiation.LANGUAGE, 'acceptLanguageExists',
+                                header, offered)
+
+    def acceptCharacterSet(self, header, offered):
+        """
+        Sets the ``acceptCharacterSetExists`` and
+        ``acceptCharacterSetAvaliable`` conditions from the Accept-Charset
+        header, see `acceptMediaType`.
+        """
+        return self.__negotiate(negotiation.CHARACTER_SET,
+                                'acceptCharacterSetExists', header, offered)
+
+    def acceptEncoding(self, header, offered):
+        """
+        Sets the ``acceptEncodingExists`` and ``acceptEncodingAvaliable``
+        conditions from the Accept-Encoding header, see `acceptMediaType`.
+        """
+        return self.__negotiate(negotiation.ENCODING, 'acceptEncodingExists',
+                                header, offered)
+
+    def ifMatch(self, header, eTag):
+        """
+        Sets the ``ifMatchExists``, ``ifMatchAnyExists`` and ``eTagInMatch``
+        conditions from the If-Match header, see `etags.strongMatch`.
+
+        :Parameters:
+          header : `str`
+            The raw header value or `None` if there is no header.
+          eTag : `str`
+            The entity-tag of the current representation, like ``"xyzzy"``,
+            or `None` if there is none.
+        """
+        exists = header is not None
+        self._kwargs['ifMatchExists'] = exists
+        self._kwargs['ifMatchAnyExists'] = (exists
+                                            and etags.parseTags(header).any)
+        self._kwargs['eTagInMatch'] = (not exists
+                                       or etags.strongMatch(header, eTag))
+
+    def ifNoneMatch(self, header, eTag):
+        """
+        Sets the ``ifNoneMatchExists``, ``ifNoneMatchAnyExists`` and
+        ``eTagInIfNoneMatch`` conditions from the If-None-Match header, see
+        `etags.weakMatch` and `ifMatch`.
+        """
+        exists = header is not None
+        self._kwargs['ifNoneMatchExists'] = exists
+        self._kwargs['ifNoneMatchAnyExists'] = (
+            exists and etags.parseTags(header).any)
+        self._kwargs['eTagInIfNoneMatch'] = (exists
+                                             and etags.weakMatch(header, eTag))
+
+    def entityTag(self, ifMatch, ifNoneMatch, eTag):
+        """
+        Sets the six entity-tag conditions, see `ifMatch` and `ifNoneMatch`.
+
+        :Parameters:
+          ifMatch : `str`
+            The raw If-Match header value or `None`.
+          ifNoneMatch : `str`
+            The raw If-None-Match header value or `None`.
+          eTag : `str`
+            The entity-tag of the current representation or `None`.
+        """
+        self.ifMatch(ifMatch, eTag)
+        self.ifNoneMatch(ifNoneMatch, eTag)
+
+    def ifModifiedSince(self, header, lastModified):
+        """
+        Sets the ``ifModifiedSinceExists``, ``ifModifiedSinceIsValidDate``,
+        ``ifModifiedSinceGtNow`` and ``lastModifiedGtIfModifiedSince``
+        conditions from the If-Modified-Since header, see
+        `httpdate.parseDate`. Dates are compared to the second, and the
+        century of a two digit year is found, with the clock.
+
+        :Parameters:
+          header : `str`
+            The raw header value or `None` if there is no header.
+          lastModified : `float`
+            The Last-Modified time of the resource in seconds since the
+            epoch.
+        """
+        date = None if header is None else httpdate.parseDate(header,
+                                                              self._clock)
+        self._kwargs['ifModifiedSinceExists'] = header is not None
+        self._kwargs['ifModifiedSinceIsValidDate'] = date is not None
+        self._kwargs['ifModifiedSinceGtNow'] = (date is None
+                                                or date > self._clock())
+        self._kwargs['lastModifiedGtIfModifiedSince'] = (
+            date is None or int(lastModified) > date)
+
+    def ifUnmodifiedSince(self, header, lastModified):
+        """
+        Sets the ``ifUnmodifiedSinceExists``,
+        ``ifUnmodifiedSinceIsValidDate`` and
+        ``lastModifiedGtIfUnmodifiedSince`` conditions from the
+        If-Unmodified-Since header, see `ifModifiedSince`.
+        """
+        date = None if header is None else httpdate.parseDate(header,
+                                                              self._clock)
+        self._kwargs['ifUnmodifiedSinceExists'] = header is not None
+        self._kwargs['ifUnmodifiedSinceIsValidDate'] = date is not None
+        self._kwargs['lastModifiedGtIfUnmodifiedSince'] = (
+            date is not None and int(lastModified) > date)
+
+    def __negotiate(self, kind, exists, header, offered):
+        if header is None:
+            self._kwargs[exists] = False
+            self._kwargs[kind + 'Avaliable'] = True
+            return offered[0] if offered else None
+
+        found = negotiation.negotiate(kind, header, offered)
+        self._kwargs[exists] = True
+        self._kwargs[kind + 'Avaliable'] = found is not None
+        return found
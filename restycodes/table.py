@@ -0,0 +1,318 @@
+#
+# restycodes/table.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Decision Table
+  Every reachable path of the `RestyCodes` tree compiled into a binary file
+  of fixed size records that is memory mapped when it is read, so processes
+  reading the same file share one copy of it.
+
+  The table is written with:
+
+    ``python -m restycodes.table <path>``
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import hashlib
+import mmap
+import os
+import struct
+
+from restycodes.resty_codes import (CONDITION_NAMES, RestyCodes,
+                                    RestyCodesException, getCodeStatus)
+
+
+class StaleTableException(RestyCodesException): pass
+
+
+MAGIC = b'RSTYTBL\0'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sI32sIi')
+_RECORD = struct.Struct('<B3xii')
+
+
+def getTreeHash(codes):
+    """
+    Gets a hash of everything the table is built from, the condition names,
+    the default code, the nodes and the codes set on each branch. A table
+    built from a different tree has a different hash.
+
+    :Parameters:
+      codes : `RestyCodes`
+        The loaded instance.
+
+    :Returns:
+      The 32 `bytes` of a SHA-256 digest.
+    """
+    nodes = []
+
+    for index, method in enumerate(codes._methods):
+        entries = [sorted(entry.items()) if entry.__class__ is dict
+                   else entry for entry in codes._codes[index]]
+        nodes.append((getattr(method, '__name__', ''),
+                      codes._conditions[index], codes._lefts[index],
+                      codes._rights[index], codes._extras[index], entries)
+                     + ((sorted(codes._switches[index].items()),
+                         codes._cases[index])
+                        if index in codes._switches else ()))
+
+    data = repr((CONDITION_NAMES, codes.DEFAULT_CODE, nodes))
+    return hashlib.sha256(data.encode('utf-8')).digest()
+
+
+def buildTable(codes):
+    """
+    Builds the records of the table.
+
+    Each record tests the bit of one condition and holds a reference to the
+    record to go to when it is `True` and when it is `False`. A reference
+    less than zero is a leaf and is the negative status code. A node is
+    written once for each code that can have been set before it is reached,
+    and a node whose code depends on its extra conditions is followed by
+    records that test them, so a lookup needs nothing but the records. A
+    switch node is a record for each of its cases, whose False reference is
+    the record of the next case.
+
+    :Parameters:
+      codes : `RestyCodes`
+        The loaded instance.
+
+    :Returns:
+      A `tuple` of the root reference and a `list` of ``(bit, left, right)``
+      records.
+
+    :Raises:
+      RestyCodesException : If a node is not read directly from a condition,
+      see `RestyCodes.OPAQUE_CONDITIONS`.
+    """
+    columns = dict([(name, index)
+                    for index, name in enumerate(CONDITION_NAMES)])
+    records = []
+    written = {}
+
+    def node(index, code):
+        if index == -1:
+            return -code
+
+        key = (index, code)
+
+        if key not in written:
+            condition = codes._conditions[index]
+
+            if codes._cases[index] is not None:
+                written[key] = switch(index, code, 0)
+                return written[key]
+
+            if condition is None:
+                msg = "The node '{}' cannot be put in a table.".format(
+                    codes._methods[index].__name__)
+                raise RestyCodesException(msg)
+
+            written[key] = len(records)
+            records.append(None)
+            trueEntry, falseEntry = codes._codes[index]
+            extra = codes._extras[index]
+            records[written[key]] = (
+                columns[condition],
+                branch(codes._lefts[index], trueEntry, extra, code),
+                branch(codes._rights[index], falseEntry, extra, code))
+
+        return written[key]
+
+    def switch(index, code, position):
+        cases = codes._cases[index]
+
+        if position == len(cases):
+            return branch(codes._rights[index], codes._codes[index][1], (),
+                          code)
+
+        name, default, bit, entry = cases[position]
+        records.append(None)
+        offset = len(records) - 1
+        records[offset] = (
+            columns[name],
+            branch(codes._switches[index].get(name, codes._rights[index]),
+                   entry, (), code),
+            switch(index, code, position + 1))
+        return offset
+
+    def branch(index, entry, extra, code, position=0, mask=0):
+        if entry is None:
+            return node(index, code)
+
+        if entry.__class__ is not dict:
+            return node(index, entry)
+
+        if position == len(extra):
+            found = entry[mask]
+            return node(index, code if found is None else found)
+
+        bit = columns[extra[position][0]]
+        records.append(None)
+        offset = len(records) - 1
+        records[offset] = (
+            bit, branch(index, entry, extra, code, position + 1,
+                        mask | (1 << bit)),
+            branch(index, entry, extra, code, position + 1, mask))
+        return offset
+
+    root = node(0 if codes._methods else -1, codes.DEFAULT_CODE)
+    return root, records
+
+
+def writeTable(path, codes=None):
+    """
+    Builds the table and writes it to a file.
+
+    :Parameters:
+      path : `str`
+        The path of the file.
+
+    :Keywords:
+      codes : `RestyCodes`
+        The loaded instance. Default is `None` which is a new `RestyCodes`.
+
+    :Returns:
+      The number of records written.
+    """
+    if codes is None:
+        codes = RestyCodes()
+
+    root, records = buildTable(codes)
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, getTreeHash(codes),
+                             len(records), root))
+
+        for record in records:
+            f.write(_RECORD.pack(*record))
+
+    return len(records)
+
+
+class DecisionTable(object):
+    """
+    A table written by `writeTable` and memory mapped read only. The file
+    is checked against the tree of a `RestyCodes` instance when it is
+    opened, and a table from another tree, or another format, is rejected
+    with a `StaleTableException`.
+    """
+
+    def __init__(self, path, codes=None):
+        """
+        :Parameters:
+          path : `str`
+            The path of the file.
+
+        :Keywords:
+          codes : `RestyCodes`
+            The instance the table must have been built from. Default is
+            `None` which is a new `RestyCodes`.
+        """
+        if codes is None:
+            codes = RestyCodes()
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                msg = "The table '{}' is too short.".format(path)
+                raise StaleTableException(msg)
+
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.__check(path, getTreeHash(codes))
+        except Exception:
+            self._map.close()
+            raise
+
+    def __check(self, path, digest):
+        magic, version, found, count, root = _HEADER.unpack_from(self._map)
+
+        if magic != MAGIC or version != FORMAT_VERSION:
+            msg = "The table '{}' is not format version {}.".format(
+                path, FORMAT_VERSION)
+            raise StaleTableException(msg)
+
+        if found != digest:
+            msg = "The table '{}' was built from another tree.".format(path)
+            raise StaleTableException(msg)
+
+        if len(self._map) != _HEADER.size + count * _RECORD.size:
+            msg = "The table '{}' is the wrong size.".format(path)
+            raise StaleTableException(msg)
+
+        self._count = count
+        self._root = root
+
+    def __len__(self):
+        return self._count
+
+    def lookup(self, mask):
+        """
+        Gets the status code for conditions encoded in an `int` mask.
+
+        :Parameters:
+          mask : `int` or `Conditions`
+            The conditions that are `True`.
+
+        :Returns:
+          The `int` status code.
+        """
+        mask = int(mask)
+        unpack, data = _RECORD.unpack_from, self._map
+        base, size = _HEADER.size, _RECORD.size
+        ref = self._root
+
+        while ref >= 0:
+            bit, left, right = unpack(data, base + ref * size)
+            ref = left if mask >> bit & 1 else right
+
+        return -ref
+
+    def getStatus(self, mask):
+        """
+        Gets the status for conditions encoded in an `int` mask.
+
+        :Parameters:
+          mask : `int` or `Conditions`
+            The conditions that are `True`.
+
+        :Returns:
+          A `tuple` of the response, see `getCodeStatus`.
+        """
+        return getCodeStatus(self.lookup(mask))
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python -m restycodes.table <path>\n")
+        sys.exit(2)
+
+    count = writeTable(sys.argv[1])
+    sys.stdout.write("Wrote {} records to {}\n".format(count, sys.argv[1]))
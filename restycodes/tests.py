@@ -10,17 +10,114 @@ by: Carl J. Nobile
 
 email: carl.nobile@gmail.com
 """
+from __future__ import print_function
+
 __docformat__ = "restructuredtext en"
 
 
+import os
+import pickle
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 from unittest import skip
 from io import StringIO
 
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from restycodes.async_resty_codes import (AsyncRestyCodes,
+                                              AsyncLazyConditions)
+    from restycodes import asgi
+
 from rulesengine import InvalidNodeSizeException
+from restycodes.cache import LRUCache, StatusCache
+from restycodes import negotiation, etags, httpdate
+from restycodes.wsgi import (RestyCodesMiddleware, ENVIRON_KEY,
+                             MAX_URL_LENGTH, ASSUMED_CONDITIONS)
 from restycodes import (RESTYARGS, RestyCodes, ConditionHandler,
-                        InvalidConditionNameException, getCodeStatus,)
+                        RestyCodesException, InvalidConditionNameException,
+                        getCodeStatus, Conditions, CONDITION_NAMES,
+                        StatusResult, DecisionTable, StaleTableException,
+                        writeTable, PathProfile, StaleProfileException,
+                        LazyConditions, STATUS_CODE_MAP, STATUSES, STATUS_CATEGORIES,)
+
+
+_pathRows = []
+
+
+def getPathRows():
+    """
+    Gets a row of conditions for every path through the tree. Each path is
+    walked, the conditions read on it are set to take it and the others are
+    random, and the rows that take the same path are kept once. The rows are
+    found once and shared by the tests.
+
+    :Returns:
+      A `list` of ``(kwargs, expect)``, the `StatusResult`, with its path,
+      the interpreted tree finds for the conditions.
+    """
+    if not _pathRows:
+        rc = RestyCodes()
+        lefts, rights, conditions = rc._lefts, rc._rights, rc._conditions
+        generator = random.Random(2)
+        found = {}
+        stack = [(0, ())]
+
+        while stack:
+            index, path = stack.pop()
+
+            if index == -1:
+                kwargs = dict([(name, generator.random() < 0.5)
+                               for name in CONDITION_NAMES])
+                kwargs.update(path)
+                expect = rc.evaluate(kwargs, path=True)
+                found.setdefault(expect.path, (kwargs, expect))
+                continue
+
+            stack.append((rights[index], path + ((conditions[index], False),)))
+            stack.append((lefts[index], path + ((conditions[index], True),)))
+
+        _pathRows.extend([found[key] for key in sorted(found)])
+
+    return _pathRows
+
+
+def checkPaths(test, evaluate, name, path=False):
+    """
+    Checks that a function finds the same status, in the same number of
+    iterations, as the interpreted tree for every row of `getPathRows`.
+
+    :Parameters:
+      test : `unittest.TestCase`
+        The test that asserts.
+      evaluate : `callable`
+        Called with the conditions of a row, returns a `StatusResult`.
+      name : `str`
+        The name of the function in the message.
+
+    :Keywords:
+      path : `bool`
+        If `True` the paths are compared too. Default is `False`.
+    """
+    for kwargs, expect in getPathRows():
+        if not path:
+            expect = expect._replace(path=None)
+
+        found = evaluate(kwargs)
+        msg = "{} should be {}, found {}, with {}".format(
+            name, expect, found, kwargs)
+        test.assertTrue(found == expect, msg)
 
 
 class TestRestyCodes(unittest.TestCase):
@@ -56,6 +153,11 @@ class TestRestyCodes(unittest.TestCase):
         self.__runTest(4, 401, {'authorized': False,
                                 'acceptExists': True})
 
+    def testNodeCounts(self):
+        counts = self._rc.getNodeCounts()
+        self.assertTrue(counts['tree'] == 22010, counts)
+        self.assertTrue(counts['loaded'] < 60, counts)
+
     def test_serviceAvailable(self):
         self.__runTest(1, 503, {'serviceAvailable': False})
 
@@ -379,12 +481,1756 @@ class TestRestyCodes(unittest.TestCase):
     def __printCalls(self, calls=False):
         if calls:
             seq = self._rc.getCallSequence()
-            print
+            print()
 
             for call in seq:
-                print call
+                print(call)
+
+            print("Total Count: {}".format(len(seq)))
+
+
+class TestRestyCodesCompiled(TestRestyCodes):
+    """
+    Runs the RestyCodes tests on a compiled tree.
+    """
+    def setUp(self):
+        """
+        Create and compile the RestyCodes instance.
+        """
+        self._rc = RestyCodes()
+        self._rc.compile()
+
+    def test_compiledSource(self):
+        source = self._rc.getCompiledSource()
+        self.assertTrue("get('serviceAvailable', True)" in source, source)
+        self.assertTrue("return 503, 1" in source, source)
+
+    def test_compiledMatchesInterpreted(self):
+        """
+        Test every path against the interpreted tree.
+        """
+        checkPaths(self, self._rc.evaluate, "Compiled")
+
+
+class MaskRestyCodes(RestyCodes):
+    """
+    Gets the status through `getStatusByMask`.
+    """
+    def getStatus(self, **kwargs):
+        return self.getStatusByMask(Conditions.fromKwargs(**kwargs))
+
+
+class SwitchRestyCodes(RestyCodes):
+    """
+    Uses the tree with switch nodes on the request method.
+    """
+    nodeTree = RestyCodes.switchTree
+
+
+class TestRestyCodesMask(TestRestyCodes):
+    """
+    Runs the RestyCodes tests with the conditions in a mask.
+    """
+    def setUp(self):
+        """
+        Create the RestyCodes instance.
+        """
+        self._rc = MaskRestyCodes(storeSeq=True)
+
+    def test_maskMatchesKwargs(self):
+        """
+        Test every path, with the names on it, against the keyword
+        arguments.
+        """
+        checkPaths(self, lambda kwargs: self._rc.evaluateMask(
+            Conditions.fromKwargs(**kwargs), path=True), "Mask", path=True)
+
+
+class TestRestyCodesCached(TestRestyCodes):
+    """
+    Runs the RestyCodes tests with the cache on.
+    """
+    def setUp(self):
+        """
+        Create the RestyCodes instance.
+        """
+        self._rc = RestyCodes(cacheSize=64)
+
+    def test_cacheMatchesUncached(self):
+        """
+        Test every path, missed then found in the cache, against the
+        interpreted tree.
+        """
+        def evaluate(kwargs):
+            missed = self._rc.evaluate(kwargs)
+            found = self._rc.evaluate(kwargs)
+            return missed if missed != found else found
+
+        checkPaths(self, evaluate, "Cached")
+
+        stats = self._rc.getCacheStats()
+        self.assertTrue(stats['hits'] > 0, stats)
+        self.assertTrue(stats['evictions'] > 0, stats)
+        self.assertTrue(stats['size'] == 64, stats)
+
+    def test_irrelevantConditions(self):
+        """
+        Test that conditions that are not consulted share an entry.
+        """
+        self._rc.clearCache()
+        conditions = Conditions().with_(serviceAvailable=False)
+
+        for name in CONDITION_NAMES[1:]:
+            status = self._rc.getStatusByMask(conditions.with_(
+                **{name: not RESTYARGS[name]}))
+            self.assertTrue(status[0] == 503, status)
+            self.assertTrue(self._rc.getIterationCount() == 1)
+
+        stats = self._rc.getCacheStats()
+        self.assertTrue(stats['misses'] == 1, stats)
+        self.assertTrue(stats['hits'] == len(CONDITION_NAMES) - 2, stats)
+        self.assertTrue(stats['size'] == 1, stats)
+
+    def test_statusCache(self):
+        """
+        Test that a key seen before is found by its alias, a new mask only
+        by the most recent consulted masks, and that an entry used since it
+        was stored is kept when the cache is full.
+        """
+        cache = StatusCache(3)
+        cache.store(0b0011, 0b0001, 'a', alias='keyA')
+        self.assertTrue(cache.find('keyA') == 'a')
+        self.assertTrue(cache.find('keyB') is None)
+        self.assertTrue(cache.lookup(0b0001) == 'a')
+        self.assertTrue(cache.lookup(0b1101) == 'a')
+        self.assertTrue(cache.lookup(0b0010) is None)
+
+        for number in range(StatusCache.PROBES):
+            cache = StatusCache(StatusCache.PROBES + 1)
+            cache.store(0b0011, 0b0001, 'a')
+
+            for consulted in range(number + 1):
+                cache.store(1 << (consulted + 4), 1 << (consulted + 4),
+                            consulted)
+
+            found = cache.lookup(0b0101)
+            expect = 'a' if number < StatusCache.PROBES - 1 else None
+            self.assertTrue(found == expect, (number, found))
+
+        cache = StatusCache(2)
+        cache.store(0b01, 0b01, 'a')
+        cache.store(0b10, 0b10, 'b')
+        self.assertTrue(cache.lookup(0b01) == 'a')
+        cache.store(0b100, 0b100, 'c')
+        self.assertTrue(cache.lookup(0b01) == 'a')
+        self.assertTrue(cache.lookup(0b10) is None)
+        stats = cache.getStats()
+        self.assertTrue((stats['hits'], stats['misses'], stats['evictions'],
+                         stats['size']) == (2, 1, 1, 2), stats)
+
+    def test_cacheSpeed(self):
+        """
+        Test that the cache is faster than the tree on many paths in use at
+        once, from a mask and from keyword arguments. The best of many
+        interleaved runs of each is compared.
+        """
+        rows = [kwargs for kwargs, expect in getPathRows()[::128]][:128]
+        masks = [Conditions.fromKwargs(**kwargs) for kwargs in rows]
+        rc, cached = RestyCodes(), RestyCodes(cacheSize=len(rows))
+
+        def run(call, values):
+            start = time.time()
+
+            for value in values:
+                call(value)
+
+            return time.time() - start
+
+        for name, values, most in (('evaluateMask', masks, 0.5),
+                                   ('evaluate', rows, 0.8)):
+            run(getattr(cached, name), values)
+            uncached, found = [], []
+
+            for repeat in range(20):
+                uncached.append(run(getattr(rc, name), values))
+                found.append(run(getattr(cached, name), values))
+
+            ratio = min(found) / min(uncached)
+            self.assertTrue(ratio < most, "{} with the cache is {:.2f} "
+                            "times without it".format(name, ratio))
+
+    def test_overriddenCondition(self):
+        """
+        Test that an overridden internal method is called, and the paths
+        through it are not cached.
+        """
+        class TokenCodes(RestyCodes):
+            token = 'good'
+
+            def _authorized(self, **kwargs):
+                result = self.token == 'good'
+                self._code = result and self.DEFAULT_CODE or 401
+                return result
+
+        rc = TokenCodes(cacheSize=16)
+        self.assertTrue(rc.getStatus()[0] == 200)
+        rc.token = 'bad'
+        self.assertTrue(rc.getStatus()[0] == 401)
+        self.assertTrue(rc.getStatus(badRequest=True)[0] == 400)
+        stats = rc.getCacheStats()
+        self.assertTrue(stats['size'] == 1, stats)
+
+    def test_overriddenConditionKwargs(self):
+        """
+        Test that an overridden internal method gets the keyword arguments
+        as given, including those not in RESTYARGS, when the cache is on.
+        """
+        class TokenCodes(RestyCodes):
+            def _authorized(self, **kwargs):
+                result = kwargs.get('token') == 'good'
+                self._code = result and self.DEFAULT_CODE or 401
+                return result
+
+        for cacheSize in (0, 16):
+            rc = TokenCodes(cacheSize=cacheSize)
+
+            for token, code in (('good', 200), ('bad', 401), (None, 401),
+                                ('good', 200)):
+                kwargs = rc.setConditions()
+                kwargs['token'] = token
+                found = rc.evaluate(kwargs)
+                msg = "Should be {} for {!r}, cache {}, found {}".format(
+                    code, token, cacheSize, found)
+                self.assertTrue(found.code == code, msg)
+                self.assertTrue(rc.getStatus(**kwargs)[0] == code, msg)
+
+    def test_opaqueConditions(self):
+        """
+        Test that a condition in OPAQUE_CONDITIONS is never cached.
+        """
+        class OpaqueCodes(RestyCodes):
+            OPAQUE_CONDITIONS = ('serviceAvailable',)
+
+        rc = OpaqueCodes(cacheSize=16)
+
+        for repeat in range(3):
+            self.assertTrue(rc.getStatus()[0] == 200)
+
+        stats = rc.getCacheStats()
+        self.assertTrue(stats['size'] == 0 and stats['hits'] == 0, stats)
+
+
+class TestRestyCodesEvaluate(unittest.TestCase):
+    """
+    Tests for the stateless evaluation API.
+    """
+    THREADS = 8
+
+    def setUp(self):
+        """
+        Get the expected status of every path, see `getPathRows`.
+        """
+        self._expected = [(kwargs, expect.code, expect.iterations)
+                          for kwargs, expect in getPathRows()]
+        # The threads get one row of each status and one in 64 of the rest.
+        statuses = {}
+
+        for row in self._expected:
+            statuses.setdefault(row[1], row)
+
+        self._threadRows = list(statuses.values()) + self._expected[::64]
+
+    def test_evaluate(self):
+        """
+        Test that the result has the code, reason, iterations and path and
+        that the instance is not changed.
+        """
+        rc = RestyCodes()
+        kwargs = rc.setConditions(authorized=False)
+        result = rc.evaluate(kwargs, path=True)
+        self.assertTrue(isinstance(result, StatusResult))
+        self.assertTrue(result.code == 401, result)
+        self.assertTrue(result.reason == 'Unauthorized', result)
+        self.assertTrue(result.iterations == len(result.path), result)
+        self.assertTrue(result.path[-1] == '_authorized', result)
+        self.assertTrue(rc.evaluate(kwargs).path is None)
+        self.assertTrue(rc.getIterationCount() == 0)
+        self.assertTrue(rc.getCallSequence() == [])
+        self.assertTrue(rc._code == rc.DEFAULT_CODE)
+
+    def test_status(self):
+        """
+        Test that each status is made once, unpacks as the old tuple and
+        carries its WSGI status, status line and category.
+        """
+        rc = RestyCodes()
+
+        for code, reason in STATUS_CODE_MAP.items():
+            status = getCodeStatus(code)
+            self.assertTrue(status is STATUSES[code], status)
+            self.assertTrue(status == (code, reason), status)
+            found, text = status
+            self.assertTrue((found, text) == (code, reason), status)
+            self.assertTrue(status.wsgiStatus == "{} {}".format(
+                code, reason), status.wsgiStatus)
+            self.assertTrue(status.statusLine == "HTTP/1.1 {} {}\r\n".format(
+                code, reason).encode('latin-1'), status.statusLine)
+            self.assertTrue(status.category == code // 100, status)
+            self.assertTrue(pickle.loads(pickle.dumps(status)) is status)
+
+        status = rc.getStatus(**rc.setConditions(authorized=False))
+        self.assertTrue(status is STATUSES[401], status)
+        self.assertTrue(STATUS_CATEGORIES[status.category] == "Client Error")
+        self.assertTrue(getCodeStatus(299) == (299, ""))
+        self.assertRaises(AttributeError, setattr, status, 'wsgiStatus', "")
+        self.assertRaises(AttributeError, setattr, status, 'other', None)
+
+    def test_sharedTree(self):
+        """
+        Test that the tree is loaded, and compiled, once for each class.
+        """
+        class OtherCodes(RestyCodes):
+            nodeTree = [RestyCodes.__dict__['_serviceAvailable'], None, None]
+
+        first, second = RestyCodes(), RestyCodes()
+        self.assertTrue(first._methods is second._methods)
+        self.assertTrue(ConditionHandler()._methods is not first._methods)
+        other = OtherCodes()
+        self.assertTrue(len(other._methods) == 1, other._methods)
+        self.assertTrue(OtherCodes()._methods is other._methods)
+        first.compile()
+        self.assertTrue(second._compiled is None)
+        second.compile()
+        self.assertTrue(second._compiled is first._compiled)
+        self.assertTrue(other.getStatus(serviceAvailable=False)[0] == 503)
+        self.assertTrue(first.getStatus(serviceAvailable=False)[0] == 503)
+
+    def test_evaluateMask(self):
+        """
+        Test that the mask and kwargs results are the same.
+        """
+        rc = RestyCodes()
+
+        checkPaths(self, lambda kwargs: rc.evaluateMask(
+            Conditions.fromKwargs(**kwargs), path=True), "Mask", path=True)
+
+    def test_dump(self):
+        """
+        Test that dump calls the internal methods on the instance and keeps
+        the code and iteration count as getStatus does.
+        """
+        rc = RestyCodes()
+
+        for kwargs, code, iterations in self._expected:
+            rc.dump(**kwargs)
+            msg = "Should be {} in {}, found {} in {}, with {}".format(
+                code, iterations, rc._code, rc.getIterationCount(), kwargs)
+            self.assertTrue((rc._code, rc.getIterationCount()) == (
+                code, iterations), msg)
+
+    def test_threads(self):
+        """
+        Test that one instance gives the right status on many threads at
+        once, interpreted, compiled and cached, including with overridden
+        methods that are called with a frame on each thread.
+        """
+        class FrameCodes(RestyCodes):
+            def _authorized(self, **kwargs):
+                result = kwargs.get('authorized', True)
+                self._code = result and self.DEFAULT_CODE or 401
+                return result
+
+            def _post(self, **kwargs):
+                return RestyCodes.__dict__['_post'](self, **kwargs)
+
+        compiled, frameCompiled = RestyCodes(), FrameCodes()
+        compiled.compile()
+        frameCompiled.compile()
+        self.assertTrue(FrameCodes()._conditions.count(None) > 1)
+
+        for rc in (RestyCodes(), compiled, RestyCodes(cacheSize=64),
+                   FrameCodes(), frameCompiled, FrameCodes(cacheSize=64)):
+            self.__runThreads(rc)
+
+    @unittest.skipUnless(getattr(sys, '_is_gil_enabled', lambda: True)()
+                         is False, "Needs a free-threaded build with the "
+                         "GIL disabled.")
+    def test_freeThreaded(self):
+        """
+        Test that one instance gives the right status on many more threads
+        than cores with the GIL disabled, interpreted, compiled, cached and
+        from a mask.
+        """
+        compiled = RestyCodes()
+        compiled.compile()
+        cached = RestyCodes(cacheSize=64)
+
+        class MaskCodes(RestyCodes):
+            def evaluate(self, kwargs):
+                return self.evaluateMask(Conditions.fromKwargs(**kwargs))
+
+        for rc in (RestyCodes(), compiled, cached, MaskCodes(cacheSize=64)):
+            self.__runThreads(rc, self.THREADS * 4)
+
+    def test_stats(self):
+        """
+        Test that the statistics count every node reached and its branch,
+        that the results do not change and that they are kept on many
+        threads at once.
+        """
+        rc = RestyCodes(cacheSize=64)
+        rc.compile()
+        self.assertTrue(rc.getStats() is None)
+        rc.enableStats()
+
+        for kwargs, code, iterations in self._expected:
+            found = rc.evaluate(kwargs)
+            self.assertTrue((found.code, found.iterations) == (
+                code, iterations), found)
+            rc.evaluateMask(Conditions.fromKwargs(**kwargs))
+
+        stats = rc.getStats()
+        self.assertTrue(stats['evaluations'] == len(self._expected) * 2,
+                        stats['evaluations'])
+        total = sum([iterations for kwargs, code, iterations
+                     in self._expected]) * 2
+        self.assertTrue(sum([node.hits for node in stats['nodes']]) == total)
+        root = stats['nodes'][0]
+        self.assertTrue(root.name == '_serviceAvailable', root)
+        falses = len([kwargs for kwargs, code, iterations in self._expected
+                      if not kwargs['serviceAvailable']]) * 2
+        self.assertTrue(root.falses == falses, root)
+        self.assertTrue(root.seconds == 0 and sum(root.histogram) == 0, root)
+        rc.resetStats()
+        self.assertTrue(rc.getStats()['evaluations'] == 0)
+        self.__runThreads(rc)
+        stats = rc.getStats()
+        self.assertTrue(stats['evaluations'] == len(self._threadRows) * 5
+                        * self.THREADS, stats['evaluations'])
+        rc.disableStats()
+        self.assertTrue(rc.getStats() is None)
+
+    def test_statsTiming(self):
+        """
+        Test that the time of each node read is kept, including the
+        provider of a condition.
+        """
+        ch = ConditionHandler()
+        ch.enableStats(timing=True)
+        ch.setProvider('resourceExists', lambda: time.sleep(0.002) or True)
+        self.assertTrue(ch.getStatus() == (200, "OK"))
+        nodes = ch.getStats()['nodes']
+        found = [node for node in nodes if node.name == '_resourceExists']
+        self.assertTrue(found[0].hits == 1, found)
+        self.assertTrue(found[0].seconds >= 0.002, found)
+        self.assertTrue(found[0].histogram[-3] == 1, found)
+        reached = [node for node in nodes if node.hits]
+        self.assertTrue(all([sum(node.histogram) == node.hits
+                             for node in reached]), reached)
+
+    def test_tracer(self):
+        """
+        Test that the sampled evaluations are traced with the same path and
+        status, by count and by predicate, on many threads at once.
+        """
+        rc = RestyCodes(cacheSize=64)
+        rc.compile()
+        rc.enableTracer(size=len(self._expected), every=7)
+
+        for kwargs, code, iterations in self._expected:
+            self.assertTrue(rc.evaluateMask(Conditions.fromKwargs(
+                **kwargs)).code == code)
+
+        traces = rc.drainTraces()
+        self.assertTrue(len(traces) == (len(self._expected) + 6) // 7,
+                        len(traces))
+
+        for trace in traces:
+            kwargs, code, iterations = self._expected[trace.number]
+            expect = rc.evaluate(kwargs, path=True, _trace=False)
+            self.assertTrue(trace.result == code, trace)
+            self.assertTrue(rc.getTraceNames(trace) == expect.path, trace)
+            self.assertTrue(len(trace.getBranches()) == iterations, trace)
+
+        rc.enableTracer(size=16, predicate=lambda found: found.code == 503)
+        self.__runThreads(rc)
+        traces = rc.drainTraces()
+        self.assertTrue(len(traces) == 16, len(traces))
+        self.assertTrue(all([trace.result == 503 and list(trace.nodes) == [0]
+                             for trace in traces]), traces[:3])
+
+        # A traced evaluation calls each node method once.
+        calls = []
+
+        class CountedCodes(RestyCodes):
+            def _serviceAvailable(self, **kwargs):
+                calls.append(kwargs)
+                return RestyCodes.__dict__['_serviceAvailable'](self,
+                                                                **kwargs)
+
+        cc = CountedCodes()
+        cc.enableTracer(size=32, predicate=lambda found: found.code != 200)
+        rows = self._expected[:32]
+
+        for kwargs, code, iterations in rows:
+            self.assertTrue(cc.evaluate(kwargs).code == code)
+
+        self.assertTrue(len(calls) == len(rows), len(calls))
+        traces = cc.drainTraces()
+        self.assertTrue([trace.number for trace in traces] == [
+            number for number, (kwargs, code, iterations) in enumerate(rows)
+            if code != 200], traces)
+
+    def test_fastPath(self):
+        """
+        Test that a fast path built from a profile gives the same status as
+        the tree for every condition and mask, on and off its paths.
+        """
+        rc = RestyCodes()
+        profile = rc.enableProfile()
+
+        for kwargs, code, iterations in self._expected:
+            rc.evaluate(kwargs)
+
+        self.assertTrue(rc.disableProfile() is profile)
+        self.assertTrue(rc.getProfile() is None)
+        self.assertTrue(profile.getTotal() == len(self._expected),
+                        profile.getTotal())
+        fastPath = rc.specialize(profile, top=8)
+        self.assertTrue(0 < len(fastPath.paths) <= 8, fastPath.paths)
+
+        for kwargs, code, iterations in self._expected:
+            found = rc.evaluate(kwargs)
+            self.assertTrue((found.code, found.iterations) == (
+                code, iterations), (kwargs, code, found))
+            found = rc.evaluateMask(Conditions.fromKwargs(**kwargs))
+            self.assertTrue((found.code, found.iterations) == (
+                code, iterations), (kwargs, code, found))
+
+        # The most frequent path is found by the guard alone.
+        nodes, count, result = fastPath.paths[0]
+        index, kwargs = 0, {}
+
+        for name, branch in nodes:
+            kwargs[rc._conditions[index]] = branch
+            index = rc._lefts[index] if branch else rc._rights[index]
+
+        self.assertTrue(fastPath.lookup(kwargs) is result)
+        rc.load(rc.nodeTree)
+        self.assertTrue(rc._fastPath is None)
+        self.assertTrue(rc.specialize(None) is None)
+
+    def test_fastPathProfile(self):
+        """
+        Test that a profile saved as JSON loads with the same counts, and
+        that a profile of another tree is rejected.
+        """
+        class NotFoundCodes(RestyCodes):
+            DEFAULT_CODE = 404
+
+        rc = RestyCodes()
+        profile = rc.enableProfile(every=3)
+
+        for kwargs, code, iterations in self._expected:
+            rc.evaluate(kwargs)
+
+        rc.disableProfile()
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'profile.json')
+
+        try:
+            profile.save(path, rc)
+            loaded = PathProfile.load(path, rc)
+            total = (len(self._expected) + 2) // 3
+            self.assertTrue(dict(loaded.getTop(total)) == dict(
+                profile.getTop(total)))
+            self.assertTrue(loaded.getTotal() == total, loaded.getTotal())
+            self.assertRaises(StaleProfileException, PathProfile.load, path,
+                              NotFoundCodes())
+            self.assertFalse(issubclass(StaleProfileException,
+                                        StaleTableException))
+
+            with open(path, 'w') as f:
+                f.write('{"version": 0}')
+
+            self.assertRaises(StaleProfileException, PathProfile.load, path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_resume(self):
+        """
+        Test that resuming an evaluation with changed conditions finds the
+        same status as a new evaluation, including the nodes whose codes
+        read more than one condition.
+        """
+        rc = RestyCodes()
+        resumable = rc.evaluateResumable(rc.setConditions())
+
+        for kwargs, code, iterations in self._expected:
+            found = rc.resume(resumable, kwargs)
+            self.assertTrue((found.evaluation.code, len(found.steps)) == (
+                code, iterations), (kwargs, code, found.evaluation))
+
+        kwargs = rc.setConditions(resourceExists=False, post=True)
+        resumable = rc.evaluateResumable(kwargs)
+        names = resumable.evaluation.path
+
+        for changed in ({'resourcePreviouslyExisted': True},
+                        {'permitPostToMissingResource': True},
+                        {'ifMatchExists': True}, {'post': False}):
+            changed = dict(kwargs, **changed)
+            found = rc.resume(resumable, changed)
+            expect = rc.evaluate(changed, path=True)
+            self.assertTrue(found.evaluation == expect, (changed, found))
+            self.assertTrue(found.evaluation.path[:found.reused]
+                            == names[:found.reused], found)
+            self.assertTrue(found.reused > 0, found)
+
+        # Only the conditions the nodes read are found from the providers.
+        calls = []
+
+        def provider(name):
+            return lambda: calls.append(name) or RESTYARGS[name]
+
+        providers = dict([(name, provider(name)) for name in RESTYARGS])
+        resumable = rc.evaluateResumable(LazyConditions({}, providers))
+        read = set(resumable.values)
+        msg = "Read {}, found {}".format(sorted(read), sorted(calls))
+        self.assertTrue(sorted(calls) == sorted(read), msg)
+        self.assertTrue(len(read) < len(RESTYARGS), msg)
+        condition = resumable.steps[-1][2] - frozenset(
+            [name for step in resumable.steps[:-1] for name in step[2]])
+        condition = list(condition)[0]
+        changed = {condition: not resumable.values[condition]}
+        del calls[:]
+        found = rc.resume(resumable, LazyConditions(dict(changed), providers))
+        expect = rc.evaluate(dict(rc.setConditions(), **changed), path=True)
+        msg = "Resumed should be {}, found {}".format(expect, found)
+        self.assertTrue(found.evaluation == expect, msg)
+        self.assertTrue(found.reused == len(resumable.steps) - 1, msg)
+        self.assertTrue(set(calls) <= set(found.values), msg)
+        self.assertTrue(len(found.values) < len(RESTYARGS), msg)
+
+    def test_serializedTree(self):
+        """
+        Test that the tree loaded from its binary form finds every status
+        the class tree does.
+        """
+        rc = RestyCodes()
+        rc.loadBytes(RestyCodes().toBytes())
+        self.assertTrue(rc._codes == RestyCodes()._codes)
+
+        for kwargs, code, iterations in self._expected:
+            found = rc.evaluate(kwargs)
+            self.assertTrue((found.code, found.iterations) == (
+                code, iterations), (kwargs, code, found))
+
+    def __methodRows(self):
+        rc = RestyCodes()
+        names = ('options', 'commonMethod', 'knownMethod',
+                 'methodAllowedOnResource')
+        rows = []
+
+        for number in range(2 ** len(names)):
+            for method in ('delete', 'post', 'put', None):
+                kwargs = dict([(name, bool(number & 1 << position))
+                               for position, name in enumerate(names)])
+
+                if method is not None:
+                    kwargs[method] = True
+
+                rows.append(rc.setConditions(**kwargs))
+
+        return rows
+
+    def __switchRows(self, count):
+        rc = RestyCodes()
+        generator = random.Random(25)
+        rows = []
+
+        for number in range(count):
+            rows.append(rc.setConditions(**dict(
+                [(name, generator.random() < 0.5)
+                 for name in ('delete', 'post', 'put', 'redirect',
+                              'conflict', 'methodEnacted',
+                              'responseIncludesAnEntity',
+                              'multipleRepresentation', 'ifMatchExists',
+                              'ifNoneMatchExists')])))
+
+        return rows
+
+    def test_switchTree(self):
+        """
+        Test that the tree with switch nodes on the request method finds
+        every status the binary tree does, in no more iterations, when
+        interpreted, compiled, cached, from a mask and resumed.
+        """
+        rc, sc, compiled = RestyCodes(), SwitchRestyCodes(), \
+            SwitchRestyCodes()
+        cached = SwitchRestyCodes(cacheSize=64)
+        compiled.compile()
+        self.assertTrue(sc._switches, sc._switches)
+        self.assertFalse(sc._opaque)
+        cases = []
+
+        for index in sc._switches:
+            self.assertTrue(sc._conditions[index] is None)
+            cases.append([case[0] for case in sc._cases[index]])
+
+        self.assertTrue(sorted(cases) == [
+            ['delete', 'post', 'put'],
+            ['options', 'commonMethod', 'knownMethod']], cases)
+        rows = [kwargs for kwargs, code, iterations in self._expected]
+        rows.extend(self.__switchRows(500))
+        rows.extend(self.__methodRows())
+        resumable = sc.evaluateResumable(rc.setConditions())
+        fewer = 0
+
+        for kwargs in rows:
+            expect = rc.evaluate(kwargs)
+            found = sc.evaluate(kwargs)
+            msg = "Status should be {}, found {}, with {}".format(
+                expect, found, kwargs)
+            self.assertTrue(found.code == expect.code, msg)
+            self.assertTrue(found.iterations <= expect.iterations, msg)
+            fewer += found.iterations < expect.iterations
+            self.assertTrue(compiled.evaluate(kwargs) == found, msg)
+            self.assertTrue(cached.evaluate(kwargs) == found, msg)
+            self.assertTrue(cached.evaluate(kwargs) == found, msg)
+            self.assertTrue(sc.evaluateMask(Conditions.fromKwargs(
+                **kwargs)) == found, msg)
+            self.assertTrue(sc.resume(resumable, kwargs).evaluation.code
+                            == expect.code, msg)
+
+        self.assertTrue(fewer > 0, fewer)
+        # Paths through the switch are kept in the cache.
+        stats = cached._cache.getStats()
+        self.assertTrue(stats['hits'] > len(rows) // 2, stats)
+
+    def test_switchTreeProviders(self):
+        """
+        Test that the switch node reads its cases up to the first True one,
+        so the providers of the later cases are not called.
+        """
+        calls = []
+
+        def provider(name):
+            return lambda: calls.append(name) or name == 'post'
+
+        sc = SwitchRestyCodes()
+        providers = dict([(name, provider(name))
+                          for name in ('delete', 'post', 'put')])
+        found = sc.evaluate(LazyConditions({}, providers))
+        self.assertTrue(calls == ['delete', 'post'], calls)
+        expect = RestyCodes().evaluate(RestyCodes().setConditions(post=True))
+        self.assertTrue(found.code == expect.code, (expect, found))
+        resumable = sc.evaluateResumable(LazyConditions({}, providers))
+        self.assertTrue(set(['delete', 'post']) <= set(resumable.values))
+        self.assertFalse('put' in resumable.values, resumable.values)
+        # The kind of method is not read past options on an OPTIONS request.
+        del calls[:]
+        providers = dict([(name, provider(name))
+                          for name in ('commonMethod', 'knownMethod')])
+        found = sc.evaluate(LazyConditions({'options': True}, providers))
+        self.assertTrue(calls == [] and found.code == 200, (calls, found))
+        found = sc.evaluate(LazyConditions({}, providers))
+        self.assertTrue(calls == ['commonMethod', 'knownMethod'], calls)
+        self.assertTrue(found.code == 501, found)
+
+    def test_switchTreeFastPath(self):
+        """
+        Test that a fast path is built through the switch node and gives
+        the same status as the tree.
+        """
+        rc, sc = RestyCodes(), SwitchRestyCodes()
+        rows = self.__switchRows(500)
+        profile = sc.enableProfile()
+
+        for kwargs in rows:
+            sc.evaluate(kwargs)
+
+        sc.disableProfile()
+        fastPath = sc.specialize(profile, top=16)
+        cases = set([branch for nodes, count, result in fastPath.paths
+                     for name, branch in nodes if name == '_requestMethod'])
+        self.assertTrue(set(['delete', 'post']) <= cases, cases)
+
+        for kwargs in rows:
+            expect = rc.evaluate(kwargs)
+            found = sc.evaluate(kwargs)
+            self.assertTrue(found.code == expect.code, (kwargs, found))
+            found = sc.evaluateMask(Conditions.fromKwargs(**kwargs))
+            self.assertTrue(found.code == expect.code, (kwargs, found))
+
+    def test_switchTreeOpaque(self):
+        """
+        Test that an overridden switch method is called, like any other
+        overridden method.
+        """
+        class OverriddenCodes(SwitchRestyCodes):
+            def _requestMethod(self, **kwargs):
+                return 'put' if kwargs.get('post') else None
+
+        rc, oc = RestyCodes(), OverriddenCodes()
+        self.assertTrue(oc._opaque)
+        kwargs = rc.setConditions(post=True)
+        self.assertTrue(oc.evaluate(kwargs).code == rc.evaluate(
+            rc.setConditions(put=True)).code)
+        self.assertTrue(oc.evaluate(rc.setConditions()).code == rc.evaluate(
+            rc.setConditions()).code)
+
+    def test_switchTreeSpeed(self):
+        """
+        Test that the switch tree is not slower than the binary tree on the
+        rows that reach the request method. The best of many interleaved
+        runs of each is compared.
+        """
+        rc, sc = RestyCodes(), SwitchRestyCodes()
+        rows = self.__switchRows(50)
+        masks = [Conditions.fromKwargs(**kwargs) for kwargs in rows]
+
+        def run(call, values):
+            start = time.time()
+
+            for value in values:
+                call(value)
+
+            return time.time() - start
+
+        for name, values in (('evaluate', rows), ('evaluateMask', masks)):
+            binary, switch = [], []
+
+            for repeat in range(30):
+                binary.append(run(getattr(rc, name), values))
+                switch.append(run(getattr(sc, name), values))
+
+            ratio = min(switch) / min(binary)
+            self.assertTrue(ratio < 1.2, "{} of the switch tree is {:.2f} "
+                            "times the binary tree".format(name, ratio))
+
+    def __runThreads(self, rc, count=THREADS):
+        rows = self._threadRows
+        errors = []
+        start = threading.Event()
+
+        def run(offset):
+            start.wait()
+
+            for repeat in range(5):
+                for kwargs, code, iterations in (rows[offset:]
+                                                 + rows[:offset]):
+                    try:
+                        found = rc.evaluate(kwargs)
+                    except Exception as e:
+                        errors.append((kwargs, code, e))
+                        continue
+
+                    if (found.code, found.iterations) != (code, iterations):
+                        errors.append((kwargs, code, found))
+
+        threads = [threading.Thread(target=run, args=(
+            index * len(rows) // count,)) for index in range(count)]
+
+        # Switch threads as often as possible, so they interleave within
+        # each evaluation where the GIL is held.
+        if hasattr(sys, 'setswitchinterval'):
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+        else: # pragma: no cover
+            interval = sys.getcheckinterval()
+            sys.setcheckinterval(1)
+
+        try:
+            for thread in threads:
+                thread.start()
+
+            start.set()
+
+            for thread in threads:
+                thread.join()
+        finally:
+            if hasattr(sys, 'setswitchinterval'):
+                sys.setswitchinterval(interval)
+            else: # pragma: no cover
+                sys.setcheckinterval(interval)
+
+        self.assertTrue(not errors, errors[:3])
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed.")
+class TestRestyCodesBatch(unittest.TestCase):
+    """
+    Tests for the NumPy batch evaluator.
+    """
+
+    def setUp(self):
+        """
+        Create the RestyCodes instance.
+        """
+        self._rc = RestyCodes()
+
+    def __rows(self):
+        rows = numpy.array([[kwargs[name] for name in CONDITION_NAMES]
+                            for kwargs, expect in getPathRows()], dtype=bool)
+        return getPathRows(), rows
+
+    def test_batchMatchesScalar(self):
+        """
+        Test every path against the interpreted tree.
+        """
+        pathRows, rows = self.__rows()
+        found = self._rc.getStatusBatch(rows)
+        self.assertTrue(found.shape == (len(rows),))
+
+        for (kwargs, expect), code in zip(pathRows, found):
+            msg = "Should be {}, found {}, with {}".format(
+                expect.code, code, kwargs)
+            self.assertTrue(code == expect.code, msg)
+
+    def test_opaqueConditions(self):
+        """
+        Test that an opaque method is called for each row.
+        """
+        class OpaqueCodes(RestyCodes):
+            OPAQUE_CONDITIONS = ('authorized', 'ifMatchAnyExists')
+
+        rc = OpaqueCodes()
+        pathRows, rows = self.__rows()
+        found = rc.getStatusBatch(rows)
+
+        for (kwargs, expect), code in zip(pathRows, found):
+            self.assertTrue(code == expect.code, kwargs)
+
+    def test_switchTree(self):
+        """
+        Test that the tree with a switch node on the request method finds
+        the same status as the binary tree for every row.
+        """
+        kwargsList, rows = self.__rows()
+        random = numpy.random.RandomState(25)
+        rows = numpy.vstack((rows, random.rand(2000, len(CONDITION_NAMES))
+                             < 0.5))
+        expect = self._rc.getStatusBatch(rows)
+        found = SwitchRestyCodes().getStatusBatch(rows)
+        self.assertTrue((found == expect).all(), (found != expect).sum())
+
+    def test_badShape(self):
+        """
+        Test that an array of the wrong shape raises an exception.
+        """
+        self.assertRaises(RestyCodesException, self._rc.getStatusBatch,
+                          numpy.zeros((3, 5), dtype=bool))
+
+
+class TestDecisionTable(unittest.TestCase):
+    """
+    Tests for the memory mapped decision table.
+    """
+
+    def setUp(self):
+        """
+        Write the table to a temporary directory.
+        """
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'codes.tbl')
+        self._rc = RestyCodes()
+        self._count = writeTable(self._path, self._rc)
+
+    def tearDown(self):
+        """
+        Remove the temporary directory.
+        """
+        shutil.rmtree(self._dir)
+
+    @unittest.skipIf(sys.version_info < (3, 7), "Imported eagerly.")
+    def test_lazyImport(self):
+        """
+        Test that importing the packages does not import the table, the
+        profile or the statistics, and that their names are still found on
+        the packages when first used.
+        """
+        modules = ('threading', 'hashlib', 'mmap', 'json',
+                   'restycodes.table', 'restycodes.fast_path',
+                   'rulesengine.node_stats', 'rulesengine.tracer')
+        statement = ("import sys, restycodes, rulesengine; "
+                     "print([name for name in {!r} "
+                     "if name in sys.modules])").format(modules)
+        output = subprocess.check_output(
+            [sys.executable, '-c', statement],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertTrue(output.strip() == b'[]', output)
+        import restycodes, rulesengine
+        from restycodes.fast_path import FastPath
+        from rulesengine.tracer import Tracer
+        self.assertTrue(restycodes.DecisionTable is DecisionTable)
+        self.assertTrue(restycodes.FastPath is FastPath)
+        self.assertTrue(rulesengine.Tracer is Tracer)
+        self.assertRaises(AttributeError, getattr, rulesengine, '_missing')
+
+    def test_lookup(self):
+        """
+        Test every path against the interpreted tree.
+        """
+        with DecisionTable(self._path, self._rc) as table:
+            self.assertTrue(len(table) == self._count)
+
+            for kwargs, expect in getPathRows():
+                found = table.getStatus(Conditions.fromKwargs(**kwargs))
+                msg = "Should be {}, found {}, with {}".format(
+                    expect, found, kwargs)
+                self.assertTrue(found == expect[:2], msg)
+
+    def test_staleTable(self):
+        """
+        Test that a table from another tree, or a damaged file, is rejected.
+        """
+        class NotFoundCodes(RestyCodes):
+            DEFAULT_CODE = 404
+
+        self.assertRaises(StaleTableException, DecisionTable, self._path,
+                          NotFoundCodes())
+
+        with open(self._path, 'rb') as f:
+            data = f.read()
+
+        for damaged in (b'', data[:-1], b'X' + data[1:]):
+            with open(self._path, 'wb') as f:
+                f.write(damaged)
+
+            self.assertRaises(StaleTableException, DecisionTable,
+                              self._path, self._rc)
+
+    def test_switchTree(self):
+        """
+        Test that the table of the tree with a switch node on the request
+        method finds the same status as the binary tree.
+        """
+        sc = SwitchRestyCodes()
+        path = os.path.join(self._dir, 'switch.tbl')
+        writeTable(path, sc)
+        self.assertRaises(StaleTableException, DecisionTable, path,
+                          self._rc)
+        generator = random.Random(25)
+        masks = [generator.getrandbits(len(CONDITION_NAMES))
+                 for count in range(2000)]
+
+        with DecisionTable(path, sc) as table:
+            for mask in masks:
+                expect = self._rc.getStatusByMask(mask)
+                found = table.getStatus(mask)
+                msg = "Should be {}, found {}, with {!r}".format(
+                    expect, found, mask)
+                self.assertTrue(found == expect, msg)
+
+    def test_opaqueConditions(self):
+        """
+        Test that a tree with an opaque node cannot be written.
+        """
+        class OpaqueCodes(RestyCodes):
+            OPAQUE_CONDITIONS = ('serviceAvailable',)
+
+        self.assertRaises(RestyCodesException, writeTable, self._path,
+                          OpaqueCodes())
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "Needs asyncio coroutines.")
+class TestAsyncRestyCodes(unittest.TestCase):
+    """
+    Tests for the async RestyCodes.
+    """
+    AWAITED = ('authorized', 'resourceExists', 'ifMatchAnyExists',
+               'conflict')
+
+    def setUp(self):
+        """
+        Create an async RestyCodes whose awaited methods wait on the event
+        loop before returning.
+        """
+        def later(name):
+            method = RestyCodes.__dict__[name]
+
+            def call(self, **kwargs):
+                return asyncio.sleep(0, method(self, **kwargs))
+
+            call.__name__ = name
+            return call
+
+        self._arc = type('LaterCodes', (AsyncRestyCodes,), dict(
+            [('_' + name, later('_' + name)) for name in self.AWAITED]))()
+        self._rc = RestyCodes(storeSeq=True)
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+    def tearDown(self):
+        """
+        Close the event loop.
+        """
+        asyncio.set_event_loop(None)
+        self._loop.close()
+
+    def test_lazyImport(self):
+        """
+        Test that importing the packages does not import asyncio, and that
+        the async classes are still found on them when first used.
+        """
+        statement = ("import sys, restycodes, rulesengine; "
+                     "print('asyncio' in sys.modules)")
+        output = subprocess.check_output(
+            [sys.executable, '-c', statement],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertTrue(output.strip() == b'False', output)
+
+        if sys.version_info >= (3, 7):
+            import restycodes, rulesengine
+            from rulesengine.async_rules_engine import AsyncRulesEngine
+            self.assertTrue(restycodes.AsyncRestyCodes is AsyncRestyCodes)
+            self.assertTrue(rulesengine.AsyncRulesEngine is AsyncRulesEngine)
+            self.assertRaises(AttributeError, getattr, restycodes, '_missing')
+
+    def test_matchesSync(self):
+        """
+        Test that every path is the same as the interpreted tree, evaluated
+        concurrently.
+        """
+        found = self._loop.run_until_complete(asyncio.gather(
+            *[self._arc.evaluate(kwargs, path=True)
+              for kwargs, expect in getPathRows()]))
+
+        for (kwargs, expect), result in zip(getPathRows(), found):
+            msg = "Async should be {}, found {}".format(expect, result)
+            self.assertTrue(result == expect, msg)
+
+    def test_getStatus(self):
+        """
+        Test the status and dump wrappers.
+        """
+        self._arc._storeSeq = True
+        kwargs = self._rc.setConditions(resourceExists=False)
+        expect = self._rc.getStatus(**kwargs)
+        found = self._loop.run_until_complete(self._arc.getStatus(**kwargs))
+        self.assertTrue(found == expect, found)
+        self.assertTrue(self._arc.getCallSequence()
+                        == self._rc.getCallSequence())
+        mask = Conditions.fromKwargs(**kwargs)
+        found = self._loop.run_until_complete(self._arc.getStatusByMask(mask))
+        self.assertTrue(found == expect, found)
+        self._rc.dump(**kwargs)
+        self.assertTrue(self._loop.run_until_complete(self._arc.dump(
+            **kwargs)) is not None)
+        self.assertTrue(self._arc._code == self._rc._code)
+        self.assertTrue(self._arc.getCallSequence()
+                        == self._rc.getCallSequence())
+
+    def __laterCodes(self, lookahead, budget=None):
+        """
+        Create an async RestyCodes whose awaited methods return a future
+        that is done a little later, recording the most futures pending at
+        once and the futures made.
+        """
+        loop, futures, pending = self._loop, [], [0, 0]
+
+        def later(name):
+            method = RestyCodes.__dict__[name]
+
+            def call(self, **kwargs):
+                value = method(self, **kwargs)
+                future = loop.create_future()
+
+                def done():
+                    pending[0] -= 1
+
+                    if not future.done():
+                        future.set_result(value)
+
+                pending[0] += 1
+                pending[1] = max(pending)
+                loop.call_later(0.001, done)
+                futures.append((name, future))
+                return future
+
+            call.__name__ = name
+            return call
+
+        klass = type('SpeculativeCodes', (AsyncRestyCodes,), dict(
+            [('_' + name, later('_' + name)) for name in self.AWAITED]))
+        klass.SPECULATIVE_CONDITIONS = self.AWAITED
+        klass.CONDITION_COSTS = {'resourceExists': 10}
+        return klass(lookahead=lookahead, budget=budget), futures, pending
+
+    def test_speculative(self):
+        """
+        Test that the lookups ahead are started at once, that none is left
+        pending and that every path is the same as without speculation.
+        """
+        arc, futures, pending = self.__laterCodes(lookahead=16)
+        kwargs = self._rc.setConditions()
+        found = self._loop.run_until_complete(arc.evaluate(kwargs,
+                                                           path=True))
+        expect = self._rc.evaluate(kwargs, path=True)
+        self.assertTrue(found == expect, found)
+        self.assertTrue(pending[1] > 1, pending)
+        names = [name for name, future in futures]
+        self.assertTrue(names[:2] == ['_authorized', '_resourceExists'],
+                        names)
+        self.assertTrue(all([future.done() for name, future in futures]),
+                        futures)
+
+        for kwargs, expect in getPathRows()[::64]:
+            found = self._loop.run_until_complete(arc.evaluate(kwargs,
+                                                               path=True))
+            msg = "Speculative should be {}, found {}".format(expect, found)
+            self.assertTrue(found == expect, msg)
+
+        for values in ({'authorized': False}, {'resourceExists': False}):
+            providers, provided, pending = self.__laterProviders(values)
+            found = self._loop.run_until_complete(arc.evaluate(
+                AsyncLazyConditions({}, providers), path=True))
+            expect = self._rc.evaluate(self._rc.setConditions(**values),
+                                       path=True)
+            msg = "Should be {}, found {}, with {}".format(
+                expect, found, values)
+            self.assertTrue(found == expect, msg)
+
+    def test_speculativeBudget(self):
+        """
+        Test that no more than the budget is started ahead.
+        """
+        arc, futures, pending = self.__laterCodes(lookahead=16, budget=2)
+        kwargs = self._rc.setConditions(serviceAvailable=False)
+        found = self._loop.run_until_complete(arc.evaluate(kwargs))
+        self.assertTrue(found.code == 503, found)
+        names = [name for name, future in futures]
+        self.assertTrue('_resourceExists' not in names, names)
+        self.assertTrue(all([future.cancelled() for name, future in futures]),
+                        futures)
+
+    def __laterProviders(self, values):
+        """
+        Create a coroutine provider for each condition that returns a future
+        that is done a little later, recording the most futures pending at
+        once and the futures made.
+        """
+        loop, futures, pending = self._loop, [], [0, 0]
+
+        def later(name, value):
+            def provide():
+                future = loop.create_future()
+
+                def done():
+                    pending[0] -= 1
+
+                    if not future.done():
+                        future.set_result(value)
+
+                pending[0] += 1
+                pending[1] = max(pending)
+                loop.call_later(0.001, done)
+                futures.append((name, future))
+                return future
+
+            return provide
+
+        providers = dict([(name, later(name, value))
+                          for name, value in values.items()])
+        return providers, futures, pending
+
+    def test_resolve(self):
+        """
+        Test that the providers of the conditions resolved run at the same
+        time, and that only those conditions and the values set are found.
+        """
+        providers, futures, pending = self.__laterProviders(dict(
+            [(name, True) for name in self.AWAITED]))
+        conditions = AsyncLazyConditions({'key': 'one', 'conflict': False},
+                                         providers)
+        found = self._loop.run_until_complete(conditions.resolve(
+            ('authorized', 'resourceExists', 'conflict')))
+        expect = {'key': 'one', 'conflict': False, 'authorized': True,
+                  'resourceExists': True}
+        self.assertTrue(found == expect, found)
+        self.assertTrue(pending[1] == 2, pending)
+        names = sorted([name for name, future in futures])
+        self.assertTrue(names == ['authorized', 'resourceExists'], names)
+
+    def test_opaqueProviders(self):
+        """
+        Test that an overridden method is passed the values set and the
+        conditions it reads, found from their providers, and that the
+        providers of the conditions it does not read are not called.
+        """
+        passed = []
+
+        class OpaqueCodes(AsyncRestyCodes):
+            def _post(self, **kwargs):
+                passed.append(kwargs)
+                return RestyCodes._post(self, **kwargs)
+
+        values = {'post': True, 'resourceExists': False,
+                  'resourcePreviouslyExisted': True, 'conflict': True}
+        providers, futures, pending = self.__laterProviders(values)
+        found = self._loop.run_until_complete(OpaqueCodes().evaluate(
+            AsyncLazyConditions({'key': 'one'}, providers)))
+        expect = self._rc.evaluate(self._rc.setConditions(**values))
+        self.assertTrue(found.code == expect.code, (expect, found))
+        self.assertTrue(passed == [{'key': 'one', 'post': True,
+                                    'resourceExists': False,
+                                    'resourcePreviouslyExisted': True}],
+                        passed)
+        names = [name for name, future in futures]
+        self.assertTrue('conflict' not in names, names)
+
+    def test_speculativeProviders(self):
+        """
+        Test that the providers of the speculative conditions ahead are
+        started at once, that none is left pending, that those not reached
+        are cancelled and that the status is the same as without
+        speculation.
+        """
+        class SpeculativeCodes(AsyncRestyCodes):
+            SPECULATIVE_CONDITIONS = self.AWAITED
+
+        for values in ({}, {'authorized': False}, {'resourceExists': False},
+                       {'ifMatchAnyExists': True, 'resourceExists': False}):
+            values = dict([(name, values.get(name, RESTYARGS[name]))
+                           for name in self.AWAITED])
+            providers, futures, pending = self.__laterProviders(values)
+            found = self._loop.run_until_complete(SpeculativeCodes(
+                lookahead=16).evaluate(AsyncLazyConditions({}, providers),
+                                       path=True))
+            expect = self._rc.evaluate(self._rc.setConditions(**values),
+                                       path=True)
+            msg = "Should be {}, found {}, with {}".format(
+                expect, found, values)
+            self.assertTrue(found == expect, msg)
+            self.assertTrue(pending[1] > 1, pending)
+            self.assertTrue(all([future.done() for name, future in futures]),
+                            futures)
+            reached = set([name[1:] for name in expect.path])
+            cancelled = set([name for name, future in futures
+                             if future.cancelled()])
+            self.assertTrue(not cancelled & reached, (cancelled, reached))
+
+    def test_switchTree(self):
+        """
+        Test that the switch node on the request method awaits the cases it
+        reads, up to the first True one.
+        """
+        class SwitchCodes(AsyncRestyCodes):
+            nodeTree = RestyCodes.switchTree
+
+        calls = []
+
+        def provider(name, value):
+            return lambda: calls.append(name) or asyncio.sleep(0, value)
+
+        for method in ('delete', 'post', 'put'):
+            del calls[:]
+            providers = dict([(name, provider(name, name == method))
+                              for name in ('delete', 'post', 'put')])
+            found = self._loop.run_until_complete(SwitchCodes().evaluate(
+                AsyncLazyConditions({}, providers)))
+            expect = self._rc.evaluate(self._rc.setConditions(
+                **{method: True}))
+            self.assertTrue(found.code == expect.code, (expect, found))
+            names = ['delete', 'post', 'put']
+            self.assertTrue(calls == names[:names.index(method) + 1], calls)
+
+    def test_nothingAwaited(self):
+        """
+        Test that a tree with no overridden methods is evaluated as
+        `RestyCodes` does.
+        """
+        arc = AsyncRestyCodes(cacheSize=16)
+        kwargs = self._rc.setConditions(authorized=False)
+        found = self._loop.run_until_complete(arc.getStatus(**kwargs))
+        self.assertTrue(found == self._rc.getStatus(**kwargs), found)
 
-            print "Total Count: {}".format(len(seq))
+
+class TestRestyCodesMiddleware(unittest.TestCase):
+    """
+    Tests for the WSGI middleware.
+    """
+
+    def setUp(self):
+        """
+        Create the middleware around an application that records its calls.
+        """
+        self._calls = []
+        self._middleware = RestyCodesMiddleware(self.__application,
+                                                maxUrlLength=20,
+                                                maxEntitySize=100)
+
+    def __application(self, environ, start_response):
+        self._calls.append(environ)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'OK']
+
+    def __request(self, middleware=None, **environ):
+        response = []
+        environ.setdefault('REQUEST_METHOD', 'GET')
+        environ.setdefault('PATH_INFO', '/')
+        body = b''.join((middleware or self._middleware)(
+            environ, lambda status, headers: response.extend(
+                [status, headers])))
+        return response[0], dict(response[1]), body
+
+    def test_application(self):
+        """
+        Test that the application is called with the status in the environ.
+        """
+        for method in ('GET', 'HEAD', 'PUT', 'POST', 'DELETE', 'OPTIONS'):
+            status, headers, body = self.__request(REQUEST_METHOD=method)
+            self.assertTrue(status == '200 OK', status)
+            self.assertTrue(body == b'OK', body)
+            self.assertTrue(self._calls[-1][ENVIRON_KEY].code == 200)
+
+    def test_shortCircuit(self):
+        """
+        Test that an error is sent without calling the application.
+        """
+        for environ, code in (
+            ({'REQUEST_METHOD': 'BREW'}, 501),
+            ({'REQUEST_METHOD': 'TRACE'}, 405),
+            ({'PATH_INFO': '/a-very-long-path/'}, 200),
+            ({'PATH_INFO': '/a-very-long-path/', 'QUERY_STRING': 'q=1'},
+             414),
+            ({'REQUEST_METHOD': 'PUT', 'CONTENT_LENGTH': '101'}, 413),
+            ({'REQUEST_METHOD': 'PUT', 'CONTENT_LENGTH': 'lots'}, 400),
+            ):
+            calls = len(self._calls)
+            status, headers, body = self.__request(**environ)
+            self.assertTrue(status.startswith(str(code)), (status, environ))
+
+            if code == 200:
+                self.assertTrue(len(self._calls) == calls + 1)
+            else:
+                self.assertTrue(len(self._calls) == calls, environ)
+                self.assertTrue(body == (status + "\n").encode('ascii'))
+                self.assertTrue(headers['Content-Length'] == str(len(body)))
+
+        status, headers, body = self.__request(REQUEST_METHOD='HEAD',
+                                               QUERY_STRING='q=1234567890abcdefgh')
+        self.assertTrue(status.startswith('414') and body == b'', status)
+
+    def test_providers(self):
+        """
+        Test that a provider is called with the environ only when its node
+        is reached.
+        """
+        calls = []
+
+        def authorized(environ):
+            calls.append(environ['PATH_INFO'])
+            return environ.get('HTTP_AUTHORIZATION') == 'secret'
+
+        middleware = RestyCodesMiddleware(self.__application, providers={
+            'authorized': authorized})
+        status, headers, body = self.__request(middleware)
+        self.assertTrue(status.startswith('401'), status)
+        status, headers, body = self.__request(middleware,
+                                               HTTP_AUTHORIZATION='secret')
+        self.assertTrue(status == '200 OK', status)
+        status, headers, body = self.__request(middleware,
+                                               CONTENT_LENGTH='-1')
+        self.assertTrue(status.startswith('400'), status)
+        self.assertTrue(calls == ['/', '/'], calls)
+        self.assertRaises(InvalidConditionNameException,
+                          RestyCodesMiddleware, self.__application,
+                          providers={'bogus': authorized})
+        self.assertRaises(InvalidConditionNameException,
+                          RestyCodesMiddleware, self.__application,
+                          assumed=('bogus',))
+
+    def test_unknownConditions(self):
+        """
+        Test that a status found with the default of a condition that is not
+        known is not sent, and that it is once the condition is provided.
+        """
+        exists = []
+        provided = RestyCodesMiddleware(self.__application, providers={
+            'methodAllowedOnResource': lambda environ: True,
+            'resourceExists': lambda environ: exists[-1]})
+
+        for middleware in (self._middleware, RestyCodesMiddleware(
+            self.__application, cacheSize=0)):
+            for method, code in (('PUT', 412), ('GET', 304)):
+                calls = len(self._calls)
+                status, headers, body = self.__request(
+                    middleware, REQUEST_METHOD=method,
+                    HTTP_IF_NONE_MATCH='*')
+                self.assertTrue(status == '200 OK', (status, method))
+                self.assertTrue(len(self._calls) == calls + 1, method)
+                self.assertTrue(self._calls[-1][ENVIRON_KEY].code == code,
+                                self._calls[-1][ENVIRON_KEY])
+
+        for method, value, code in (('PUT', True, 412), ('GET', True, 304),
+                                    ('GET', False, 200)):
+            exists.append(value)
+            calls = len(self._calls)
+            status, headers, body = self.__request(
+                provided, REQUEST_METHOD=method, HTTP_IF_NONE_MATCH='*')
+            self.assertTrue(status.startswith(str(code)), (status, method))
+            self.assertTrue(len(self._calls) == calls + (code == 200))
+
+    def test_assumed(self):
+        """
+        Test that with nothing assumed only the conditions from the environ
+        and the providers are known, and that an overridden method finds its
+        own condition.
+        """
+        class ServiceCodes(ConditionHandler):
+            def _serviceAvailable(self, **kwargs):
+                return True
+
+        for middleware, code in (
+            (RestyCodesMiddleware(self.__application, assumed=()), 200),
+            (RestyCodesMiddleware(self.__application, assumed=(
+                'serviceAvailable',)), 414),
+            (RestyCodesMiddleware(self.__application, codes=ServiceCodes(),
+                                  assumed=()), 414),
+            ):
+            status, headers, body = self.__request(
+                middleware, QUERY_STRING='q=' + 'a' * MAX_URL_LENGTH)
+            self.assertTrue(status.startswith(str(code)), status)
+
+        middleware = RestyCodesMiddleware(
+            self.__application, assumed=(), providers=dict(
+                [(name, lambda environ, name=name: RESTYARGS[name])
+                 for name in ASSUMED_CONDITIONS]))
+        status, headers, body = self.__request(middleware,
+                                               REQUEST_METHOD='BREW')
+        self.assertTrue(status.startswith('501'), status)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "Needs asyncio coroutines.")
+class TestAsgiMiddleware(unittest.TestCase):
+    """
+    Tests for the ASGI middleware.
+    """
+
+    def setUp(self):
+        """
+        Create the middleware around an application that records its calls.
+        """
+        self._calls = []
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._middleware = asgi.RestyCodesMiddleware(
+            self._asgiApplication, maxUrlLength=20, maxEntitySize=100)
+
+    def tearDown(self):
+        """
+        Close the event loop.
+        """
+        asyncio.set_event_loop(None)
+        self._loop.close()
+
+    # A coroutine method, written in a string so this module still compiles
+    # on Python 2.
+    if sys.version_info >= (3, 5):
+        exec(compile("""async def _asgiApplication(self, scope, receive, send):
+            self._calls.append(scope)
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': []})
+            await send({'type': 'http.response.body', 'body': b'OK'})
+""", __file__, 'exec'))
+
+    def __request(self, middleware=None, headers=(), **scope):
+        sent, received = [], []
+
+        def send(message):
+            sent.append(message)
+            return asyncio.sleep(0)
+
+        def receive():
+            received.append(True)
+            return asyncio.sleep(0, {'type': 'http.request', 'body': b''})
+
+        scope.setdefault('type', 'http')
+        scope.setdefault('method', 'GET')
+        scope.setdefault('path', '/')
+        scope['headers'] = [(name.encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers]
+        self._loop.run_until_complete((middleware or self._middleware)(
+            scope, receive, send))
+        self.assertTrue(not received, "The body should not be received.")
+        return sent[0]['status'], sent[1]['body']
+
+    def test_application(self):
+        """
+        Test that the application is called with the status in the scope.
+        """
+        status, body = self.__request(headers=[('Accept', 'text/html')])
+        self.assertTrue((status, body) == (200, b'OK'), (status, body))
+        self.assertTrue(self._calls[-1]['restycodes.status'].code == 200)
+
+    def test_shortCircuit(self):
+        """
+        Test that an error is sent without calling the application.
+        """
+        for scope, headers, code in (
+            ({'method': 'BREW'}, (), 501),
+            ({'method': 'TRACE'}, (), 405),
+            ({'path': '/a-very-long-path/', 'query_string': b'q=1'}, (),
+             414),
+            ({'method': 'PUT'}, (('content-length', '101'),), 413),
+            ({'method': 'PUT'}, (('content-length', 'lots'),), 400),
+            ):
+            status, body = self.__request(headers=headers, **scope)
+            self.assertTrue(status == code, (status, scope, headers))
+            self.assertTrue(body.startswith(str(code).encode('ascii')))
+
+        self.assertTrue(not self._calls, self._calls)
+
+    def test_providers(self):
+        """
+        Test that a coroutine provider is awaited only when its node is
+        reached.
+        """
+        calls = []
+
+        def authorized(scope):
+            calls.append(scope['path'])
+            return asyncio.sleep(0, dict(scope['headers']).get(
+                b'authorization') == b'secret')
+
+        middleware = asgi.RestyCodesMiddleware(
+            self._asgiApplication, providers={'authorized': authorized},
+            maxUrlLength=20)
+        self.assertTrue(self.__request(middleware)[0] == 401)
+        status, body = self.__request(middleware, headers=[(
+            'authorization', 'secret')])
+        self.assertTrue(status == 200, status)
+        status, body = self.__request(middleware, method='BREW',
+                                      path='/' * 30)
+        self.assertTrue(status == 414, status)
+        self.assertTrue(calls == ['/', '/'], calls)
+
+    def test_unknownConditions(self):
+        """
+        Test that a status found with the default of a condition that is not
+        known is not sent, and that it is once the condition is provided.
+        """
+        exists = []
+        provided = asgi.RestyCodesMiddleware(self._asgiApplication, providers={
+            'methodAllowedOnResource': lambda scope: True,
+            'resourceExists': lambda scope: asyncio.sleep(0, exists[-1])})
+        headers = [('if-none-match', '*')]
+
+        for middleware in (self._middleware, asgi.RestyCodesMiddleware(
+            self._asgiApplication, cacheSize=0)):
+            for method, code in (('PUT', 412), ('GET', 304)):
+                calls = len(self._calls)
+                status, body = self.__request(middleware, headers=headers,
+                                              method=method)
+                self.assertTrue(status == 200, (status, method))
+                self.assertTrue(len(self._calls) == calls + 1, method)
+                found = self._calls[-1]['restycodes.status']
+                self.assertTrue(found.code == code, found)
+
+        for method, value, code in (('PUT', True, 412), ('GET', True, 304),
+                                    ('GET', False, 200)):
+            exists.append(value)
+            calls = len(self._calls)
+            status, body = self.__request(provided, headers=headers,
+                                          method=method)
+            self.assertTrue(status == code, (status, method))
+            self.assertTrue(len(self._calls) == calls + (code == 200))
+
+    def test_assumed(self):
+        """
+        Test that with nothing assumed only the conditions from the scope
+        and the providers are known.
+        """
+        for assumed, code in (((), 200), (('serviceAvailable',), 414)):
+            middleware = asgi.RestyCodesMiddleware(
+                self._asgiApplication, maxUrlLength=20, assumed=assumed)
+            status, body = self.__request(middleware, path='/' * 30)
+            self.assertTrue(status == code, (status, assumed))
+
+        self.assertRaises(InvalidConditionNameException,
+                          asgi.RestyCodesMiddleware, self._asgiApplication,
+                          assumed=('bogus',))
+
+    def test_lifespan(self):
+        """
+        Test that other connections are passed to the application.
+        """
+        scope = {'type': 'lifespan'}
+        self._loop.run_until_complete(self._middleware(
+            scope, None, lambda message: asyncio.sleep(0)))
+        self.assertTrue(self._calls == [scope])
+
+
+class TestConditions(unittest.TestCase):
+    """
+    Tests for the Conditions class.
+    """
+    def __init__(self, name):
+        """
+        :Parameters:
+          name : str
+            Unit test name.
+        """
+        super(TestConditions, self).__init__(name)
+
+    def test_defaults(self):
+        conditions = Conditions()
+        self.assertTrue(conditions.toKwargs() == RESTYARGS)
+        self.assertTrue(conditions.serviceAvailable is True)
+        self.assertTrue(conditions.badRequest is False)
+
+    def test_kwargs(self):
+        kwargs = RestyCodes().setConditions(authorized=False, put=True)
+        conditions = Conditions.fromKwargs(authorized=False, put=True)
+        self.assertTrue(conditions.toKwargs() == kwargs)
+        self.assertTrue(Conditions.fromKwargs(**kwargs) == conditions)
+        self.assertRaises(InvalidConditionNameException,
+                          Conditions.fromKwargs, wrongArg=True)
+
+    def test_with(self):
+        conditions = Conditions()
+        changed = conditions.with_(authorized=False)
+        self.assertTrue(conditions.authorized is True)
+        self.assertTrue(changed.authorized is False)
+        self.assertTrue(changed != conditions)
+        self.assertTrue(changed.with_(authorized=True) == conditions)
+        self.assertRaises(InvalidConditionNameException,
+                          conditions.with_, wrongArg=True)
+
+    def test_immutable(self):
+        conditions = Conditions()
+        self.assertRaises(AttributeError, setattr, conditions,
+                          'authorized', False)
+        self.assertRaises(AttributeError, setattr, conditions, '_mask', 0)
+
+    def test_hash(self):
+        first = Conditions().with_(delete=True)
+        second = Conditions.fromKwargs(delete=True)
+        self.assertTrue(hash(first) == hash(second))
+        self.assertTrue(len(set([first, second, Conditions()])) == 2)
+
+    def test_bytes(self):
+        conditions = Conditions().with_(multipleRepresentation=True)
+        data = conditions.toBytes()
+        self.assertTrue(len(data) == 8)
+        self.assertTrue(Conditions.fromBytes(data) == conditions)
+
+    def test_pickle(self):
+        import pickle
+        conditions = Conditions().with_(conflict=True)
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            found = pickle.loads(pickle.dumps(conditions, protocol))
+            self.assertTrue(found == conditions)
+
+    def test_getStatusByMask(self):
+        rc = RestyCodes()
+        conditions = Conditions()
+        self.assertTrue(rc.getStatusByMask(conditions) == (200, "OK"))
+        self.assertTrue(rc.getIterationCount() == 26)
+        conditions = conditions.with_(serviceAvailable=False)
+        self.assertTrue(rc.getStatusByMask(int(conditions))[0] == 503)
 
 
 class TestConditionHandler(unittest.TestCase):
@@ -435,6 +2281,252 @@ class TestConditionHandler(unittest.TestCase):
             self._ch.method(method)
             self.__runTest(code, "with method: {}".format(method))
 
+    def test_providers(self):
+        calls = []
+
+        def provider(name, value):
+            def provide():
+                calls.append(name)
+                return value
+
+            return provide
+
+        self._ch.setProvider('authorized', provider('authorized', False))
+        self._ch.setProvider('resourceExists', provider('resourceExists',
+                                                        True))
+        self._ch.requestUrlTooLong("someverylongurl.com", 18)
+        self.__runTest(414, "rejected before the providers")
+        self.assertTrue(calls == [], calls)
+        self._ch.requestUrlTooLong("someverylongurl.com", 20)
+        self.__runTest(401, "with authorized False")
+        self.assertTrue(calls == ['authorized'], calls)
+        self.__runTest(401, "with authorized provided again")
+        self.assertTrue(calls == ['authorized'] * 2, calls)
+        self.assertTrue('authorized' not in self._ch._kwargs, self._ch._kwargs)
+        self._ch._kwargs['authorized'] = True
+        self.__runTest(200, "with authorized set")
+        self.assertTrue(calls == ['authorized'] * 2 + ['resourceExists'],
+                        calls)
+        self.assertRaises(InvalidConditionNameException,
+                          self._ch.setProvider, 'bogus', provider('bogus',
+                                                                  True))
+
+    def test_providersCompiled(self):
+        self._ch = ConditionHandler(cacheSize=16)
+        self._ch.compile()
+        self.test_providers()
+
+    def test_providersReused(self):
+        """
+        Test that a handler used for more than one request calls its
+        providers again for each, and not only the first.
+        """
+        exists = []
+        self._ch.setProvider('resourceExists', lambda: exists[-1])
+
+        for value, code in ((True, 200), (False, 404), (True, 200)):
+            exists.append(value)
+            self.__runTest(code, "with resourceExists {}".format(value))
+
+        self._ch = ConditionHandler(cacheSize=16)
+        self._ch.compile()
+        self._ch.setProvider('resourceExists', lambda: exists[-1])
+
+        for value, code in ((False, 404), (True, 200), (False, 404)):
+            exists.append(value)
+            self.__runTest(code, "compiled with resourceExists {}".format(
+                value))
+
+    def test_acceptMediaType(self):
+        offered = ('text/html;level=1', 'application/json')
+
+        for header, found, code in (
+            (None, 'text/html;level=1', 200),
+            ('', 'text/html;level=1', 200),
+            ('application/json', 'application/json', 200),
+            ('Application/JSON;q=0.5, text/*;q=0.4', 'application/json', 200),
+            ('text/*;q=0.5, */*;q=0.8', 'application/json', 200),
+            ('text/html;q=0, */*', 'application/json', 200),
+            ('image/png, text/plain;q=bogus', None, 406),
+            ('*/*;q=0', None, 406),
+            ):
+            self.assertTrue(self._ch.acceptMediaType(header, offered) == found,
+                            "with header: {}".format(header))
+            self.__runTest(code, "with header: {}".format(header))
+
+        self.assertTrue(self._ch._kwargs['acceptExists'])
+
+    def test_acceptLanguage(self):
+        offered = ('en-US', 'fr')
+
+        for header, found, code in (
+            ('en', 'en-US', 200),
+            ('en-GB, fr;q=0.5', 'fr', 200),
+            ('fr, en-us;q=0.9', 'fr', 200),
+            ('*;q=0.1, fr;q=0', 'en-US', 200),
+            ('de', None, 406),
+            ):
+            self.assertTrue(self._ch.acceptLanguage(header, offered) == found,
+                            "with header: {}".format(header))
+            self.__runTest(code, "with header: {}".format(header))
+
+    def test_acceptCharacterSet(self):
+        offered = ('utf-8', 'iso-8859-1')
+
+        for header, found, code in (
+            ('iso-8859-1, utf-8;q=0.5', 'iso-8859-1', 200),
+            ('*;q=0.5, UTF-8', 'utf-8', 200),
+            ('us-ascii', None, 406),
+            ):
+            self.assertTrue(
+                self._ch.acceptCharacterSet(header, offered) == found,
+                "with header: {}".format(header))
+            self.__runTest(code, "with header: {}".format(header))
+
+    def test_acceptEncoding(self):
+        offered = ('gzip', 'identity')
+
+        for header, found, code in (
+            ('gzip', 'gzip', 200),
+            ('br', 'identity', 200),
+            ('', 'identity', 200),
+            ('identity;q=0, deflate', None, 406),
+            ('*;q=0', None, 406),
+            ):
+            self.assertTrue(self._ch.acceptEncoding(header, offered) == found,
+                            "with header: {}".format(header))
+            self.__runTest(code, "with header: {}".format(header))
+
+    def test_negotiationCache(self):
+        negotiation.clearCaches()
+        header = 'text/html, application/*;q=0.2'
+        self.assertTrue(negotiation.parseHeader(header) == (
+            ('text/html', 1.0), ('application/*', 0.2)))
+
+        for count in range(3):
+            self._ch.acceptMediaType(header, ('application/xml',))
+
+        stats = negotiation.getCacheStats()
+        self.assertTrue(stats['negotiated']['misses'] == 1, stats)
+        self.assertTrue(stats['negotiated']['hits'] == 2, stats)
+        self.assertTrue(stats['parsed']['size'] == 1, stats)
+        cache = LRUCache(2)
+
+        for key in 'abc':
+            cache.set(key, key.upper())
+
+        self.assertTrue(cache.get('a') is None)
+        self.assertTrue(cache.get('c') == 'C')
+        self.assertTrue(cache.getStats()['evictions'] == 1)
+        self.assertTrue(cache.find('b') == 'B')
+        self.assertTrue(cache.find('a', 'A') == 'A')
+        cache.set('d', 'D')
+        self.assertTrue(cache.find('b') is None, "Found is not marked used.")
+        self.assertTrue(cache.find('c') == 'C')
+
+    def test_entityTag(self):
+        for ifMatch, ifNoneMatch, eTag, code in (
+            (None, None, '"a"', 200),
+            ('"a"', None, '"a"', 200),
+            ('"b", "a"', None, '"a"', 200),
+            ('"a"', None, 'W/"a"', 412),
+            ('W/"a"', None, '"a"', 412),
+            ('"b"', None, '"a"', 412),
+            ('*', None, '"a"', 200),
+            (None, '"b", W/"a"', '"a"', 304),
+            (None, 'W/"a"', 'W/"a"', 304),
+            (None, '*', '"a"', 304),
+            (None, '"b"', '"a"', 200),
+            ):
+            self._ch.entityTag(ifMatch, ifNoneMatch, eTag)
+            self.__runTest(code, "with headers: {}, {} and ETag {}".format(
+                ifMatch, ifNoneMatch, eTag))
+
+        self._ch.entityTag('*', None, None)
+        self._ch._kwargs['resourceExists'] = False
+        self.__runTest(412, "with If-Match * and no representation")
+        self._ch.entityTag(None, '"a"', '"a"')
+        self._ch._kwargs.update(resourceExists=True, getOrHead=False)
+        self.__runTest(412, "with If-None-Match on a PUT")
+
+    def test_entityTagParsing(self):
+        etags.clearCache()
+        header = '"xyzzy", W/"r2d2,xxxx" ,"",bogus'
+        tags = etags.parseTags(header)
+        self.assertTrue(tags.any is False, tags)
+        self.assertTrue(tags.strong == frozenset(['xyzzy', '']), tags)
+        self.assertTrue(tags.opaque == frozenset(['xyzzy', 'r2d2,xxxx', '']),
+                        tags)
+        self.assertTrue(etags.parseTags(' * ').any)
+        self.assertTrue(etags.parseTag('W/"x"') == (True, 'x'))
+        self.assertTrue(etags.parseTag('x') is None)
+        self.assertFalse(etags.strongMatch('"x"', 'x'))
+        self.assertFalse(etags.weakMatch('*', None))
+        self.assertTrue(etags.parseTags(header) is tags)
+        stats = etags.getCacheStats()
+        self.assertTrue(stats['hits'] == 1 and stats['size'] == 3, stats)
+
+    def test_ifModifiedSince(self):
+        now = 784111777
+        self._ch = ConditionHandler(clock=lambda: now)
+
+        for header, lastModified, code in (
+            (None, now, 200),
+            ('Sun, 06 Nov 1994 08:49:37 GMT', now - 10, 304),
+            ('Sunday, 06-Nov-94 08:49:37 GMT', now + 0.5, 304),
+            ('Thursday, 01-Jan-70 00:00:01 GMT', 0, 304),
+            ('Sun Nov  6 08:49:36 1994', now, 200),
+            ('Mon, 07 Nov 1994 08:49:37 GMT', now - 10, 200),
+            ('Sun, 31 Nov 1994 08:49:37 GMT', now - 10, 200),
+            ):
+            self._ch.ifModifiedSince(header, lastModified)
+            self.__runTest(code, "with header: {}".format(header))
+
+        self.assertFalse(self._ch._kwargs['ifModifiedSinceIsValidDate'])
+
+    def test_ifUnmodifiedSince(self):
+        for header, lastModified, code in (
+            (None, 784111787, 200),
+            ('Sun, 06 Nov 1994 08:49:37 GMT', 784111777, 200),
+            ('Sun, 06 Nov 1994 08:49:37 GMT', 784111778, 412),
+            ('Sun, 06 Nov 1994 08:49:37', 784111787, 200),
+            ):
+            self._ch.ifUnmodifiedSince(header, lastModified)
+            self.__runTest(code, "with header: {}".format(header))
+
+    def test_parseDate(self):
+        httpdate.clearCache()
+
+        for value, found in (
+            ('Sun, 06 Nov 1994 08:49:37 GMT', 784111777),
+            ('Sunday, 06-Nov-94 08:49:37 GMT', 784111777),
+            ('Sun Nov  6 08:49:37 1994', 784111777),
+            ('Thu, 01 Jan 1970 00:00:00 GMT', 0),
+            ('Wed, 31 Dec 1969 23:59:59 GMT', -1),
+            ('Tue, 29 Feb 2000 12:00:00 GMT', 951825600),
+            ('Thu, 29 Feb 1900 12:00:00 GMT', None),
+            ('Sun, 06 Nov 1994 24:00:00 GMT', None),
+            ('Sun, 06 Foo 1994 08:49:37 GMT', None),
+            ('Sun, 06 Nov 1994 08:49 GMT', None),
+            ('1994-11-06T08:49:37Z', None),
+            ):
+            self.assertTrue(httpdate.parseDate(value) == found, value)
+            self.assertTrue(httpdate.parseDate(value) == found, value)
+
+        for timestamp in (86399, 68169600, 951782400, 1234567890, 4102444800):
+            value = time.strftime("%a, %d %b %Y %H:%M:%S GMT",
+                                  time.gmtime(timestamp))
+            self.assertTrue(httpdate.parseDate(value) == timestamp, value)
+
+        stats = httpdate.getCacheStats()
+        self.assertTrue(stats['hits'] == 11, stats)
+        value = 'Thursday, 01-Jan-70 00:00:00 GMT'
+
+        for now, found in ((784111777, 0), (1792281600, 3155760000),
+                           (784111777, 0)):
+            self.assertTrue(httpdate.parseDate(value, lambda: now) == found,
+                            (value, now))
+
     def __runTest(self, code, message=""):
         msg = "Invalid status: found {}, should be {}"
         found = self._ch.getStatus()
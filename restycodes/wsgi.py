@@ -0,0 +1,364 @@
+#
+# restycodes/wsgi.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+WSGI
+  A WSGI middleware that finds the conditions of a request from the environ
+  and answers the request itself when the diagram ends on an error or a
+  304, found only from conditions it knows, without calling the
+  application.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+from restycodes.cache import LRUCache
+from restycodes.resty_codes import (RESTYARGS, RestyCodes, ConditionHandler,
+                                    LazyConditions, StatusResult,
+                                    getCodeStatus,
+                                    InvalidConditionNameException)
+
+
+MAX_URL_LENGTH = 8192
+# The environ key the status found before the application is called is
+# stored under.
+ENVIRON_KEY = 'restycodes.status'
+# The conditions set from each request header when it is present.
+HEADER_CONDITIONS = (
+    ('accept', 'acceptExists'),
+    ('accept-language', 'acceptLanguageExists'),
+    ('accept-charset', 'acceptCharacterSetExists'),
+    ('accept-encoding', 'acceptEncodingExists'),
+    ('if-match', 'ifMatchExists'),
+    ('if-none-match', 'ifNoneMatchExists'),
+    ('if-unmodified-since', 'ifUnmodifiedSinceExists'),
+    ('if-modified-since', 'ifModifiedSinceExists'),
+    )
+ENVIRON_CONDITIONS = tuple([('HTTP_' + header.upper().replace('-', '_'), name)
+                            for header, name in HEADER_CONDITIONS])
+# The conditions found from the request alone, see `getRequestConditions`,
+# those not set are known to be their defaults.
+REQUEST_CONDITIONS = (
+    'requestUrlTooLong', 'options', 'commonMethod', 'knownMethod', 'put',
+    'post', 'delete', 'getOrHead', 'badRequest', 'requestEntityTooLarge',
+    'ifMatchAnyExists', 'ifNoneMatchAnyExists',
+    ) + tuple([name for header, name in HEADER_CONDITIONS])
+# The conditions, read before the request method, taken as known at their
+# defaults by the middleware when they have no provider.
+ASSUMED_CONDITIONS = ('serviceAvailable', 'authorized', 'forbidden',
+                      'notImplemented', 'unsupportedMediaType',)
+
+
+def getRequestConditions(method, urlLength, contentLength,
+                         maxUrlLength=MAX_URL_LENGTH, maxEntitySize=None):
+    """
+    Gets the conditions found from the request line and the length of the
+    entity.
+
+    :Parameters:
+      method : `str`
+        The request method.
+      urlLength : `int`
+        The length of the URL, path and query.
+      contentLength : `str`
+        The value of the Content-Length header or `None`.
+
+    :Keywords:
+      maxUrlLength : `int`
+        The longest URL allowed. Default is `MAX_URL_LENGTH`.
+      maxEntitySize : `int`
+        The largest Content-Length allowed. Default is `None` for no limit.
+
+    :Returns:
+      A `dict` of conditions.
+    """
+    method = method.upper()
+    conditions = {
+        'requestUrlTooLong': urlLength > maxUrlLength,
+        'options': method == 'OPTIONS',
+        'commonMethod': method in ConditionHandler.COMMON_METHODS,
+        'knownMethod': method in ConditionHandler.KNOWN_METHODS,
+        'put': method == 'PUT',
+        'post': method == 'POST',
+        'delete': method == 'DELETE',
+        'getOrHead': method in ('GET', 'HEAD'),
+        }
+
+    if contentLength:
+        try:
+            length = int(contentLength)
+        except ValueError:
+            conditions['badRequest'] = True
+        else:
+            conditions['badRequest'] = length < 0
+            conditions['requestEntityTooLarge'] = (
+                maxEntitySize is not None and length > maxEntitySize)
+
+    return conditions
+
+
+def getEnvironConditions(environ, maxUrlLength=MAX_URL_LENGTH,
+                         maxEntitySize=None):
+    """
+    Gets the conditions that can be found from the environ alone, see
+    `getRequestConditions`, and which of the Accept and conditional headers
+    are present.
+
+    :Parameters:
+      environ : `dict`
+        The WSGI environ.
+
+    :Keywords:
+      maxUrlLength : `int`
+        See `getRequestConditions`.
+      maxEntitySize : `int`
+        See `getRequestConditions`.
+
+    :Returns:
+      A `dict` of conditions.
+    """
+    get = environ.get
+    query = get('QUERY_STRING', '')
+    size = len(get('SCRIPT_NAME', '')) + len(get('PATH_INFO', ''))
+
+    if query:
+        size += len(query) + 1
+
+    conditions = getRequestConditions(
+        get('REQUEST_METHOD', 'GET'), size, get('CONTENT_LENGTH'),
+        maxUrlLength, maxEntitySize)
+
+    for key, name in ENVIRON_CONDITIONS:
+        if key in environ:
+            conditions[name] = True
+
+    ifMatch = get('HTTP_IF_MATCH')
+
+    if ifMatch is not None:
+        conditions['ifMatchAnyExists'] = ifMatch.strip() == '*'
+
+    ifNoneMatch = get('HTTP_IF_NONE_MATCH')
+
+    if ifNoneMatch is not None:
+        conditions['ifNoneMatchAnyExists'] = ifNoneMatch.strip() == '*'
+
+    return conditions
+
+
+def getKnownMethods(codes, known):
+    """
+    Gets the names of the node methods of a tree that read only known
+    conditions. An overridden method finds its own condition, so only the
+    extra conditions of its name, see `RestyCodes.EXTRA_CONDITIONS`, need to
+    be known.
+
+    :Parameters:
+      codes : `RestyCodes`
+        The instance with the tree loaded.
+      known : `set`
+        The names of the known conditions.
+
+    :Returns:
+      A `frozenset` of the method names.
+    """
+    found = set()
+
+    for method, condition, extras, cases in zip(
+        codes._methods, codes._conditions, codes._extras, codes._cases):
+        name = method.__name__
+
+        if cases is not None:
+            reads = [case[0] for case in cases]
+        elif condition is not None or RestyCodes.__dict__.get(name) is method:
+            reads = [name[1:]] + [extra for extra, default
+                                  in codes.EXTRA_CONDITIONS.get(name, ())]
+        else:
+            reads = [extra for extra, default
+                     in codes.EXTRA_CONDITIONS.get(name, ())]
+
+        if not [read for read in reads if read not in known]:
+            found.add(name)
+
+    return frozenset(found)
+
+
+class EnvironConditions(LazyConditions):
+    """
+    The `LazyConditions` of a WSGI request, whose providers are called with
+    the environ.
+    """
+
+    def __init__(self, values, providers, environ):
+        """
+        :Parameters:
+          values : `dict`
+            See `LazyConditions`.
+          providers : `dict`
+            A callable that takes the environ for each condition that is
+            found only when it is read.
+          environ : `dict`
+            The WSGI environ.
+        """
+        super(EnvironConditions, self).__init__(values, providers)
+        self._environ = environ
+
+    def _provide(self, provider):
+        return bool(provider(self._environ))
+
+
+class RestyCodesMiddleware(object):
+    """
+    Wraps a WSGI application. The status of each request is found from the
+    conditions in the environ, see `getEnvironConditions`, and those from
+    the providers. If it is an error or a 304, and every condition read on
+    its path is known, the response is sent without calling the
+    application. Otherwise the application is called with the
+    `StatusResult`, found with the defaults of the conditions not known, in
+    the environ under `ENVIRON_KEY`.
+
+    A condition is known if it is found from the environ, see
+    `REQUEST_CONDITIONS`, has a provider or is assumed. So a ``PUT`` with
+    ``If-None-Match: *`` is passed to the application, unless there is a
+    provider for ``resourceExists``, and not answered with a 412.
+
+    One `ConditionHandler` is made for the middleware and shared by every
+    request, it is only used through its stateless `evaluate` method. With
+    no providers the status depends only on the conditions found from the
+    environ, and is kept for them.
+    """
+
+    def __init__(self, application, providers=None, codes=None,
+                 maxUrlLength=MAX_URL_LENGTH, maxEntitySize=None,
+                 cacheSize=256, assumed=ASSUMED_CONDITIONS):
+        """
+        :Parameters:
+          application : `callable`
+            The WSGI application.
+
+        :Keywords:
+          providers : `dict`
+            A callable taking the environ for each condition that the
+            application finds, like ``resourceExists`` or ``authorized``. It
+            is called only if a node that reads the condition is reached.
+            Default is `None`.
+          codes : `RestyCodes`
+            The instance to evaluate with. Default is `None` which is a new
+            `ConditionHandler`.
+          maxUrlLength : `int`
+            See `getEnvironConditions`.
+          maxEntitySize : `int`
+            See `getEnvironConditions`.
+          cacheSize : `int`
+            The number of statuses kept for the conditions found from the
+            environ, used only when there are no providers. Default is 256,
+            `0` keeps none.
+          assumed : `tuple`
+            The conditions with no provider taken as known at their
+            defaults. Default is `ASSUMED_CONDITIONS`, `()` assumes none.
+        """
+        for name in tuple(providers or ()) + tuple(assumed):
+            if name not in RESTYARGS:
+                msg = "Provided key '{}' is not in kwargs.".format(name)
+                raise InvalidConditionNameException(msg)
+
+        self._application = application
+        self._providers = dict(providers or {})
+        self._codes = ConditionHandler() if codes is None else codes
+        self._maxUrlLength = maxUrlLength
+        self._maxEntitySize = maxEntitySize
+        self._known = getKnownMethods(self._codes, set(
+            REQUEST_CONDITIONS + tuple(self._providers) + tuple(assumed)))
+        self._statuses = LRUCache(cacheSize) if cacheSize > 0 else None
+        self._responses = {}
+
+    def __call__(self, environ, start_response):
+        conditions = getEnvironConditions(environ, self._maxUrlLength,
+                                          self._maxEntitySize)
+
+        if self._providers:
+            result, known = self.__evaluate(EnvironConditions(
+                conditions, self._providers, environ), True)
+        elif self._statuses is None:
+            result, known = self.__evaluate(conditions, False)
+        else:
+            key = (tuple(conditions), tuple(conditions.values()))
+            found = self._statuses.find(key)
+
+            if found is None:
+                found = self.__evaluate(conditions, False)
+                self._statuses.set(key, found)
+
+            result, known = found
+
+        if known:
+            status, headers, body = self.__getResponse(result)
+
+            if environ.get('REQUEST_METHOD') == 'HEAD' or result.code == 304:
+                body = b''
+
+            start_response(status, list(headers))
+            return [body]
+
+        environ[ENVIRON_KEY] = result
+        return self._application(environ, start_response)
+
+    def __evaluate(self, conditions, path):
+        """
+        Evaluates the conditions of a request. If the status is an error or
+        a 304 and the path was not found it is walked again to find it.
+
+        :Parameters:
+          conditions : `dict` or `LazyConditions`
+            The conditions.
+          path : `bool`
+            If `True` the path is found with the status.
+
+        :Returns:
+          The `StatusResult`, without its path, and `True` if the status is
+          sent, being an error or a 304 with every condition read on its
+          path known.
+        """
+        result = self._codes.evaluate(conditions, path)
+        known = False
+
+        if result.code >= 400 or result.code == 304:
+            if result.path is None:
+                result = self._codes.evaluate(conditions, True)
+
+            known = self._known.issuperset(result.path)
+
+        if result.path is not None:
+            result = StatusResult(result.code, result.reason,
+                                  result.iterations, None)
+
+        return result, known
+
+    def __getResponse(self, result):
+        """
+        Gets the status line, headers and body sent for a status, made once
+        for each status.
+        """
+        response = self._responses.get(result.code)
+
+        if response is None:
+            status = getCodeStatus(result.code).wsgiStatus
+            body = (status + "\n").encode('ascii')
+            headers = (('Content-Type', 'text/plain; charset=us-ascii'),
+                       ('Content-Length', str(len(body))))
+
+            if result.code == 304:
+                headers = ()
+
+            response = self._responses[result.code] = (status, headers, body)
+
+        return response
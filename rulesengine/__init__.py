@@ -1,6 +1,43 @@
 #
 # rulesengine/__init__.py
 #
+import sys
 
 from rulesengine.rules_engine import (RulesEngine, RulesEngineException,
-                                      InvalidNodeSizeException,)
+                                      InvalidNodeSizeException,
+                                      InvalidCallTypeException,
+                                      InvalidTreeFormatException, Evaluation,
+                                      ResumableEvaluation,)
+
+# The module of each name imported when it is first used.
+_LAZY = {
+    'NodeStats': 'rulesengine.node_stats',
+    'NodeStat': 'rulesengine.node_stats',
+    'Tracer': 'rulesengine.tracer',
+    'Trace': 'rulesengine.tracer',
+    }
+
+if sys.version_info < (3, 7): # pragma: no cover
+    from rulesengine.node_stats import NodeStats, NodeStat
+    from rulesengine.tracer import Tracer, Trace
+
+
+def __getattr__(name):
+    """
+    Imports the names in `_LAZY`, and `AsyncRulesEngine`, when they are
+    first used, on Python 3.7 and later, so importing this package does not
+    import threading or asyncio. On Python 3.5 and 3.6 import
+    `AsyncRulesEngine` from `rulesengine.async_rules_engine`.
+    """
+    if name in _LAZY:
+        module = __import__(_LAZY[name], fromlist=[name])
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    if name == 'AsyncRulesEngine' and sys.version_info >= (3, 5):
+        from rulesengine.async_rules_engine import AsyncRulesEngine
+        return AsyncRulesEngine
+
+    msg = "module {!r} has no attribute {!r}".format(__name__, name)
+    raise AttributeError(msg)
@@ -0,0 +1,104 @@
+#
+# rulesengine/async_rules_engine.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Async Rules Engine
+  The rules engine for node methods that are coroutines. Needs Python 3.5
+  or later.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import inspect
+
+from rulesengine.rules_engine import RulesEngine, Evaluation
+
+
+class AsyncRulesEngine(RulesEngine):
+    """
+    A `RulesEngine` whose `evaluate` and `dump` are coroutines. A node
+    method that returns an awaitable, like a coroutine method, is awaited
+    before its result is tested, any other method is called directly. The
+    same path is taken as with `RulesEngine`.
+
+    The compiled function is not used, it cannot await.
+    """
+
+    async def dump(self, **kwargs):
+        """
+        Dumps the result of the execution tree, see `evaluate`. The iteration
+        count, and the call sequence if it is being stored, are kept on this
+        instance for `getIterationCount` and `getCallSequence`.
+
+        :Parameters:
+          kwargs : `dict`
+            The possible keyword arguments that shall be passed to the
+            callable objects in the `Node` objects.
+
+        :Returns:
+          The Boolean from the last callable object.
+        """
+        evaluation = await self.evaluate(kwargs, self._storeSeq)
+        self._iterCount = evaluation.iterations
+        self._callSequence = list(evaluation.path or ())
+        return evaluation.result
+
+    async def evaluate(self, kwargs, path=False):
+        """
+        Evaluates the execution tree as `RulesEngine.evaluate` does, awaiting
+        the result of any node method that is awaitable.
+
+        :Parameters:
+          kwargs : `dict`
+            The keyword arguments that shall be passed to the callable
+            objects in the `Node` objects.
+
+        :Keywords:
+          path : `bool`
+            If `True` the names of the methods called are returned in the
+            `Evaluation`. Default is `False`.
+
+        :Returns:
+          An `Evaluation` of the result, the iteration count and the path.
+        """
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches = self._switches
+        this = self._self
+        isawaitable = inspect.isawaitable
+        sequence = [] if path else None
+        index = 0 if methods else -1
+        count = 0
+        result = None
+
+        while index != -1:
+            method = methods[index]
+
+            if this is None:
+                result = method(**kwargs)
+            else:
+                result = method(this, **kwargs)
+
+            if isawaitable(result):
+                result = await result
+
+            count += 1
+            sequence is not None and sequence.append(method.__name__)
+
+            if switches and index in switches:
+                index = switches[index].get(result, rights[index])
+            else:
+                index = lefts[index] if result else rights[index]
+
+        return Evaluation(result, count,
+                          None if sequence is None else tuple(sequence))
@@ -0,0 +1,125 @@
+#
+# rulesengine/node_stats.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Node Statistics
+  Counts how often each node of a loaded tree is evaluated and which branch
+  it takes, and optionally how long its method, or the read of its
+  condition, takes.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import bisect
+import threading
+from collections import namedtuple
+
+
+class NodeStat(namedtuple('NodeStat',
+                          'index name hits trues seconds histogram')):
+    """
+    The statistics of one node. The ``hits`` is the number of times it was
+    evaluated and ``trues`` the number of those that took the True branch.
+    The ``seconds`` is the total time of its method and ``histogram`` the
+    count of the times in each of `NodeStats.BOUNDS`, both are zero unless
+    the timing is on.
+    """
+    __slots__ = ()
+
+    @property
+    def falses(self):
+        return self.hits - self.trues
+
+
+class NodeStats(object):
+    """
+    The statistics of the nodes of a `RulesEngine`, see
+    `RulesEngine.enableStats`. An evaluation records its steps once it ends,
+    under a lock, so many threads can record at once.
+    """
+    # The upper bounds in seconds of the histogram buckets, the last bucket
+    # counts the times above the last bound.
+    BOUNDS = (1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5,
+              1e-4, 1e-3, 1e-2, 1e-1)
+
+    def __init__(self, names, timing=False):
+        """
+        :Parameters:
+          names : `tuple`
+            The method name of each node, in index order.
+
+        :Keywords:
+          timing : `bool`
+            If `True` each method is timed. Default is `False`.
+        """
+        self.names = tuple(names)
+        self.timing = timing
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every count to zero.
+        """
+        size = len(self.names)
+
+        with self._lock:
+            self._evaluations = 0
+            self._hits = [0] * size
+            self._trues = [0] * size
+            self._seconds = [0.0] * size
+            self._histograms = [[0] * (len(self.BOUNDS) + 1)
+                                for index in range(size)]
+
+    def record(self, steps):
+        """
+        Records the steps of one evaluation.
+
+        :Parameters:
+          steps : `list`
+            The ``(index, result, seconds)`` of each node evaluated, the
+            seconds are `None` if the timing is off.
+        """
+        hits, trues, seconds = self._hits, self._trues, self._seconds
+        histograms, bounds = self._histograms, self.BOUNDS
+        bisectLeft = bisect.bisect_left
+
+        with self._lock:
+            self._evaluations += 1
+
+            for index, result, elapsed in steps:
+                hits[index] += 1
+
+                if result:
+                    trues[index] += 1
+
+                if elapsed is not None:
+                    seconds[index] += elapsed
+                    histograms[index][bisectLeft(bounds, elapsed)] += 1
+
+    def snapshot(self):
+        """
+        Gets a copy of the statistics.
+
+        :Returns:
+          A `dict` with the number of ``evaluations`` and a `tuple` of the
+          `NodeStat` of each node, in index order, as ``nodes``.
+        """
+        with self._lock:
+            return {'evaluations': self._evaluations,
+                    'nodes': tuple([NodeStat(
+                        index, name, self._hits[index], self._trues[index],
+                        self._seconds[index],
+                        tuple(self._histograms[index]))
+                                    for index, name in enumerate(self.names)])}
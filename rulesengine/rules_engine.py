@@ -21,18 +21,48 @@ email: carl.nobile@gmail.com
 __docformat__ = "restructuredtext en"
 
 import types
+from collections import namedtuple
+from timeit import default_timer
+
 
 class RulesEngineException(Exception): pass
 class InvalidNodeSizeException(RulesEngineException): pass
 class InvalidSequenceTypeException(RulesEngineException): pass
 class InvalidCallTypeException(RulesEngineException): pass
+class InvalidTreeFormatException(RulesEngineException): pass
+
+_MISSING = object()
+
+
+class Evaluation(namedtuple('Evaluation', 'result iterations path')):
+    """
+    The outcome of `RulesEngine.evaluate`, the result of the last node, the
+    iteration count and a `tuple` of the names of the methods called or
+    `None`.
+    """
+    __slots__ = ()
+
+
+class ResumableEvaluation(namedtuple('ResumableEvaluation',
+                                     'evaluation kwargs steps reused values')):
+    """
+    The outcome of `RulesEngine.evaluateResumable` and `RulesEngine.resume`,
+    the evaluation, with its path, the keyword arguments, the
+    ``(index, result, keys, state)`` of each node on the path, the number
+    of those steps reused from the evaluation it was resumed from and a
+    `dict` of the values of the keyword arguments the nodes read. The
+    ``keys`` are the keyword arguments the node read, or `None` if they are
+    not known, then the values of all of them are kept, and ``state`` the
+    value carried on from it, see `RulesEngine._resumeNode`.
+    """
+    __slots__ = ()
 
 
 class Node(object):
     """
     A Node object that encapsulates an execution entity.
     """
-    def __init__(self, method=None, left=None, right=None):
+    def __init__(self, method=None, left=None, right=None, cases=None):
         """
         :Keywords:
           method : ``FunctionType``, ``LambdaType``, ``MethodType``, \
@@ -45,10 +75,14 @@ class Node(object):
           right : `list`, `tuple`, or ``NoneType``
             A right branch can be a `list` or `tuple`. If a leaf the type
             shall be a ``NoneType``. Default is `None`.
+          cases : `dict` or ``NoneType``
+            The branch for each result of a switch node, the right branch is
+            taken for any other result. Default is `None`, a binary node.
         """
         self.method = method
         self.left = left
         self.right = right
+        self.cases = cases
 
 
 class RulesEngine(object):
@@ -59,6 +93,10 @@ class RulesEngine(object):
     exhausted and shall end when no further branches to traverse are found.
     """
     NO_INST = 999999999
+    COMPILE_NODE_LIMIT = 1024
+    # The attributes set by load, see `_getLoaded` and `_setLoaded`.
+    LOADED_ATTRS = ('_root', '_methods', '_lefts', '_rights', '_switches',
+                    '_nodeCounts', '_compiled', '_source')
 
     def __init__(self, this=None, storeSeq=False):
         """
@@ -80,6 +118,15 @@ class RulesEngine(object):
             self._self = None
 
         self._root = None
+        self._methods = ()
+        self._lefts = ()
+        self._rights = ()
+        self._switches = {}
+        self._nodeCounts = {'tree': 0, 'loaded': 0}
+        self._compiled = None
+        self._source = None
+        self._stats = None
+        self._tracer = None
         self._reset()
         self._storeSeq = storeSeq
 
@@ -97,29 +144,71 @@ class RulesEngine(object):
 
         example: ``[<function>, (<function>, None, None), None]``
 
+        A node whose second item is a `dict` is a switch node. The result of
+        its method is looked up in the `dict` and the branch found is taken,
+        the third item is taken for any other result. The results shall be
+        hashable.
+
+        example: ``[<function>, {'GET': (<function>, None, None),
+        'PUT': None}, None]``
+
+        The same sequence object used in more than one place, and sequences
+        with the same method and branches, are loaded into a single `Node`.
+        The tree is loaded as a graph with one `Node` per unique subtree, see
+        `getNodeCounts`.
+
         :Parameters:
           seq : `list` or `tuple`
             A sequence of nodes comprising an execution path.
         """
-        self._root = Node()
-        self.__insert(self._root, seq)
+        self._root = self.__insert(seq, {}, {})
+        self.__flatten(self._root)
+        self._finishLoad()
         return self._root
 
-    def __insert(self, node, blist):
+    def _finishLoad(self):
+        """
+        Called by `load` and `loadNodes` once the node arrays are set. The
+        compiled function is dropped and the statistics and tracer, if on,
+        are started again for the new nodes.
+        """
+        self._compiled = None
+        self._source = None
+
+        if self._stats is not None:
+            self.enableStats(self._stats.timing)
+
+        if self._tracer is not None:
+            tracer = self._tracer
+            self.enableTracer(tracer._traces.maxlen, tracer.every,
+                              tracer.predicate, tracer.sink)
+
+    def __insert(self, blist, loaded, unique):
         """
         A recursive call that loads the sequence object into `Node` objects.
 
         :Parameters:
-          node : `Node`
-            The current node being loaded with sequence data.
           blist : `list` or `tuple`
             The current sequence object used to load the Node.
+          loaded : `dict`
+            The `Node` already loaded for each sequence object, keyed on the
+            `id` of the sequence object.
+          unique : `dict`
+            The `Node` for each method and pair of branches.
+
+        :Returns:
+          The loaded `Node`.
 
         :Exceptions:
           * `InvalidNodeSizeException`
             Indicates an invalid sequence size. Sequences shall always have a
             size of three.
         """
+        node = loaded.get(id(blist))
+
+        if node is not None:
+            return node
+
         size = len(blist)
 
         if size != 3:
@@ -127,19 +216,197 @@ class RulesEngine(object):
                    "got: {}, on: {}").format(size, blist)
             raise InvalidNodeSizeException(msg)
 
-        for i in range(size):
-            item = blist[i]
-            if 0 == i: node.method = item
+        method = self._resolveMethod(blist[0])
+        branches = []
+        cases = None
 
+        for item in blist[1:]:
             if isinstance(item, (list, tuple)):
-                nnode = Node()
-                self.__insert(nnode, item)
-                if 1 == i: node.left = nnode
-                if 2 == i: node.right = nnode
+                branches.append(self.__insert(item, loaded, unique))
+            else:
+                branches.append(None)
+
+        ids = tuple([id(branch) for branch in branches])
+
+        if isinstance(blist[1], dict):
+            cases = dict([(result, self.__insert(item, loaded, unique)
+                           if isinstance(item, (list, tuple)) else None)
+                          for result, item in blist[1].items()])
+            ids += (tuple([(result, id(branch))
+                           for result, branch in cases.items()]),)
+
+        try:
+            key = (method,) + ids
+            hash(key)
+        except TypeError:
+            key = (id(method),) + ids
+
+        node = unique.get(key)
+
+        if node is None:
+            node = unique[key] = Node(method, branches[0], branches[1],
+                                      cases)
+
+        loaded[id(blist)] = node
+        return node
+
+    def _getLoaded(self):
+        """
+        Gets the loaded tree, and the compiled function if there is one, so
+        it can be given to another instance with `_setLoaded`. Nothing in it
+        is changed after it is loaded so it can be shared.
+
+        :Returns:
+          A `dict` of the attributes named in `LOADED_ATTRS`.
+        """
+        return dict([(name, getattr(self, name))
+                     for name in self.LOADED_ATTRS])
+
+    def _setLoaded(self, loaded):
+        """
+        Sets the loaded tree from `_getLoaded` in place of calling `load`.
+
+        :Parameters:
+          loaded : `dict`
+            The attributes named in `LOADED_ATTRS`.
+        """
+        for name in self.LOADED_ATTRS:
+            setattr(self, name, loaded[name])
+
+    def _resolveMethod(self, method):
+        """
+        Gets the method a node shall call for a method in the sequence
+        object. The default is the method itself.
+
+        :Parameters:
+          method : ``FunctionType`` or other callable type
+            The method in the sequence object.
+
+        :Returns:
+          The method to call.
+        """
+        return method
+
+    def __flatten(self, root):
+        """
+        Flattens the `Node` objects into three parallel arrays addressed by
+        node index, the method, the True branch index and the False branch
+        index. A branch that is a leaf has the index -1. The root is at index
+        0 and every node has a lower index than the nodes it branches to.
+        The branch index of each result of a switch node is kept in the
+        `dict` of switches, keyed on its index, its False branch is the one
+        taken for any other result.
+
+        :Parameters:
+          root : `Node`
+            The root node of the execution tree.
+        """
+        nodes = []
+        seen = set()
+        stack = [(root, False)]
+
+        # Nodes in the reverse of the order they are finished in.
+        while stack:
+            node, finished = stack.pop()
+
+            if finished:
+                nodes.append(node)
+            elif id(node) not in seen:
+                seen.add(id(node))
+                stack.append((node, True))
+
+                for branch in ((node.left, node.right)
+                               + tuple((node.cases or {}).values())):
+                    if isinstance(branch, Node):
+                        stack.append((branch, False))
+
+        nodes.reverse()
+        indexes = dict([(id(node), index)
+                        for index, node in enumerate(nodes)])
+        self._methods = tuple([node.method for node in nodes])
+        self._lefts = tuple([indexes[id(node.left)]
+                             if isinstance(node.left, Node) else -1
+                             for node in nodes])
+        self._rights = tuple([indexes[id(node.right)]
+                              if isinstance(node.right, Node) else -1
+                              for node in nodes])
+        self._switches = dict([(index, dict([
+            (result, indexes[id(branch)] if isinstance(branch, Node) else -1)
+            for result, branch in node.cases.items()]))
+                               for index, node in enumerate(nodes)
+                               if node.cases is not None])
+        self.__countNodes()
+
+    def __countNodes(self):
+        """
+        Counts the nodes of the tree as written and as loaded, see
+        `getNodeCounts`, from the node arrays.
+        """
+        sizes = [1] * len(self._methods)
+
+        for index in range(len(sizes) - 1, -1, -1):
+            for branch in self._getBranches(index):
+                sizes[index] += sizes[branch]
+
+        self._nodeCounts = {'tree': sizes and sizes[0] or 0,
+                            'loaded': len(sizes)}
+
+    def _getBranches(self, index):
+        """
+        Gets the nodes a node branches to.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+
+        :Returns:
+          A `tuple` of the index of each branch that is not a leaf, for a
+          switch node the branch of each result then its False branch.
+        """
+        switch = self._switches.get(index)
+
+        if switch is None:
+            branches = (self._lefts[index], self._rights[index])
+        else:
+            branches = tuple(switch.values()) + (self._rights[index],)
+
+        return tuple([branch for branch in branches if branch != -1])
+
+    def _getBranch(self, index, result):
+        """
+        Gets the branch a node takes for its result.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+          result : `object`
+            The result of the node method.
+
+        :Returns:
+          The index of the branch, -1 for a leaf.
+        """
+        switch = self._switches.get(index)
+
+        if switch is not None:
+            return switch.get(result, self._rights[index])
+
+        return self._lefts[index] if result else self._rights[index]
+
+    def getNodeCounts(self):
+        """
+        Gets the number of nodes in the tree as written in the sequence
+        object and the number of `Node` objects it was loaded into.
+
+        :Returns:
+          A `dict` with the ``tree`` and ``loaded`` counts.
+        """
+        return dict(self._nodeCounts)
 
     def dump(self, **kwargs):
         """
-        Dumps the result of the execution tree.
+        Dumps the result of the execution tree, see `evaluate`. The iteration
+        count, and the call sequence if it is being stored, are kept on this
+        instance for `getIterationCount` and `getCallSequence`.
 
         :Parameters:
           kwargs : `dict`
@@ -147,42 +414,568 @@ class RulesEngine(object):
             callable objects in the `Node` objects.
 
         :Returns:
-          The Boolean from first callable object.
+          The Boolean from the last callable object, or the value returned
+          from a leaf of the compiled function.
         """
-        self._reset()
-        return self.__extract(self._root, **kwargs)
+        evaluation = self.evaluate(kwargs, self._storeSeq)
+        self._iterCount = evaluation.iterations
+        self._callSequence = list(evaluation.path or ())
+        return evaluation.result
+
+    def evaluate(self, kwargs, path=False, _trace=True):
+        """
+        Evaluates the execution tree. The flattened tree is walked in a single
+        loop starting at the root index, each result selects the next index
+        from the True or False branch array until a leaf is found. If the tree
+        has been compiled, and the path is not wanted, the compiled function
+        is called instead.
+
+        Nothing is stored on this instance, so one instance can evaluate on
+        many threads at once as long as the node methods do not change it.
+
+        :Parameters:
+          kwargs : `dict`
+            The keyword arguments that shall be passed to the callable
+            objects in the `Node` objects.
+
+        :Keywords:
+          path : `bool`
+            If `True` the names of the methods called are returned in the
+            `Evaluation`. Default is `False`.
+
+        :Returns:
+          An `Evaluation` of the result, the iteration count and the path.
+        """
+        if _trace and self._tracer is not None:
+            return self._tracer.evaluate(self, RulesEngine.evaluate,
+                                         self.__walk, kwargs, path)
+
+        if self._stats is not None:
+            return self.__walk(kwargs, path)[0]
+
+        if self._compiled is not None and not path:
+            result, count = self._compiled(self._self, kwargs)
+            return Evaluation(result, count, None)
+
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches = self._switches
+        this = self._self
+        sequence = [] if path else None
+        index = 0 if methods else -1
+        count = 0
+        result = None
+
+        while index != -1:
+            method = methods[index]
+
+            if this is None:
+                result = method(**kwargs)
+            else:
+                result = method(this, **kwargs)
+
+            count += 1
+            sequence is not None and sequence.append(method.__name__)
+
+            if switches and index in switches:
+                index = switches[index].get(result, rights[index])
+            else:
+                index = lefts[index] if result else rights[index]
+
+        return Evaluation(result, count,
+                          None if sequence is None else tuple(sequence))
+
+    def __walk(self, kwargs, path):
+        """
+        Evaluates the execution tree as `evaluate` does, without the
+        compiled function, keeping the steps. They are recorded in the
+        statistics if they are on.
+
+        :Returns:
+          The `Evaluation` and a `list` of the ``(index, result, seconds)``
+          of each node on the path, the seconds are `None` unless the
+          statistics are timed.
+        """
+        stats = self._stats
+        timer = default_timer if stats is not None and stats.timing else None
+        methods, lefts, rights = self._methods, self._lefts, self._rights
+        switches = self._switches
+        this = self._self
+        sequence = [] if path else None
+        steps = []
+        index = 0 if methods else -1
+        result = elapsed = None
+
+        while index != -1:
+            method = methods[index]
+
+            if timer is not None:
+                start = timer()
+
+            if this is None:
+                result = method(**kwargs)
+            else:
+                result = method(this, **kwargs)
+
+            if timer is not None:
+                elapsed = timer() - start
+
+            steps.append((index, result, elapsed))
+            sequence is not None and sequence.append(method.__name__)
+
+            if switches and index in switches:
+                index = switches[index].get(result, rights[index])
+            else:
+                index = lefts[index] if result else rights[index]
 
-    def __extract(self, node, **kwargs):
+        if stats is not None:
+            stats.record(steps)
+
+        return Evaluation(result, len(steps), None if sequence is None
+                          else tuple(sequence)), steps
+
+    def evaluateResumable(self, kwargs):
+        """
+        Evaluates the execution tree as `evaluate` does with the path, keeping
+        the keyword arguments each node read so a later evaluation can be
+        resumed, see `resume`. The compiled function is not used.
+
+        :Parameters:
+          kwargs : `dict`
+            The keyword arguments that shall be passed to the callable
+            objects in the `Node` objects.
+
+        :Returns:
+          A `ResumableEvaluation`.
+        """
+        return self.__resumeWalk(kwargs, (), 0 if self._methods else -1,
+                                 self._resumeStart())
+
+    def resume(self, resumable, kwargs):
         """
-        A recursive call that dumps the result of each `Node` objects.
+        Evaluates the execution tree again for changed keyword arguments.
+        The steps of an earlier evaluation are reused up to the first node
+        that read an argument whose value changed, or whose keys are not
+        known and any argument changed, and the tree is walked from that
+        node on. Only the arguments read by the nodes are compared, so a
+        mapping that finds its values when they are read, like
+        `LazyConditions`, is not read in full.
 
         :Parameters:
-          node : `Node`
-            The current node being executed.
+          resumable : `ResumableEvaluation`
+            The earlier evaluation.
           kwargs : `dict`
-            The keyword arguments that are passed to the callable objects in
-            the Node objects.
+            The keyword arguments, all of them not only those changed.
 
         :Returns:
-          A Boolean from a callable object.
+          A `ResumableEvaluation`.
         """
-        self._iterCount += 1
+        values = resumable.values
+        steps = resumable.steps
+
+        for position, (index, result, keys, state) in enumerate(steps):
+            if keys is None:
+                keys = set(values).union(kwargs)
+
+            if [key for key in keys
+                    if values.get(key, _MISSING) != kwargs.get(key, _MISSING)]:
+                break
+        else:
+            return ResumableEvaluation(resumable.evaluation, kwargs, steps,
+                                       len(steps), values)
+
+        if position:
+            state = steps[position - 1][3]
+        else:
+            state = self._resumeStart()
+
+        return self.__resumeWalk(kwargs, steps[:position], index, state)
+
+    def __resumeWalk(self, kwargs, steps, index, state):
+        """
+        Walks the execution tree from a node, after the steps reused.
+        """
+        reused = len(steps)
+        steps = list(steps)
+        lefts, rights, switches = self._lefts, self._rights, self._switches
+        result = None
+
+        while index != -1:
+            result, keys, state = self._resumeNode(index, kwargs, state)
+            steps.append((index, result, keys, state))
+
+            if switches and index in switches:
+                index = switches[index].get(result, rights[index])
+            else:
+                index = lefts[index] if result else rights[index]
+
+        path = tuple([self._methods[step[0]].__name__ for step in steps])
+        evaluation = self._resumeResult(result, state, len(steps), path)
+        values = {}
+
+        # Only the arguments read are kept, all of them for a node whose
+        # keys are not known as it was called with all of them.
+        for step in steps:
+            keys = step[2]
+
+            if keys is None:
+                values.update(dict(kwargs))
+            else:
+                for key in keys:
+                    values[key] = kwargs.get(key, _MISSING)
+
+        return ResumableEvaluation(evaluation, kwargs, tuple(steps), reused,
+                                   values)
+
+    def _resumeStart(self):
+        """
+        Gets the state carried into the root node by `evaluateResumable`.
+        The default is `None`.
+        """
+        return None
+
+    def _resumeNode(self, index, kwargs, state):
+        """
+        Evaluates one node for `evaluateResumable`. The default calls the
+        node method, the keys it reads are not known unless a subclass knows
+        them, so any change restarts the walk at it.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+          kwargs : `dict`
+            The keyword arguments.
+          state : `object`
+            The state carried on from the node above, see `_resumeStart`.
+
+        :Returns:
+          A `tuple` of the result of the node, a `frozenset` of the keys it
+          read or `None`, and the state carried on from it.
+        """
+        method = self._methods[index]
 
         if self._self is None:
-            result = node.method(**kwargs)
+            result = method(**kwargs)
         else:
-            result = node.method(self._self, **kwargs)
+            result = method(self._self, **kwargs)
+
+        return result, None, state
+
+    def _resumeResult(self, result, state, count, path):
+        """
+        Gets the evaluation of `evaluateResumable`.
+
+        :Parameters:
+          result : `object`
+            The result of the last node.
+          state : `object`
+            The state carried on from the last node.
+          count : `int`
+            The iteration count.
+          path : `tuple`
+            The names of the methods on the path.
+
+        :Returns:
+          An `Evaluation`.
+        """
+        return Evaluation(result, count, path)
+
+    def compile(self):
+        """
+        Compiles the loaded tree into the source of a Python function made of
+        nested if/else blocks, one per node, with the leaf values inlined.
+        Once compiled `dump` calls this function instead of walking the tree.
+        Loading a new tree discards the compiled function.
+
+        Large subtrees that are repeated in the tree are written once as a
+        helper function that is called wherever they appear, otherwise the
+        source would grow with every repetition.
+
+        The generated function has the signature ``evaluate(this, kw)``, the
+        helper functions take the iteration count and the carried value of
+        the path above them as two more arguments. They all return a `tuple`
+        of the leaf value and the iteration count. How each node and each
+        leaf is written is decided by the `_compileCondition`,
+        `_compileCases`, `_compileLeaf` and `_compileCarry` methods which can
+        be overridden.
+
+        :Returns:
+          The compiled function.
+        """
+        namespace = {}
+        lines = []
+
+        if self._methods:
+            shared = self.__findSharedSubtrees()
+            self.__compileFunction('evaluate', 0, shared, lines, namespace)
+
+            for index in sorted(set(shared.values())):
+                self.__compileFunction('_s{}'.format(index), index, shared,
+                                       lines, namespace)
+        else:
+            lines.extend(['def evaluate(this, kw):', '    return None, 0'])
+
+        source = '\n'.join(lines) + '\n'
+        code = compile(source, '<{} compiled>'.format(
+            self.__class__.__name__), 'exec')
+        exec(code, namespace)
+        self._source = source
+        self._compiled = namespace['evaluate']
+        return self._compiled
+
+    def __findSharedSubtrees(self):
+        """
+        Finds the repeated subtrees to write as helper functions. Subtrees
+        are the same when their methods and branches are the same. While the
+        nodes written exceed `COMPILE_NODE_LIMIT` the subtree that saves the
+        most nodes is moved into a helper function.
+
+        :Returns:
+          A `dict` of node index to the index of the node that is written as
+          the helper function.
+        """
+        size = len(self._methods)
+        canonical = [0] * size
+        keys = {}
+
+        # Children always have a higher index than their parent, and so do
+        # the indexes kept for the same subtrees.
+        for index in range(size - 1, -1, -1):
+            left, right = self._lefts[index], self._rights[index]
+            key = (id(self._methods[index]),
+                   left != -1 and canonical[left] or -1,
+                   right != -1 and canonical[right] or -1)
+
+            if index in self._switches:
+                key += (tuple([(result, branch != -1 and canonical[branch]
+                                or -1) for result, branch
+                               in self._switches[index].items()]),)
+
+            canonical[index] = keys.setdefault(key, index)
+
+        order = sorted(set(canonical))
+        children = dict([(index, [canonical[branch]
+                                  for branch in self._getBranches(index)])
+                         for index in order])
+        helpers = set()
+
+        while True:
+            nodes = {}
+
+            for index in reversed(order):
+                nodes[index] = 1 + sum([nodes[child] for child in
+                                        children[index]
+                                        if child not in helpers])
+
+            uses = dict([(index, 0) for index in order])
+            uses[0] = 1
+
+            for index in order:
+                for child in children[index]:
+                    if child in helpers:
+                        uses[child] = 1
+                    else:
+                        uses[child] += index in helpers and 1 or uses[index]
 
-        self._storeSeq and self._callSequence.append(node.method.__name__)
+            if (sum([nodes[index] for index in helpers]) + nodes[0]
+                <= self.COMPILE_NODE_LIMIT):
+                break
 
-        if result:  # True take the left branch
-            if isinstance(node.left, Node):
-                result = self.__extract(node.left, **kwargs)
-        else:  # False take the right branch
-            if isinstance(node.right, Node):
-                result = self.__extract(node.right, **kwargs)
+            saved, index = max([((uses[index] - 1) * nodes[index], index)
+                                for index in order if index not in helpers])
 
-        return result
+            if saved <= 0:
+                break
+
+            helpers.add(index)
+
+        return dict([(index, canonical[index]) for index in range(1, size)
+                     if canonical[index] in helpers])
+
+    def __compileFunction(self, name, index, shared, lines, namespace):
+        """
+        Writes the source of a function that evaluates the subtree at a
+        node. A helper function is passed the iteration count ``_d`` and the
+        carried value ``_c``, see `_compileCarry`, of the path above it.
+
+        :Parameters:
+          name : `str`
+            The function name.
+          index : `int`
+            The index of the node at the top of the subtree.
+          shared : `dict`
+            The shared subtrees, see `__findSharedSubtrees`.
+          lines : `list`
+            The source lines written so far.
+          namespace : `dict`
+            The global namespace of the compiled function.
+        """
+        lines.append('def {}(this, kw, _d=0, _c=None):'.format(name))
+        lines.extend(['    ' + line
+                      for line in self._compileHeader(namespace)])
+        self.__compileNode(index, [], index != 0, shared, lines, namespace)
+
+    def __compileNode(self, index, path, helper, shared, lines, namespace):
+        """
+        A recursive call that writes the source for a node and both of its
+        branches, or each branch of a switch node. The path holds the result
+        of each case of a switch node and `None` for its False branch.
+
+        :Parameters:
+          index : `int`
+            The index of the node being written.
+          path : `list`
+            The ``(index, result)`` pairs of the nodes above this node in the
+            function being written.
+          helper : `bool`
+            `True` if the function being written is a helper function.
+          shared : `dict`
+            The shared subtrees, see `__findSharedSubtrees`.
+          lines : `list`
+            The source lines written so far.
+          namespace : `dict`
+            The global namespace of the compiled function.
+        """
+        indent = '    ' * (len(path) + 1)
+
+        for line in self._compileCondition(index, path, namespace):
+            lines.append(indent + line)
+
+        if index not in self._switches:
+            branches = [('if _r:', True, self._lefts[index]),
+                        ('else:', False, self._rights[index])]
+        else:
+            branches = [('{} {}:'.format(number and 'elif' or 'if', test),
+                         result, branch) for number, (test, result, branch)
+                        in enumerate(self._compileCases(index, namespace))]
+            branches.append((branches and 'else:' or 'if True:', None,
+                             self._rights[index]))
+
+        for test, result, branch in branches:
+            lines.append(indent + test)
+            path.append((index, result))
+            count = helper and '_d + {}'.format(len(path)) or len(path)
+
+            if branch == -1:
+                lines.append('{}    return {}, {}'.format(
+                    indent, self._compileLeaf(path, namespace), count))
+            elif branch in shared:
+                lines.append('{}    return _s{}(this, kw, {}, {})'.format(
+                    indent, shared[branch], count,
+                    self._compileCarry(path, namespace)))
+            else:
+                self.__compileNode(branch, path, helper, shared, lines,
+                                   namespace)
+
+            path.pop()
+
+    def _compileHeader(self, namespace):
+        """
+        Gets the source lines that start the body of each compiled function.
+
+        :Parameters:
+          namespace : `dict`
+            The global namespace of the compiled function.
+
+        :Returns:
+          A `list` of source lines.
+        """
+        return []
+
+    def _compileCondition(self, index, path, namespace):
+        """
+        Gets the source lines for a node, the last line shall assign the
+        result of the node to ``_r``. The default calls the node method.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+          path : `list`
+            The ``(index, result)`` pairs of the nodes above this node in the
+            function being written.
+          namespace : `dict`
+            The global namespace of the compiled function.
+
+        :Returns:
+          A `list` of source lines.
+        """
+        name = '_m{}'.format(index)
+        namespace[name] = self._methods[index]
+
+        if self._self is None:
+            return ['_r = {}(**kw)'.format(name)]
+        else:
+            return ['_r = {}(this, **kw)'.format(name)]
+
+    def _compileCases(self, index, namespace):
+        """
+        Gets the cases of a switch node, tested in turn, the False branch is
+        taken if none is `True`. The default tests the result ``_r`` of the
+        node against each result of the switch.
+
+        :Parameters:
+          index : `int`
+            The index of the node.
+          namespace : `dict`
+            The global namespace of the compiled function.
+
+        :Returns:
+          A `list` of the source expression of each case, the result it is
+          for and the index of its branch.
+        """
+        cases = []
+
+        for number, (result, branch) in enumerate(
+            self._switches[index].items()):
+            name = '_k{}_{}'.format(index, number)
+            namespace[name] = result
+            cases.append(('_r == {}'.format(name), result, branch))
+
+        return cases
+
+    def _compileLeaf(self, path, namespace):
+        """
+        Gets the source expression of the value returned from a leaf. The
+        default is the result of the last node.
+
+        :Parameters:
+          path : `list`
+            The ``(index, result)`` pairs of the nodes leading to this leaf
+            in the function being written.
+          namespace : `dict`
+            The global namespace of the compiled function.
+
+        :Returns:
+          A source expression.
+        """
+        return '_r'
+
+    def _compileCarry(self, path, namespace):
+        """
+        Gets the source expression of a value carried into a helper
+        function as ``_c``, for a subclass whose leaf values depend on the
+        nodes above the helper. It is `None` in the ``evaluate`` function.
+        The default carries nothing.
+
+        :Parameters:
+          path : `list`
+            The ``(index, result)`` pairs of the nodes above the helper
+            function in the function being written.
+          namespace : `dict`
+            The global namespace of the compiled function.
+
+        :Returns:
+          A source expression.
+        """
+        return 'None'
+
+    def getCompiledSource(self):
+        """
+        Gets the source generated by the `compile` method.
+
+        :Returns:
+          The source `str` or `None` if the tree has not been compiled.
+        """
+        return self._source
 
     def getIterationCount(self):
         """
@@ -202,10 +995,130 @@ class RulesEngine(object):
         """
         return self._callSequence
 
+    def enableStats(self, timing=False):
+        """
+        Turns on the statistics of the nodes, see `NodeStats`. Every
+        evaluation after this counts the nodes it reaches and the branch each
+        takes. The compiled function is not used while they are on. Any
+        statistics kept so far are dropped.
+
+        :Keywords:
+          timing : `bool`
+            If `True` the method of each node is also timed. Default is
+            `False`.
+        """
+        from rulesengine.node_stats import NodeStats
+        self._stats = NodeStats([method.__name__ for method in self._methods],
+                                timing)
+
+    def disableStats(self):
+        """
+        Turns off the statistics of the nodes, the evaluations are not
+        slowed by them when off.
+        """
+        self._stats = None
+
+    def getStats(self):
+        """
+        Gets a snapshot of the statistics of the nodes, see
+        `NodeStats.snapshot`.
+
+        :Returns:
+          A `dict` or `None` if the statistics are off.
+        """
+        return self._stats is not None and self._stats.snapshot() or None
+
+    def resetStats(self):
+        """
+        Sets the statistics of the nodes to zero, if they are on.
+        """
+        self._stats is not None and self._stats.reset()
+
+    def enableTracer(self, size=1024, every=0, predicate=None, sink=None):
+        """
+        Turns on the tracer, see `Tracer`. The path of one evaluation in
+        every ``every``, and of each evaluation whose result the predicate
+        accepts, is kept as a compact `Trace` in a ring buffer of ``size``.
+        An evaluation that is not sampled by count costs one more counter.
+        With a predicate each evaluation is walked keeping its path, see
+        `Tracer`, and the predicate is called. Any traces kept so far are
+        dropped.
+
+        *Example*
+          ``engine.enableTracer(every=1000, predicate=lambda result:``
+          ``result.code >= 500)``
+
+        :Keywords:
+          size : `int`
+            The most traces kept. Default is 1024.
+          every : `int`
+            One in this many evaluations is traced. The default `0` traces
+            none by count.
+          predicate : `callable`
+            Takes the result of `evaluate` and returns `True` if the
+            evaluation is to be traced. The node methods are called once,
+            on the walk that keeps the path. Default is `None`.
+          sink : `callable`
+            Called with each `Trace` in place of keeping it. Default is
+            `None`.
+        """
+        from rulesengine.tracer import Tracer
+        self._tracer = Tracer(size, every, predicate, sink)
+
+    def disableTracer(self):
+        """
+        Turns off the tracer and drops the traces kept.
+        """
+        self._tracer = None
+
+    def drainTraces(self):
+        """
+        Removes the traces kept, see `Tracer.drain`.
+
+        :Returns:
+          A `list` of `Trace` objects, the oldest first, empty if the tracer
+          is off.
+        """
+        return self._tracer is not None and self._tracer.drain() or []
+
+    def getTraceNames(self, trace):
+        """
+        Gets the method names of the nodes of a trace.
+
+        :Parameters:
+          trace : `Trace`
+            A trace from `drainTraces`.
+
+        :Returns:
+          A `tuple` of the names.
+        """
+        return tuple([self._methods[index].__name__ for index in trace.nodes])
+
     def translateToCallNames(self, seq):
-        return self.__translateCall(seq)
+        """
+        Translates a sequence object of methods into nested `list` objects of
+        the method names, the cases of a switch node stay a `dict`. A
+        sequence object used in more than one place is translated once.
+
+        *Example*
+          ``[<function _a>, [<function _b>, None, None], None]`` gives
+          ``['_a', ['_b', None, None], None]``
+
+        :Parameters:
+          seq : `list` or `tuple`
+            A sequence of nodes comprising an execution path.
+
+        :Returns:
+          The nested `list` objects of names.
+        """
+        return self.__translateCall(seq, {})
+
+    def __translateCall(self, seq, translated):
+        found = translated.get(id(seq))
+
+        if found is not None:
+            return found
 
-    def __translateCall(self, seq):
         if not isinstance(seq, (list, tuple)):
             msg = ("Invalid sequence type, expected list or tuple "
                    "got: {}, on {}").format(type(seq), seq)
@@ -213,7 +1126,7 @@ class RulesEngine(object):
 
         if len(seq) != 3:
             msg = ("Invalid sequence size, expected: 3, "
-                   "got: {}, on: {}").format(size, seq)
+                   "got: {}, on: {}").format(len(seq), seq)
             raise InvalidNodeSizeException(msg)
 
         if not isinstance(seq[0], (types.FunctionType, types.MethodType)):
@@ -225,13 +1138,231 @@ class RulesEngine(object):
         nextList.append(seq[0].__name__)
 
         if isinstance(seq[1], (list, tuple)):
-            nextList.append(self.__translateCall(seq[1]))
+            nextList.append(self.__translateCall(seq[1], translated))
+        elif isinstance(seq[1], dict):
+            nextList.append(dict([
+                (result, self.__translateCall(item, translated)
+                 if isinstance(item, (list, tuple)) else None)
+                for result, item in seq[1].items()]))
         else:
             nextList.append(None)
 
         if isinstance(seq[2], (list, tuple)):
-            nextList.append(self.__translateCall(seq[2]))
+            nextList.append(self.__translateCall(seq[2], translated))
         else:
             nextList.append(None)
 
+        translated[id(seq)] = nextList
         return nextList
+
+    def translateToCalls(self, seq):
+        """
+        Translates nested `list` objects of method names, as made by
+        `translateToCallNames`, back into a sequence object of methods that
+        can be loaded, see `_resolveName`.
+
+        :Parameters:
+          seq : `list` or `tuple`
+            The nested sequences of names.
+
+        :Returns:
+          The nested `list` objects of methods.
+
+        :Raises:
+          InvalidCallTypeException
+            If a name is not a method of `this`.
+        """
+        translated = {}
+        stack = [(seq, False)]
+
+        def get(branch):
+            if isinstance(branch, (list, tuple)):
+                return translated[id(branch)]
+
+            return None
+
+        # Each sequence is finished after its branches.
+        while stack:
+            item, finished = stack.pop()
+
+            if id(item) in translated:
+                continue
+
+            if not isinstance(item, (list, tuple)):
+                msg = ("Invalid sequence type, expected list or tuple "
+                       "got: {}, on {}").format(type(item), item)
+                raise InvalidSequenceTypeException(msg)
+
+            if len(item) != 3:
+                msg = ("Invalid sequence size, expected: 3, "
+                       "got: {}, on: {}").format(len(item), item)
+                raise InvalidNodeSizeException(msg)
+
+            cases = isinstance(item[1], dict) and item[1] or {}
+            branches = [branch for branch in list(item[1:])
+                        + list(cases.values())
+                        if isinstance(branch, (list, tuple))]
+
+            if finished:
+                translated[id(item)] = [
+                    self._resolveName(item[0]),
+                    dict([(result, get(branch))
+                          for result, branch in cases.items()])
+                    if isinstance(item[1], dict) else get(item[1]),
+                    get(item[2])]
+            else:
+                stack.append((item, True))
+                stack.extend([(branch, False) for branch in branches])
+
+        return translated[id(seq)]
+
+    def _resolveName(self, name):
+        """
+        Gets the method of a name in a serialized tree. The default looks
+        the name up on the class of `this`, or on this class if `this` is
+        `None`, and it shall be a function.
+
+        :Parameters:
+          name : `str`
+            The method name.
+
+        :Returns:
+          The method.
+
+        :Raises:
+          InvalidCallTypeException
+            If the name is not a method of `this`.
+        """
+        this = self._self
+        klass = this is None and self.__class__ or type(this)
+
+        for base in getattr(klass, '__mro__', (klass,)):
+            found = base.__dict__.get(name)
+
+            if isinstance(found, types.FunctionType):
+                return found
+
+        msg = "Invalid call name, {!r} is not a method of {}.".format(
+            name, klass.__name__)
+        raise InvalidCallTypeException(msg)
+
+    def toJSON(self):
+        """
+        Serializes the loaded tree as JSON, see `rulesengine.tree_format`.
+        Each method is written as its name.
+
+        :Returns:
+          A JSON `str`.
+        """
+        from rulesengine.tree_format import dumpJSON
+        return dumpJSON(self)
+
+    def toBytes(self):
+        """
+        Serializes the loaded tree in the compact binary form, see
+        `rulesengine.tree_format`.
+
+        :Returns:
+          The `bytes`.
+        """
+        from rulesengine.tree_format import dumpBytes
+        return dumpBytes(self)
+
+    def loadJSON(self, data):
+        """
+        Loads a tree serialized by `toJSON`, see `loadNodes`.
+
+        :Parameters:
+          data : `str`
+            The JSON.
+
+        :Raises:
+          InvalidTreeFormatException
+            If it is not a valid tree.
+          InvalidCallTypeException
+            If a name is not a method of `this`.
+        """
+        from rulesengine.tree_format import parseJSON
+        return self.loadNodes(*parseJSON(data))
+
+    def loadBytes(self, data):
+        """
+        Loads a tree serialized by `toBytes`, see `loadNodes`.
+
+        :Parameters:
+          data : `bytes`
+            The binary form.
+
+        :Raises:
+          InvalidTreeFormatException
+            If it is not a valid tree.
+          InvalidCallTypeException
+            If a name is not a method of `this`.
+        """
+        from rulesengine.tree_format import parseBytes
+        return self.loadNodes(*parseBytes(data))
+
+    def loadNodes(self, names, lefts, rights, switches=None):
+        """
+        Loads a tree from the table of its nodes. The table is already in the
+        order of the node arrays, every branch after its node, so the arrays
+        are set from it directly and the `Node` objects are made from the
+        last node to the first, without recursion. Each name is resolved
+        once with `_resolveName`.
+
+        :Parameters:
+          names : `tuple`
+            The method name of each node, the root is node 0.
+          lefts : `tuple`
+            The index of the True branch of each node, a leaf is -1. Each
+            branch shall have a higher index than its node.
+          rights : `tuple`
+            The index of the False branch of each node.
+
+        :Keywords:
+          switches : `dict`
+            The index of the branch of each result of each switch node,
+            keyed on the index of the node. Default is `None`.
+
+        :Returns:
+          The root `Node`.
+
+        :Raises:
+          InvalidNodeSizeException
+            If there are no nodes.
+        """
+        if not names:
+            return self.load([])
+
+        methods = {}
+        nodes = [None] * len(names)
+        switches = switches or {}
+
+        def get(branch):
+            return None if branch == -1 else nodes[branch]
+
+        for name in names:
+            if name not in methods:
+                methods[name] = self._resolveMethod(self._resolveName(name))
+
+        for index in range(len(names) - 1, -1, -1):
+            cases = switches.get(index)
+
+            if cases is not None:
+                cases = dict([(result, get(branch))
+                              for result, branch in cases.items()])
+
+            nodes[index] = Node(methods[names[index]],
+                                None if cases else get(lefts[index]),
+                                get(rights[index]), cases)
+
+        self._methods = tuple([methods[name] for name in names])
+        self._lefts = tuple([-1 if index in switches else left
+                             for index, left in enumerate(lefts)])
+        self._rights = tuple(rights)
+        self._switches = dict([(index, dict(cases))
+                               for index, cases in switches.items()])
+        self._root = nodes[0]
+        self.__countNodes()
+        self._finishLoad()
+        return self._root
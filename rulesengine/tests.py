@@ -10,12 +10,20 @@ by: Carl J. Nobile
 
 email: carl.nobile@gmail.com
 """
+from __future__ import print_function
+
 __docformat__ = "restructuredtext en"
 
 
+import sys
 import unittest
 
-from rulesengine import (RulesEngine, InvalidNodeSizeException,)
+from rulesengine import (RulesEngine, InvalidNodeSizeException,
+                         InvalidCallTypeException, InvalidTreeFormatException,)
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from rulesengine.async_rules_engine import AsyncRulesEngine
 
 
 class TestRulesEngine(unittest.TestCase):
@@ -113,9 +121,366 @@ class TestRulesEngine(unittest.TestCase):
         msg = "Iteration count should be {}, found {}".format(expect, count)
         self.assertTrue(count == expect, msg)
 
+    def testCallSequence(self):
+        """
+        Test that the flattened tree is walked in the same order as the
+        sequence object configuration.
+        """
+        re = RulesEngine(self, storeSeq=True)
+        re.load(self.nodeTree)
+        kwargs = {'arg1': True, 'arg2': False, 'arg3': False}
+        result = re.dump(**kwargs)
+        expect = ['_dummyMethod_01', '_dummyMethod_02', '_dummyMethod_03']
+        found = re.getCallSequence()
+        msg = "Call sequence should be {}, found {}".format(expect, found)
+        self.assertTrue(found == expect, msg)
+        self.assertTrue(result is False, "Result should be the last result.")
+
+    def testDumpBeforeLoad(self):
+        """
+        Test that dumping an engine with nothing loaded calls nothing.
+        """
+        self.assertTrue(self._re.dump() is None)
+        self.assertTrue(self._re.getIterationCount() == 0)
+
+    def testCompile(self):
+        """
+        Test that the compiled tree gives the same result and iteration
+        count as the tree walked by `dump`.
+        """
+        compiled = RulesEngine(self)
+        compiled.load(self.nodeTree)
+        compiled.compile()
+        source = compiled.getCompiledSource()
+        self.assertTrue(source.startswith('def evaluate(this, kw'), source)
+        self._re.load(self.nodeTree)
+
+        for values in ((True, False, True), (False, False, True),
+                       (True, True, True), (True, False, False)):
+            kwargs = dict(zip(('arg1', 'arg2', 'arg3'), values))
+            expect = (self._re.dump(**kwargs), self._re.getIterationCount())
+            found = (compiled.dump(**kwargs), compiled.getIterationCount())
+            msg = "Compiled result should be {}, found {}, with {}".format(
+                expect, found, kwargs)
+            self.assertTrue(found == expect, msg)
+
+    def testSharedNodes(self):
+        """
+        Test that shared and identical sequence objects are loaded into one
+        `Node` and walked the same as the tree.
+        """
+        shared = [self._dummyMethod_03, None, None]
+        nodeTree = [self._dummyMethod_01,
+                    [self._dummyMethod_02, shared, shared],
+                    [self._dummyMethod_02,
+                     [self._dummyMethod_03, None, None],
+                     shared]]
+        re = RulesEngine(RulesEngine.NO_INST, storeSeq=True)
+        root = re.load(nodeTree)
+        self.assertTrue(root.left.left is root.right.right)
+        self.assertTrue(root.right.left is root.left.left)
+        self.assertTrue(root.left is root.right)
+        counts = re.getNodeCounts()
+        self.assertTrue(counts == {'tree': 7, 'loaded': 3}, counts)
+        re.dump(arg1=False, arg2=True, arg3=False)
+        found = re.getCallSequence()
+        expect = ['_dummyMethod_01', '_dummyMethod_02', '_dummyMethod_03']
+        msg = "Call sequence should be {}, found {}".format(expect, found)
+        self.assertTrue(found == expect, msg)
+
+    def testStats(self):
+        """
+        Test that the statistics count each node and branch, are kept while
+        compiled and are dropped when the tree is loaded again.
+        """
+        self._re.load(self.nodeTree)
+        self._re.compile()
+        self.assertTrue(self._re.getStats() is None)
+        self._re.enableStats(timing=True)
+
+        for values in ((True, False, True), (False, False, True),
+                       (True, True, True), (True, False, False)):
+            self._re.dump(**dict(zip(('arg1', 'arg2', 'arg3'), values)))
+
+        stats = self._re.getStats()
+        self.assertTrue(stats['evaluations'] == 4, stats)
+        found = [(node.name, node.hits, node.trues, sum(node.histogram))
+                 for node in stats['nodes']]
+        expect = [('_dummyMethod_01', 4, 3, 4), ('_dummyMethod_02', 3, 1, 3),
+                  ('_dummyMethod_03', 2, 1, 2)]
+        msg = "Statistics should be {}, found {}".format(expect, found)
+        self.assertTrue(found == expect, msg)
+        self.assertTrue(self._re.getIterationCount() == 3)
+        self._re.load(self.nodeTree)
+        self.assertTrue(self._re.getStats()['evaluations'] == 0)
+        self._re.disableStats()
+        self._re.resetStats()
+        self.assertTrue(self._re.getStats() is None)
+
+    def testTracer(self):
+        """
+        Test that one in every N evaluations, and those the predicate
+        accepts, are traced into a ring buffer.
+        """
+        self._re.load(self.nodeTree)
+        self._re.compile()
+        self.assertTrue(self._re.drainTraces() == [])
+        self._re.enableTracer(size=2, every=3,
+                              predicate=lambda found: found.iterations == 1)
+        values = ((True, False, True), (False, False, True),
+                  (True, True, True), (True, False, False),
+                  (True, False, True))
+
+        for value in values:
+            self._re.dump(**dict(zip(('arg1', 'arg2', 'arg3'), value)))
+
+        traces = self._re.drainTraces()
+        found = [(trace.number, self._re.getTraceNames(trace),
+                  trace.getBranches()) for trace in traces]
+        expect = [(1, ('_dummyMethod_01',), (False,)),
+                  (3, ('_dummyMethod_01', '_dummyMethod_02',
+                       '_dummyMethod_03'), (True, False, False))]
+        msg = "Traces should be {}, found {}".format(expect, found)
+        self.assertTrue(found == expect, msg)
+        self.assertTrue(traces[1].result is False, traces[1])
+        self.assertTrue(self._re.drainTraces() == [])
+        self._re.disableTracer()
+        self._re.dump()
+        self.assertTrue(self._re.drainTraces() == [])
+
     def testTranslateCallSequence(self):
         result = self._re.translateToCallNames(TestRulesEngine.nodeTree)
-        print result
+        print(result)
+
+    def testResume(self):
+        """
+        Test that a resumed evaluation reuses the steps up to the first node
+        that may read a changed argument and takes the same path as
+        `evaluate`.
+        """
+        class KeyedEngine(RulesEngine):
+            def _resumeNode(self, index, kwargs, state):
+                result, keys, state = super(KeyedEngine, self)._resumeNode(
+                    index, kwargs, state)
+                name = self._methods[index].__name__
+                return result, frozenset(['arg' + name[-1]]), state
+
+        kwargs = {'arg1': True, 'arg2': False, 'arg3': True}
+        self._re.load(self.nodeTree)
+        resumable = self._re.evaluateResumable(kwargs)
+        expect = self._re.evaluate(kwargs, path=True)
+        self.assertTrue(resumable.evaluation == expect, resumable)
+        found = self._re.resume(resumable, dict(kwargs, arg3=False))
+        self.assertTrue(found.reused == 0, found)
+        self.assertTrue(self._re.resume(resumable, kwargs).reused == 3)
+        re = KeyedEngine(self)
+        re.load(self.nodeTree)
+        resumable = re.evaluateResumable(kwargs)
+
+        for changed, reused in (({'arg3': False}, 2), ({'arg2': True}, 1),
+                                ({'arg1': False}, 0), ({'arg4': 1}, 3)):
+            changed = dict(kwargs, **changed)
+            found = re.resume(resumable, changed)
+            expect = re.evaluate(changed, path=True)
+            msg = "Resumed should be {} reusing {}, found {}".format(
+                expect, reused, found)
+            self.assertTrue(found.evaluation == expect, msg)
+            self.assertTrue(found.reused == reused, msg)
+
+        # The values read are kept, the arguments may be changed in place.
+        resumable = re.evaluateResumable(kwargs)
+        self.assertTrue(resumable.kwargs is kwargs, resumable)
+        kwargs['arg3'] = False
+        found = re.resume(resumable, kwargs)
+        self.assertTrue(found.reused == 2, found)
+        self.assertTrue(found.values == kwargs, found)
+
+    def testTranslateToCalls(self):
+        """
+        Test that the names translate back to the same methods and that a
+        shared sequence object stays shared.
+        """
+        shared = [TestRulesEngine._dummyMethod_03, None, None]
+        nodeTree = [TestRulesEngine._dummyMethod_01, shared,
+                    [TestRulesEngine._dummyMethod_02, shared, None]]
+        names = self._re.translateToCallNames(nodeTree)
+        expect = ['_dummyMethod_01', ['_dummyMethod_03', None, None],
+                  ['_dummyMethod_02', ['_dummyMethod_03', None, None], None]]
+        msg = "Names should be {}, found {}".format(expect, names)
+        self.assertTrue(names == expect, msg)
+        self.assertTrue(names[1] is names[2][1])
+        found = self._re.translateToCalls(names)
+        self.assertTrue(found[0] is TestRulesEngine.nodeTree[0], found)
+        self.assertTrue(self._re.translateToCallNames(found) == names, found)
+        self.assertTrue(found[1] is found[2][1])
+        self.assertRaises(InvalidNodeSizeException,
+                          self._re.translateToCallNames, [None, None])
+        self.assertRaises(InvalidCallTypeException,
+                          self._re.translateToCalls, ['_missing', None, None])
+
+    def testSerializedTree(self):
+        """
+        Test that a tree loaded from its JSON and binary forms takes the
+        same paths, without `load`, and that a damaged tree is rejected.
+        """
+        self._re.load(self.nodeTree)
+        data = (self._re.toJSON(), self._re.toBytes())
+        re = RulesEngine(self, storeSeq=True)
+        tables = ('_methods', '_lefts', '_rights', '_switches')
+
+        for load, serialized in zip((re.loadJSON, re.loadBytes), data):
+            re.load = None
+            load(serialized)
+            del re.load
+            self.assertTrue(re.getNodeCounts() == self._re.getNodeCounts())
+
+            for table in tables:
+                msg = "Table {} should be {}, found {}".format(
+                    table, getattr(self._re, table), getattr(re, table))
+                self.assertTrue(
+                    getattr(re, table) == getattr(self._re, table), msg)
+
+            for values in ((True, False, True), (False, False, True),
+                           (True, True, True), (True, False, False)):
+                kwargs = dict(zip(('arg1', 'arg2', 'arg3'), values))
+                expect = self._re.evaluate(kwargs, path=True)
+                found = re.evaluate(kwargs, path=True)
+                msg = "Evaluation should be {}, found {}, with {}".format(
+                    expect, found, kwargs)
+                self.assertTrue(found == expect, msg)
+
+        json, binary = data
+
+        for damaged in ('', '[]', json.replace('"version":1', '"version":2'),
+                        json.replace(',1,', ',0,')):
+            self.assertRaises(InvalidTreeFormatException, re.loadJSON,
+                              damaged)
+
+        for damaged in (b'', binary[:-1], b'X' + binary[1:]):
+            self.assertRaises(InvalidTreeFormatException, re.loadBytes,
+                              damaged)
+
+        self.assertRaises(InvalidCallTypeException, re.loadJSON,
+                          json.replace('_dummyMethod_02', '_missing'))
+
+    def testSwitch(self):
+        """
+        Test that a switch node takes the branch of its result, or the
+        default, when interpreted, compiled, resumed and serialized.
+        """
+        shared = [TestRulesEngine._dummyMethod_02, None, None]
+        nodeTree = [TestRulesEngine._dummySwitch,
+                    {'one': [TestRulesEngine._dummyMethod_01, shared, None],
+                     'two': shared,
+                     'three': None},
+                    [TestRulesEngine._dummyMethod_03, None, None]]
+        self._re.load(nodeTree)
+        counts = self._re.getNodeCounts()
+        self.assertTrue(counts == {'tree': 5, 'loaded': 4}, counts)
+        compiled = RulesEngine(self)
+        compiled.load(nodeTree)
+        compiled.compile()
+        loaded = RulesEngine(self)
+        loaded.load(self._re.translateToCalls(
+            self._re.translateToCallNames(nodeTree)))
+        engines = [compiled, loaded]
+
+        for data, load in ((self._re.toJSON(), 'loadJSON'),
+                           (self._re.toBytes(), 'loadBytes')):
+            engine = RulesEngine(self)
+            getattr(engine, load)(data)
+            engines.append(engine)
+
+        for key, expect in (('one', (False, 3)), ('two', (False, 2)),
+                            ('three', ('three', 1)), ('four', (True, 2)),
+                            (None, (True, 2))):
+            kwargs = {'key': key, 'arg1': True}
+            found = self._re.evaluate(kwargs)
+            msg = "Evaluation should be {}, found {}, with {}".format(
+                expect, found, kwargs)
+            self.assertTrue(found[:2] == expect, msg)
+            path = self._re.evaluate(kwargs, path=True)
+
+            for engine in engines:
+                self.assertTrue(engine.evaluate(kwargs) == found, engine)
+                self.assertTrue(engine.evaluate(kwargs, path=True) == path,
+                                engine)
+
+            resumable = self._re.evaluateResumable(kwargs)
+            self.assertTrue(resumable.evaluation == path, resumable)
+            found = self._re.resume(resumable, dict(kwargs, key='two'))
+            expect = self._re.evaluate(dict(kwargs, key='two'), path=True)
+            self.assertTrue(found.evaluation == expect, found)
+
+        # The tracer keeps the result of the switch node on the path.
+        compiled.enableTracer(every=1)
+        compiled.evaluate({'key': 'two', 'arg1': True})
+        trace = compiled.drainTraces()[0]
+        self.assertTrue(trace.getBranches() == ('two', False),
+                        trace.getBranches())
+        compiled.disableTracer()
+
+        # The cases of the compiled switch can be overridden.
+        class CasesEngine(RulesEngine):
+            def _compileCases(self, index, namespace):
+                return [('kw.get("key") == "two"', 'two',
+                         self._switches[index]['two'])]
+
+        engine = CasesEngine(self)
+        engine.load(nodeTree)
+        engine.compile()
+        self.assertTrue('kw.get("key") == "two"' in engine._source,
+                        engine._source)
+        self.assertTrue(engine.evaluate({'key': 'two'}) == compiled.evaluate(
+            {'key': 'two'}))
+        self.assertTrue(engine.evaluate({'key': 'one'}) == compiled.evaluate(
+            {'key': 'four'}))
+
+        names = self._re.translateToCallNames(nodeTree)
+        self.assertTrue(names[1]['two'] is names[1]['one'][1], names)
+        self.assertRaises(InvalidTreeFormatException, self._re.loadJSON,
+                          self._re.toJSON().replace('"two":', '"two":0,"x":'))
+        self._re.load([TestRulesEngine._dummySwitch, {1: None}, None])
+        self.assertRaises(InvalidTreeFormatException, self._re.toJSON)
+
+    @unittest.skipIf(sys.version_info < (3, 5), "Needs asyncio coroutines.")
+    def testAsync(self):
+        """
+        Test that the async engine awaits the node methods that return an
+        awaitable and takes the same path as `dump`.
+        """
+        def later(method):
+            def call(this, **kwargs):
+                return asyncio.sleep(0, method(this, **kwargs))
+
+            call.__name__ = method.__name__
+            return call
+
+        nodeTree = [later(TestRulesEngine._dummyMethod_01),
+                    [TestRulesEngine._dummyMethod_02,
+                     None,
+                     [later(TestRulesEngine._dummyMethod_03),
+                      None,
+                      None]],
+                    None]
+        are = AsyncRulesEngine(self, storeSeq=True)
+        are.load(nodeTree)
+        re = RulesEngine(self, storeSeq=True)
+        re.load(self.nodeTree)
+        loop = asyncio.new_event_loop()
+
+        try:
+            for values in ((True, False, True), (False, False, True),
+                           (True, True, True), (True, False, False)):
+                kwargs = dict(zip(('arg1', 'arg2', 'arg3'), values))
+                expect = (re.dump(**kwargs), re.getCallSequence())
+                found = (loop.run_until_complete(are.dump(**kwargs)),
+                         are.getCallSequence())
+                msg = "Async result should be {}, found {}, with {}".format(
+                    expect, found, kwargs)
+                self.assertTrue(found == expect, msg)
+        finally:
+            loop.close()
 
     def _dummyMethod_01(self, **kwargs):
         """
@@ -135,6 +500,12 @@ class TestRulesEngine(unittest.TestCase):
         """
         return kwargs.get('arg3', True)
 
+    def _dummySwitch(self, **kwargs):
+        """
+        Test switch method.
+        """
+        return kwargs.get('key')
+
     # [callable,
     #  True -- (callable|None),
     #  False -- (callable|None)]
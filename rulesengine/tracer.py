@@ -0,0 +1,174 @@
+#
+# rulesengine/tracer.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Tracer
+  Records the paths of a sample of the evaluations of a tree in a ring
+  buffer of fixed size.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import itertools
+import threading
+from array import array
+from collections import deque, namedtuple
+
+
+class Trace(namedtuple('Trace', 'number result nodes branches cases')):
+    """
+    The path of one evaluation. The ``number`` is the count of evaluations
+    before it and ``result`` the first item of the evaluation, the result of
+    the last node or the status code. The ``nodes`` is an ``array`` of the
+    index of each node on the path and bit ``n`` of ``branches`` is set if
+    node ``n`` of the path took the True branch. The ``cases`` is a `dict`
+    of the result of each switch node on the path keyed by its step.
+    """
+    __slots__ = ()
+
+    def getBranches(self):
+        """
+        :Returns:
+          A `tuple` of the `bool` branch taken at each node of the path, or
+          the result of a switch node.
+        """
+        return tuple([self.cases[step] if step in self.cases
+                      else bool(self.branches >> step & 1)
+                      for step in range(len(self.nodes))])
+
+
+class Tracer(object):
+    """
+    Samples the evaluations of a `RulesEngine`, see
+    `RulesEngine.enableTracer`. An evaluation is traced if it is one in
+    every ``every``, found with one counter, or if its result is accepted
+    by the predicate. With a predicate every evaluation is walked once
+    keeping its path, as any of them can be traced, so none is found from
+    the cache or the compiled function.
+    """
+
+    def __init__(self, size=1024, every=0, predicate=None, sink=None):
+        """
+        :Keywords:
+          size : `int`
+            The most traces kept, the oldest are dropped first. Default is
+            1024.
+          every : `int`
+            One in this many evaluations is traced. The default `0` traces
+            none by count.
+          predicate : `callable`
+            Takes the result of an evaluation, an `Evaluation` or a
+            `StatusResult`, and returns `True` if it is to be traced.
+            Default is `None`.
+          sink : `callable`
+            Called with each `Trace` in place of keeping it. Default is
+            `None` which keeps the traces for `drain`.
+        """
+        self.every = every
+        self.predicate = predicate
+        self.sink = sink
+        self._traces = deque(maxlen=size)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def evaluate(self, engine, evaluate, walk, kwargs, path):
+        """
+        Evaluates the tree of an engine, tracing the evaluation if it is
+        sampled.
+
+        :Parameters:
+          engine : `RulesEngine`
+            The engine evaluated.
+          evaluate : `function`
+            The evaluate function of the engine's class, called as
+            ``evaluate(engine, kwargs, path, False)`` when not traced.
+          walk : `callable`
+            Called as ``walk(kwargs, path)`` when traced, it returns the
+            evaluation and the ``(index, result, seconds)`` of each node on
+            the path.
+          kwargs : `dict`
+            The conditions.
+          path : `bool`
+            Passed to the evaluation.
+
+        :Returns:
+          The evaluation.
+        """
+        number = next(self._counter)
+        sampled = self.every and number % self.every == 0
+
+        if not sampled and self.predicate is None:
+            return evaluate(engine, kwargs, path, False)
+
+        found, steps = walk(kwargs, path)
+
+        if sampled or self.predicate(found):
+            self.record(number, found, steps, engine._switches)
+
+        return found
+
+    def record(self, number, found, steps, switches=None):
+        """
+        Records a trace.
+
+        :Parameters:
+          number : `int`
+            The count of evaluations before it.
+          found : `tuple`
+            The evaluation.
+          steps : `list`
+            The ``(index, result, seconds)`` of each node on the path.
+
+        :Keywords:
+          switches : `dict`
+            The switch nodes of the engine, see `RulesEngine.load`. Default
+            is `None`.
+        """
+        nodes = array('I')
+        branches = 0
+        cases = {}
+
+        for step, (index, result, elapsed) in enumerate(steps):
+            nodes.append(index)
+
+            if result:
+                branches |= 1 << step
+
+            if switches and index in switches:
+                cases[step] = result
+
+        trace = Trace(number, found[0], nodes, branches, cases)
+
+        if self.sink is None:
+            self._traces.append(trace)
+        else:
+            self.sink(trace)
+
+    def drain(self):
+        """
+        Removes the traces kept.
+
+        :Returns:
+          A `list` of the `Trace` objects, the oldest first.
+        """
+        traces = []
+
+        with self._lock:
+            while self._traces:
+                traces.append(self._traces.popleft())
+
+        return traces
+
+    def __len__(self):
+        return len(self._traces)
@@ -0,0 +1,301 @@
+#
+# rulesengine/tree_format.py
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+"""
+Tree Format
+  A serialized form of a loaded tree, in JSON or in a compact binary form.
+  Both hold the table of unique nodes, in the order of the flattened tree,
+  with the method name of each node and the index of its True and False
+  branches, so a subtree used in many places is written once. The root is
+  node 0 and a branch always has a higher index than its node, so the tree
+  is rebuilt from the last node to the first without recursion.
+
+  The JSON form is::
+
+    {"format": "rulesengine.tree", "version": 1,
+     "nodes": [["_method", 1, null], ...]}
+
+  where a leaf is ``null``. A switch node has a fourth item, an object of
+  the branch of each result, and its True branch is ``null``. The binary
+  form is a header, the names, each ended with a NUL byte, then three
+  little endian 32 bit integers for each node, the index of its name and of
+  its branches, where a leaf is -1. If there are switch nodes they follow
+  as the index of the node, the number of results and the index of the
+  name of each result and of its branch. Only `str` results are written.
+
+by: Carl J. Nobile
+
+email: carl.nobile@gmail.com
+"""
+__docformat__ = "restructuredtext en"
+
+import json
+import struct
+import sys
+from array import array
+
+from rulesengine.rules_engine import InvalidTreeFormatException
+
+FORMAT_NAME = 'rulesengine.tree'
+FORMAT_VERSION = 1
+MAGIC = b'RETREE\0\0'
+_HEADER = struct.Struct('<8sHII')
+_TEXT = type(u''), type('')
+
+
+def _getNodes(engine):
+    """
+    :Returns:
+      The method name, True branch and False branch of each loaded node and
+      the switches, see `RulesEngine.loadNodes`.
+
+    :Raises:
+      InvalidTreeFormatException
+        If a result of a switch node is not a `str`.
+    """
+    for index, switch in engine._switches.items():
+        for result in switch:
+            if not isinstance(result, _TEXT):
+                msg = "Invalid result {!r} on switch node {}.".format(
+                    result, index)
+                raise InvalidTreeFormatException(msg)
+
+    return ([(method.__name__, engine._lefts[index], engine._rights[index])
+             for index, method in enumerate(engine._methods)],
+            engine._switches)
+
+
+def _checkNodes(names, nodes, switches):
+    """
+    Checks that each name index and branch index of the nodes is in range
+    and that each branch comes after its node, so there are no cycles.
+
+    :Raises:
+      InvalidTreeFormatException
+        If a node is not valid.
+    """
+    size = len(nodes)
+
+    if not size:
+        raise InvalidTreeFormatException("The tree has no nodes.")
+
+    for index, (name, left, right) in enumerate(nodes):
+        if not 0 <= name < len(names):
+            msg = "Invalid name index {} on node {}.".format(name, index)
+            raise InvalidTreeFormatException(msg)
+
+        for branch in (left, right) + tuple(switches.get(index, {}).values()):
+            if branch != -1 and not index < branch < size:
+                msg = "Invalid branch {} on node {}.".format(branch, index)
+                raise InvalidTreeFormatException(msg)
+
+    for index in switches:
+        if not 0 <= index < size:
+            msg = "Invalid switch node {}.".format(index)
+            raise InvalidTreeFormatException(msg)
+
+
+def dumpJSON(engine):
+    """
+    Serializes the tree loaded in an engine as JSON.
+
+    :Parameters:
+      engine : `RulesEngine`
+        The loaded engine.
+
+    :Returns:
+      A JSON `str`.
+    """
+    found, switches = _getNodes(engine)
+    nodes = [[name, None if left == -1 else left,
+              None if right == -1 else right]
+             for name, left, right in found]
+
+    for index, switch in switches.items():
+        nodes[index].append(dict([(result, None if branch == -1 else branch)
+                                  for result, branch in switch.items()]))
+
+    return json.dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION,
+                       'nodes': nodes}, separators=(',', ':'))
+
+
+def parseJSON(data):
+    """
+    Parses a tree serialized by `dumpJSON`.
+
+    :Parameters:
+      data : `str`
+        The JSON.
+
+    :Returns:
+      A `tuple` of the method name of each node, the True branches, the
+      False branches, a leaf is -1, and the switches, see
+      `RulesEngine.loadNodes`.
+
+    :Raises:
+      InvalidTreeFormatException
+        If it is not a valid tree.
+    """
+    try:
+        tree = json.loads(data)
+        found = (tree['format'], tree['version'])
+        entries = tree['nodes']
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidTreeFormatException("Invalid JSON tree: {}".format(e))
+
+    if found != (FORMAT_NAME, FORMAT_VERSION):
+        msg = "Expected {} version {}, found {} version {}.".format(
+            FORMAT_NAME, FORMAT_VERSION, *found)
+        raise InvalidTreeFormatException(msg)
+
+    names, nodes, switches = [], [], {}
+
+    for index, entry in enumerate(entries):
+        cases = {}
+
+        if (isinstance(entry, list) and len(entry) == 4
+            and isinstance(entry[3], dict) and entry[1] is None):
+            cases = entry.pop()
+            switches[index] = dict([(result, -1 if branch is None else branch)
+                                    for result, branch in cases.items()])
+
+        if (not isinstance(entry, list) or len(entry) != 3
+            or not all([branch is None or isinstance(branch, int)
+                        for branch in entry[1:] + list(cases.values())])):
+            msg = "Invalid node {}: {}".format(index, entry)
+            raise InvalidTreeFormatException(msg)
+
+        name, left, right = entry
+        names.append(name)
+        nodes.append((index, -1 if left is None else left,
+                      -1 if right is None else right))
+
+    _checkNodes(names, nodes, switches)
+    return (tuple(names), tuple([left for name, left, right in nodes]),
+            tuple([right for name, left, right in nodes]), switches)
+
+
+def dumpBytes(engine):
+    """
+    Serializes the tree loaded in an engine in the binary form.
+
+    :Parameters:
+      engine : `RulesEngine`
+        The loaded engine.
+
+    :Returns:
+      The `bytes`.
+    """
+    nodes, switches = _getNodes(engine)
+    names = []
+    indexes = {}
+    values = array('i')
+
+    def getName(name):
+        if name not in indexes:
+            indexes[name] = len(names)
+            names.append(name)
+
+        return indexes[name]
+
+    for name, left, right in nodes:
+        values.extend((getName(name), left, right))
+
+    for index, switch in sorted(switches.items()):
+        values.extend((index, len(switch)))
+
+        for result, branch in switch.items():
+            values.extend((getName(result), branch))
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    data = getattr(values, 'tobytes', None) or values.tostring
+    return b''.join([_HEADER.pack(MAGIC, FORMAT_VERSION, len(names),
+                                  len(nodes))]
+                    + [name.encode('utf-8') + b'\0' for name in names]
+                    + [data()])
+
+
+def parseBytes(data):
+    """
+    Parses a tree serialized by `dumpBytes`. The nodes are read into an
+    ``array`` in one call.
+
+    :Parameters:
+      data : `bytes`
+        The binary form.
+
+    :Returns:
+      See `parseJSON`.
+
+    :Raises:
+      InvalidTreeFormatException
+        If it is not a valid tree.
+    """
+    if len(data) < _HEADER.size:
+        raise InvalidTreeFormatException("The tree is too short.")
+
+    magic, version, nameCount, nodeCount = _HEADER.unpack_from(data)
+
+    if magic != MAGIC or version != FORMAT_VERSION:
+        msg = "Expected {} version {}, found {!r} version {}.".format(
+            FORMAT_NAME, FORMAT_VERSION, magic, version)
+        raise InvalidTreeFormatException(msg)
+
+    start = _HEADER.size
+    names = []
+
+    for count in range(nameCount):
+        end = data.find(b'\0', start)
+
+        if end == -1:
+            raise InvalidTreeFormatException("The names are truncated.")
+
+        names.append(data[start:end].decode('utf-8'))
+        start = end + 1
+
+    values = array('i')
+    size = nodeCount * 3
+
+    if (len(data) - start < size * values.itemsize
+        or (len(data) - start) % values.itemsize):
+        raise InvalidTreeFormatException(
+            "Expected {} nodes in {} bytes.".format(nodeCount,
+                                                    len(data) - start))
+
+    (getattr(values, 'frombytes', None) or values.fromstring)(data[start:])
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    nodes = values[:size]
+    nameIndexes, lefts, rights = nodes[0::3], nodes[1::3], nodes[2::3]
+    switches = {}
+    position = size
+
+    while position < len(values):
+        index, count = values[position], values[position + 1:position + 2]
+        count = count[0] if count else -1
+        cases = values[position + 2:position + 2 + max(count, 0) * 2]
+
+        if (count < 0 or len(cases) != count * 2
+            or not all([0 <= name < len(names) for name in cases[0::2]])):
+            msg = "Invalid switch node at {}.".format(position)
+            raise InvalidTreeFormatException(msg)
+
+        switches[index] = dict(zip([names[name] for name in cases[0::2]],
+                                   cases[1::2]))
+        position += 2 + len(cases)
+
+    _checkNodes(names, list(zip(nameIndexes, lefts, rights)), switches)
+    return (tuple([names[index] for index in nameIndexes]), tuple(lefts),
+            tuple(rights), switches)
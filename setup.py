@@ -28,7 +28,16 @@ setup(name='RestyCodes',
       download_url="https://github.com/cnobile2012/restycodes/archive/master.zip",
       platforms=["Linux", "UNIX", "Windows", "MacOS"],
       py_modules=['rulesengine.__init__', 'rulesengine.rules_engine',
-                  'restycodes.__init__', 'restycodes.resty_codes'],
+                  'rulesengine.async_rules_engine', 'rulesengine.node_stats',
+                  'rulesengine.tracer', 'rulesengine.tree_format',
+                  'restycodes.__init__', 'restycodes.resty_codes',
+                  'restycodes.conditions', 'restycodes.cache',
+                  'restycodes.batch', 'restycodes.table',
+                  'restycodes.async_resty_codes', 'restycodes.wsgi',
+                  'restycodes.asgi', 'restycodes.negotiation',
+                  'restycodes.etags', 'restycodes.httpdate',
+                  'restycodes.fast_path'],
+      extras_require={'batch': ['numpy']},
       #data_files=[('restycodes/tests',
       #             ['test/ll_test.py',],),
       #           ],